@@ -0,0 +1,463 @@
+"""Benchmark harness for end-to-end attribution throughput and latency.
+
+Runs the built-in mystery prompts and synthetic prompts of increasing size
+against the offline fake backend with a set latency, and reports throughput,
+latency percentiles, API calls, cache size and peak memory as JSON so runs
+can be compared across commits. Optionally compares group ablation at
+several call budgets with exhaustive single-segment ablation.
+"""
+
+import json
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from .datasets import load_mystery_prompts
+from .engine.ablation_engine import AblationEngine
+from .engine.backends import FakeBackend
+from .engine.cache import create_cache_backend
+from .engine.group_ablation import GroupAblation
+from .engine.hierarchical_engine import HierarchicalAblationEngine
+from .engine.llm_wrapper import LLMWrapper
+from .engine.rate_controller import reset_rate_controllers
+from .engine.run_manager import RunManager
+from .scorer import Scorer
+from .segmenter import Segmenter
+from .settings import get_settings
+
+
+_SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024 * 1024}
+
+_WORDS = (
+    "always respond with a concise summary of the key findings and cite the "
+    "relevant section when the user asks about policy details or pricing never "
+    "speculate about future releases and keep the tone friendly professional "
+    "and direct use bullet points for lists of three or more items"
+).split()
+
+
+def parse_size(size: str) -> int:
+    """Parse a size such as '1KB' or '2MB' into a number of bytes.
+
+    Args:
+        size: Size string with an optional B/KB/MB suffix
+
+    Returns:
+        Size in bytes
+    """
+    size = size.strip().upper()
+    for unit in ("KB", "MB", "B"):
+        if size.endswith(unit):
+            return int(float(size[: -len(unit)]) * _SIZE_UNITS[unit])
+    return int(size)
+
+
+def synthetic_prompt(size_bytes: int, seed: int = 0, headings: bool = True) -> str:
+    """Generate a deterministic prompt of roughly the requested size.
+
+    The prompt is made of markdown sections of a few sentences each, so the
+    segmenter produces realistic heading-based segments. Without headings
+    it reads like a pasted document of plain paragraphs, which the
+    segmenter splits into sliding windows.
+
+    Args:
+        size_bytes: Target prompt size in bytes
+        seed: Random seed for the generated text
+        headings: Whether each section starts with a markdown heading
+
+    Returns:
+        Synthetic prompt text
+    """
+    rng = random.Random(seed)
+    parts: List[str] = []
+    length = 0
+    section = 0
+
+    while length < size_bytes:
+        lines = [f"### Section {section}"] if headings else []
+        for _ in range(rng.randint(3, 8)):
+            words = rng.choices(_WORDS, k=rng.randint(8, 20))
+            lines.append(" ".join(words).capitalize() + ".")
+        block = "\n".join(lines) + "\n\n"
+        parts.append(block)
+        length += len(block)
+        section += 1
+
+    return "".join(parts)[:size_bytes]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def _dir_size(path: Path) -> int:
+    """Total size in bytes of all files under a directory."""
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def _peak_rss_bytes() -> int:
+    """Peak resident set size of this process in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _git_commit() -> Optional[str]:
+    """Return the current git commit hash, if available."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def _attribute_once(
+    prompt: str,
+    mode: str,
+    llm: LLMWrapper,
+    run_manager: RunManager,
+) -> Tuple[int, float]:
+    """Run one full attribution and return (segments tested, seconds)."""
+    start = time.perf_counter()
+    baseline = await llm.get_completion(prompt)
+
+    if mode == "hierarchical":
+        engine = HierarchicalAblationEngine(llm, run_manager)
+        run = run_manager.create_run(prompt, baseline, [])
+        engine.max_cost = float("inf")
+        run = await engine.run_hierarchical_ablation(run, scorer=Scorer(baseline, llm), early_stop=False)
+    else:
+        engine = AblationEngine(llm, run_manager)
+        segments = Segmenter().segment(prompt)
+        run = run_manager.create_run(prompt, baseline, segments)
+        engine.max_cost = float("inf")
+        run = await engine.run_ablation_tests(run, scorer=Scorer(baseline, llm), early_stop=False)
+
+    return len(run.ablation_results), time.perf_counter() - start
+
+
+async def run_case(
+    name: str,
+    prompt: str,
+    mode: str = "standard",
+    repeats: int = 3,
+    latency_ms: float = 50.0,
+    jitter_ms: float = 0.0,
+    warm: bool = False,
+) -> Dict:
+    """Benchmark attribution of a single prompt.
+
+    Each repeat starts from an empty cache unless `warm` is set, in which
+    case all repeats share one cache and the first repeat warms it.
+
+    Args:
+        name: Case name used in the report
+        prompt: Prompt text to attribute
+        mode: "standard" or "hierarchical"
+        repeats: Number of timed runs
+        latency_ms: Simulated backend latency per request
+        jitter_ms: Maximum random latency added per request
+        warm: Whether to reuse the cache across repeats
+
+    Returns:
+        Dictionary of metrics for the case
+    """
+    settings = get_settings()
+    latencies: List[float] = []
+    segments_tested = 0
+    calls = {"completion_requests": 0, "embedding_requests": 0, "coalesced_calls": 0}
+    bytes_cached = 0
+
+    with tempfile.TemporaryDirectory(prefix="pa_bench_") as tmp:
+        tmp_path = Path(tmp)
+        run_manager = RunManager(str(tmp_path / "runs"))
+
+        for i in range(repeats):
+            cache_dir = tmp_path / ("cache" if warm else f"cache_{i}")
+            cache_settings = settings.model_copy(update={"cache_dir": str(cache_dir)})
+            cache = create_cache_backend(cache_settings)
+            backend = FakeBackend(latency_ms=latency_ms, jitter_ms=jitter_ms, seed=i)
+            # Repeats must not inherit concurrency learned by earlier ones
+            reset_rate_controllers()
+            llm = LLMWrapper(cache=cache, backend=backend)
+
+            segments_tested, seconds = await _attribute_once(prompt, mode, llm, run_manager)
+            latencies.append(seconds)
+
+            stats = llm.get_stats()
+            for key in calls:
+                calls[key] += stats.get(key, 0)
+
+            cache.close()
+            bytes_cached = max(bytes_cached, _dir_size(cache_dir))
+
+    total_seconds = sum(latencies)
+    return {
+        "name": name,
+        "mode": mode,
+        "prompt_bytes": len(prompt.encode()),
+        "segments_tested": segments_tested,
+        "repeats": repeats,
+        "segments_per_sec": (segments_tested * repeats / total_seconds) if total_seconds else 0.0,
+        "latency_p50_s": _percentile(latencies, 50),
+        "latency_p95_s": _percentile(latencies, 95),
+        "latencies_s": latencies,
+        "calls_per_run": {key: value / repeats for key, value in calls.items()},
+        "bytes_cached": bytes_cached,
+        "peak_rss_bytes": _peak_rss_bytes(),
+    }
+
+
+def _ranks(values: List[float]) -> np.ndarray:
+    """Ranks of values, with tied values sharing their average rank."""
+    values = np.asarray(values, dtype=float)
+    order = np.argsort(values, kind="stable")
+    ranks = np.empty(len(values))
+    ranks[order] = np.arange(len(values))
+    for value in np.unique(values):
+        tied = values == value
+        ranks[tied] = ranks[tied].mean()
+    return ranks
+
+
+def bench_segmentation(sizes: List[str], repeats: int = 3) -> List[Dict]:
+    """Benchmark sliding-window segmentation of large heading-free prompts.
+
+    Each size is segmented with materialized spans and with lazy span
+    views, bypassing the segmentation cache; the report gives the best time
+    of the repeats and the memory allocated while segmenting.
+
+    Args:
+        sizes: Prompt sizes, e.g. ["1MB"]
+        repeats: Timed runs per size and variant
+
+    Returns:
+        One entry per size and variant
+    """
+    segmenter = Segmenter()
+    results = []
+
+    for size in sizes:
+        prompt = synthetic_prompt(parse_size(size), headings=False)
+        for lazy in (False, True):
+            seconds = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                spans = segmenter.segment(prompt, lazy=lazy, cache=False)
+                seconds.append(time.perf_counter() - start)
+
+            tracemalloc.start()
+            spans = segmenter.segment(prompt, lazy=lazy, cache=False)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            result = {
+                "name": f"segment-{size}",
+                "lazy": lazy,
+                "window_unit": segmenter.window_unit,
+                "prompt_bytes": len(prompt.encode()),
+                "spans": len(spans),
+                "best_s": min(seconds),
+                "peak_alloc_bytes": peak,
+            }
+            print(
+                f"{result['name']:>16}: {result['spans']:>6} spans, "
+                f"{'lazy' if lazy else 'eager':>5}, best {result['best_s'] * 1000:.1f}ms, "
+                f"{peak / 1024 / 1024:.1f}MB allocated"
+            )
+            results.append(result)
+
+    return results
+
+
+def _spearman(a: List[float], b: List[float]) -> float:
+    """Spearman rank correlation of two equally long lists."""
+    rank_a, rank_b = _ranks(a), _ranks(b)
+    if len(a) < 2 or rank_a.std() == 0 or rank_b.std() == 0:
+        return 0.0
+    return float(np.corrcoef(rank_a, rank_b)[0, 1])
+
+
+def _top_ids(deltas: Dict[int, float], k: int) -> List[int]:
+    """IDs of the k segments with the largest delta."""
+    return sorted(deltas, key=lambda span_id: (-deltas[span_id], span_id))[:k]
+
+
+async def compare_group_ablation(
+    call_ratios: List[float],
+    latency_ms: float = 0.0,
+    top_k: int = 3,
+) -> List[Dict]:
+    """Compare group ablation with exhaustive single-segment ablation.
+
+    For every mystery prompt, single-segment ablation gives the reference
+    delta per segment, and group ablation is run at each call ratio. Each
+    entry reports the calls made, the Spearman correlation of the deltas
+    with the reference, the overlap of the top-k segments and the mean
+    absolute error. Prompts with too few segments for group ablation to
+    save calls report the reference only.
+
+    Args:
+        call_ratios: Group ablation calls per segment to compare, e.g. [0.25, 0.5]
+        latency_ms: Simulated backend latency per request
+        top_k: Size of the top segment set compared
+
+    Returns:
+        One entry per prompt
+    """
+    settings = get_settings()
+    results = []
+
+    with tempfile.TemporaryDirectory(prefix="pa_bench_") as tmp:
+        tmp_path = Path(tmp)
+        run_manager = RunManager(str(tmp_path / "runs"))
+        cache = create_cache_backend(settings.model_copy(update={"cache_dir": str(tmp_path / "cache")}))
+        llm = LLMWrapper(cache=cache, backend=FakeBackend(latency_ms=latency_ms))
+
+        for case in load_mystery_prompts():
+            baseline = await llm.get_completion(case.text)
+            segments = Segmenter().segment(case.text)
+
+            engine = AblationEngine(llm, run_manager)
+            engine.max_cost = float("inf")
+            engine.ablation_strategy = "single"
+            run = run_manager.create_run(case.text, baseline, segments)
+            run = await engine.run_ablation_tests(run, scorer=Scorer(baseline, llm), early_stop=False)
+            reference = {r["span_id"]: r["delta_cos"] for r in run.ablation_results}
+            span_ids = sorted(reference)
+
+            entry = {"name": case.id, "segments": len(segments), "single_calls": len(segments), "group": []}
+            for ratio in call_ratios:
+                group = GroupAblation(engine, call_ratio=ratio, max_cost=float("inf"))
+                if group.planned_calls(len(segments)) >= len(segments):
+                    continue
+                run = run_manager.create_run(case.text, baseline, segments)
+                run = await group.run(run, Scorer(baseline, llm))
+                estimate = {r["span_id"]: r["delta_cos"] for r in run.ablation_results}
+                k = min(top_k, len(span_ids))
+                entry["group"].append({
+                    "call_ratio": ratio,
+                    "calls": run.stats["group_ablation_calls"],
+                    "spearman": _spearman([reference[i] for i in span_ids], [estimate[i] for i in span_ids]),
+                    "top_k_overlap": len(set(_top_ids(reference, k)) & set(_top_ids(estimate, k))) / k,
+                    "mean_abs_error": float(np.mean([abs(reference[i] - estimate[i]) for i in span_ids])),
+                })
+
+            for row in entry["group"]:
+                print(
+                    f"{case.id:>16}: {row['calls']:>3}/{len(segments):<3} calls, "
+                    f"spearman {row['spearman']:+.2f}, top-{top_k} overlap {row['top_k_overlap']:.2f}, "
+                    f"MAE {row['mean_abs_error']:.3f}"
+                )
+            results.append(entry)
+
+        cache.close()
+
+    return results
+
+
+async def run_benchmark(
+    sizes: Optional[List[str]] = None,
+    mode: str = "standard",
+    repeats: int = 3,
+    latency_ms: float = 50.0,
+    jitter_ms: float = 0.0,
+    include_mystery: bool = True,
+    warm: bool = False,
+    group_call_ratios: Optional[List[float]] = None,
+    segmentation_sizes: Optional[List[str]] = None,
+) -> Dict:
+    """Run the full benchmark suite.
+
+    Args:
+        sizes: Synthetic prompt sizes, e.g. ["1KB", "1MB"]
+        mode: "standard" or "hierarchical"
+        repeats: Number of timed runs per case
+        latency_ms: Simulated backend latency per request
+        jitter_ms: Maximum random latency added per request
+        include_mystery: Whether to include the built-in mystery prompts
+        warm: Whether to reuse the cache across repeats
+        group_call_ratios: Call ratios at which to compare group ablation
+            with single-segment ablation on the mystery prompts
+        segmentation_sizes: Sizes of heading-free prompts to benchmark
+            window segmentation on, e.g. ["1MB"]
+
+    Returns:
+        Report dictionary with metadata and per-case metrics
+    """
+    sizes = sizes if sizes is not None else ["1KB", "10KB", "100KB", "1MB"]
+    cases: List[Tuple[str, str]] = []
+
+    if include_mystery:
+        cases.extend((case.id, case.text) for case in load_mystery_prompts())
+    cases.extend((f"synthetic-{size}", synthetic_prompt(parse_size(size))) for size in sizes)
+
+    results = []
+    for name, prompt in cases:
+        result = await run_case(name, prompt, mode, repeats, latency_ms, jitter_ms, warm)
+        print(
+            f"{name:>16}: {result['segments_tested']:>5} segments, "
+            f"{result['segments_per_sec']:8.1f} seg/s, "
+            f"p50 {result['latency_p50_s']:.3f}s, p95 {result['latency_p95_s']:.3f}s"
+        )
+        results.append(result)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "mode": mode,
+            "repeats": repeats,
+            "latency_ms": latency_ms,
+            "jitter_ms": jitter_ms,
+            "warm": warm,
+        },
+        "cases": results,
+    }
+
+    if segmentation_sizes:
+        print("\nWindow segmentation:")
+        report["segmentation"] = bench_segmentation(segmentation_sizes, repeats)
+
+    if group_call_ratios:
+        print("\nGroup ablation vs single-segment ablation:")
+        report["group_ablation"] = await compare_group_ablation(group_call_ratios, latency_ms)
+
+    return report
+
+
+def write_results(report: Dict, output_path: Optional[str] = None) -> str:
+    """Write a benchmark report as JSON.
+
+    Args:
+        report: Report returned by `run_benchmark`
+        output_path: File to write (defaults to bench_results/bench_<timestamp>.json)
+
+    Returns:
+        Path of the written file
+    """
+    if output_path is None:
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_path = str(Path("bench_results") / f"bench_{stamp}.json")
+
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    return output_path
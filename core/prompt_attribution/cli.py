@@ -3,13 +3,25 @@
 import asyncio
 import argparse
 import json
+import re
 import sys
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 
-from .engine import RunManager
+from .engine import (
+    AblationEngine,
+    BatchAttributor,
+    BatchResult,
+    HierarchicalAblationEngine,
+    RunInterrupted,
+    RunManager,
+    ShardedBatchAttributor,
+)
 from .engine.llm_wrapper import LLMWrapper
-from . import rewrite
+from .engine.cache import SQLiteCache, migrate_directory_cache
+from . import bench, rewrite
+from .datasets import load_mystery_prompts, load_prompt_cases
 from .settings import get_settings
 
 
@@ -78,6 +90,255 @@ async def generate_rewrite_cmd(run_id: str, sentence_idx: int, user_comment: str
         print(f"\nSaved suggestions to {output_path}")
 
 
+async def resume_cmd(run_id: str, hierarchical: bool = False, runs_dir: Optional[str] = None):
+    """Continue an interrupted attribution run.
+    
+    Args:
+        run_id: The run ID to resume
+        hierarchical: Whether the run used the hierarchical engine
+        runs_dir: Directory holding the runs (defaults to examples/runs)
+    """
+    run_manager = RunManager(runs_dir)
+    engine_class = HierarchicalAblationEngine if hierarchical else AblationEngine
+    engine = engine_class(run_manager=run_manager)
+    
+    try:
+        run = await engine.resume(run_id)
+    except ValueError as e:
+        print(e)
+        return
+    except RunInterrupted as e:
+        print(f"\n{e}")
+        return
+    
+    print(f"Run {run.id} completed with {len(run.ablation_results)} ablation results")
+
+
+async def batch_cmd(
+    prompts_path: Optional[str] = None,
+    mystery: bool = False,
+    hierarchical: bool = False,
+    concurrency: Optional[int] = None,
+    max_cost: Optional[float] = None,
+    max_active_runs: int = 4,
+    runs_dir: Optional[str] = None,
+    early_stop: bool = True,
+    workers: int = 1,
+):
+    """Attribute many prompts with a shared concurrency and cost budget.
+    
+    Args:
+        prompts_path: JSONL file of prompts ({"id": ..., "text": ...} or
+            {"id": ..., "messages": [...]} per line)
+        mystery: Whether to attribute the built-in mystery prompts
+        hierarchical: Whether to use the hierarchical engine
+        concurrency: Requests in flight across all prompts
+        max_cost: Total projected cost allowed for the batch
+        max_active_runs: Number of prompts being attributed at the same time
+        runs_dir: Directory for the runs (defaults to examples/runs)
+        early_stop: Whether to enable early stopping
+        workers: Number of worker processes to shard the prompts across
+    """
+    cases = load_mystery_prompts() if mystery else []
+    if prompts_path:
+        cases.extend(load_prompt_cases(prompts_path))
+    if not cases:
+        print("No prompts to attribute; pass a JSONL file or --mystery")
+        return
+    
+    counts: Dict[str, int] = {}
+    
+    def report(result: BatchResult) -> None:
+        counts[result.status] = counts.get(result.status, 0) + 1
+        line = f"{result.case_id}: {result.status} in {result.elapsed_s:.1f}s"
+        if result.run is not None:
+            line += f" (run {result.run.id}, {len(result.run.ablation_results)} results)"
+        if result.error:
+            line += f" - {result.error}"
+        print(line)
+    
+    if workers > 1:
+        sharded = ShardedBatchAttributor(
+            workers=workers,
+            runs_dir=runs_dir,
+            max_concurrency=concurrency,
+            max_cost=max_cost,
+            max_active_runs=max_active_runs,
+            hierarchical=hierarchical,
+            early_stop=early_stop,
+        )
+        results, worker_stats = await sharded.run(cases)
+        for result in results:
+            report(result)
+        
+        print("\nWorker  PID      Cases  Segments  API calls  Wall (s)  CPU (s)  Segments/s")
+        for stats in worker_stats:
+            print(
+                f"{stats.worker:<7} {stats.pid:<8} {stats.cases:<6} {stats.segments:<9} "
+                f"{stats.api_calls:<10} {stats.elapsed_s:<9.1f} {stats.cpu_s:<8.1f} {stats.segments_per_sec:.1f}"
+            )
+        summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+        print(f"\nBatch finished: {summary}")
+        return
+    
+    attributor = BatchAttributor(
+        run_manager=RunManager(runs_dir),
+        max_concurrency=concurrency,
+        max_cost=max_cost,
+        max_active_runs=max_active_runs,
+        hierarchical=hierarchical,
+        early_stop=early_stop,
+    )
+    
+    async for result in attributor.stream(cases):
+        report(result)
+    
+    summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+    print(f"\nBatch finished: {summary}; projected cost ${attributor.cost_budget.reserved:.4f}")
+
+
+def _parse_since(value: Optional[str]) -> Optional[str]:
+    """Turn a relative age like '7d', '12h' or '30m' into an ISO timestamp.
+    
+    Absolute ISO dates and timestamps are returned unchanged.
+    """
+    if value is None:
+        return None
+    
+    match = re.fullmatch(r"(\d+)([dhm])", value.strip())
+    if not match:
+        return value
+    
+    amount, unit = int(match.group(1)), match.group(2)
+    delta = {"d": timedelta(days=amount), "h": timedelta(hours=amount), "m": timedelta(minutes=amount)}[unit]
+    return (datetime.now() - delta).isoformat()
+
+
+def list_runs_cmd(
+    runs_dir: Optional[str] = None,
+    prompt_file: Optional[str] = None,
+    prompt_hash: Optional[str] = None,
+    model: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    min_delta: Optional[float] = None,
+    limit: Optional[int] = 20,
+    reindex: bool = False,
+):
+    """List runs from the run index, newest first.
+    
+    Args:
+        runs_dir: Directory holding the runs (defaults to examples/runs)
+        prompt_file: Only runs of the prompt in this file
+        prompt_hash: Only runs of the prompt with this hash
+        model: Only runs using this completion model
+        status: Only runs with this status
+        since: Only runs at or after this ISO timestamp or relative age (e.g. 7d)
+        until: Only runs before this ISO timestamp or relative age
+        min_delta: Only runs whose highest delta is at least this
+        limit: Maximum number of runs to list
+        reindex: Whether to rebuild the index from the run directories first
+    """
+    run_manager = RunManager(runs_dir)
+    if reindex:
+        count = run_manager.rebuild_index()
+        print(f"Indexed {count} runs")
+    
+    prompt = None
+    if prompt_file:
+        with open(prompt_file, "r") as f:
+            prompt = f.read()
+    
+    runs = run_manager.query_runs(
+        prompt=prompt,
+        prompt_hash=prompt_hash,
+        completion_model=model,
+        status=status,
+        since=_parse_since(since),
+        until=_parse_since(until),
+        min_max_delta=min_delta,
+        limit=limit,
+    )
+    
+    if not runs:
+        print("No runs found")
+        return
+    
+    print(f"{'ID':<36}  {'TIMESTAMP':<19}  {'MODEL':<14}  {'SEGS':>5}  {'MAX DELTA':>9}  STATUS")
+    for run in runs:
+        max_delta = f"{run.max_delta:.3f}" if run.max_delta is not None else "-"
+        print(
+            f"{run.id:<36}  {run.timestamp[:19]:<19}  {(run.completion_model or '-'):<14}  "
+            f"{run.segment_count:>5}  {max_delta:>9}  {run.status}"
+        )
+
+
+def migrate_cache_cmd(source_dir: Optional[str] = None, dest_path: Optional[str] = None):
+    """Import a one-file-per-entry directory cache into the SQLite cache.
+    
+    Args:
+        source_dir: Directory cache to import (defaults to the configured cache dir)
+        dest_path: SQLite database to import into (defaults to <cache dir>/cache.sqlite3)
+    """
+    settings = get_settings()
+    source_dir = source_dir or settings.cache_dir
+    dest_path = dest_path or str(Path(settings.cache_dir) / "cache.sqlite3")
+    
+    if not Path(source_dir).is_dir():
+        print(f"Cache directory {source_dir} not found")
+        return
+    
+    dest = SQLiteCache(dest_path)
+    try:
+        count = migrate_directory_cache(source_dir, dest)
+    finally:
+        dest.close()
+    
+    print(f"Imported {count} cache entries from {source_dir} into {dest_path}")
+
+
+async def bench_cmd(
+    sizes: List[str],
+    mode: str = "standard",
+    repeats: int = 3,
+    latency_ms: float = 50.0,
+    jitter_ms: float = 0.0,
+    include_mystery: bool = True,
+    warm: bool = False,
+    output_path: Optional[str] = None,
+    group_call_ratios: Optional[List[float]] = None,
+    segmentation_sizes: Optional[List[str]] = None,
+):
+    """Benchmark end-to-end attribution against the simulated backend.
+    
+    Args:
+        sizes: Synthetic prompt sizes to run, e.g. ["1KB", "1MB"]
+        mode: Ablation mode ("standard" or "hierarchical")
+        repeats: Number of timed runs per case
+        latency_ms: Simulated backend latency per request
+        jitter_ms: Maximum random latency added per request
+        include_mystery: Whether to include the built-in mystery prompts
+        warm: Whether to reuse the cache across repeats
+        output_path: Optional path for the JSON report
+        group_call_ratios: Call ratios at which to compare group ablation with single-segment ablation
+        segmentation_sizes: Sizes of heading-free prompts to benchmark window segmentation on
+    """
+    report = await bench.run_benchmark(
+        sizes=sizes,
+        mode=mode,
+        repeats=repeats,
+        latency_ms=latency_ms,
+        jitter_ms=jitter_ms,
+        include_mystery=include_mystery,
+        warm=warm,
+        group_call_ratios=group_call_ratios,
+        segmentation_sizes=segmentation_sizes,
+    )
+    path = bench.write_results(report, output_path)
+    print(f"\nSaved benchmark results to {path}")
+
+
 def main():
     """Main entry point for the CLI."""
     parser = argparse.ArgumentParser(description="Prompt Attribution CLI")
@@ -91,6 +352,61 @@ def main():
     rewrite_parser.add_argument("--output", "-o", help="Path to save suggestions to")
     rewrite_parser.add_argument("--model", "-m", help="Model to use for rewrite generation (overrides default)")
     
+    # Resume command
+    resume_parser = subparsers.add_parser("resume", help="Continue an interrupted attribution run")
+    resume_parser.add_argument("run_id", help="Run ID to resume")
+    resume_parser.add_argument("--hierarchical", action="store_true", help="Resume with the hierarchical engine")
+    resume_parser.add_argument("--runs-dir", help="Directory holding the runs (defaults to examples/runs)")
+    
+    # Batch command
+    batch_parser = subparsers.add_parser("batch", help="Attribute many prompts under shared concurrency and cost budgets")
+    batch_parser.add_argument("prompts", nargs="?", help="JSONL file with one {\"id\", \"text\"} prompt or {\"id\", \"messages\"} chat prompt per line")
+    batch_parser.add_argument("--mystery", action="store_true", help="Attribute the built-in mystery prompts")
+    batch_parser.add_argument("--hierarchical", action="store_true", help="Use the hierarchical engine")
+    batch_parser.add_argument("--concurrency", type=int, help="Requests in flight across all prompts")
+    batch_parser.add_argument("--max-cost", type=float, help="Total projected cost allowed (defaults to MAX_BATCH_COST)")
+    batch_parser.add_argument("--max-active-runs", type=int, default=4, help="Prompts attributed at the same time")
+    batch_parser.add_argument("--runs-dir", help="Directory for the runs (defaults to examples/runs)")
+    batch_parser.add_argument("--no-early-stop", action="store_true", help="Disable early stopping")
+    batch_parser.add_argument("--workers", "-w", type=int, default=1, help="Worker processes to shard the prompts across")
+    
+    # Runs command
+    runs_parser = subparsers.add_parser("runs", help="List and search attribution runs")
+    runs_subparsers = runs_parser.add_subparsers(dest="runs_command", help="Runs command to run")
+    ls_parser = runs_subparsers.add_parser("ls", help="List runs from the run index, newest first")
+    ls_parser.add_argument("--runs-dir", help="Directory holding the runs (defaults to examples/runs)")
+    ls_parser.add_argument("--prompt-file", help="Only runs of the prompt in this file")
+    ls_parser.add_argument("--prompt-hash", help="Only runs of the prompt with this SHA-256 hash")
+    ls_parser.add_argument("--model", help="Only runs using this completion model")
+    ls_parser.add_argument("--status", choices=["running", "interrupted", "completed"], help="Only runs with this status")
+    ls_parser.add_argument("--since", help="Only runs since an ISO date/time or a relative age such as 7d, 12h")
+    ls_parser.add_argument("--until", help="Only runs before an ISO date/time or a relative age")
+    ls_parser.add_argument("--min-delta", type=float, help="Only runs whose highest delta is at least this")
+    ls_parser.add_argument("--limit", "-n", type=int, default=20, help="Maximum number of runs to list")
+    ls_parser.add_argument("--reindex", action="store_true", help="Rebuild the index from the run directories first")
+    
+    # Cache command
+    cache_parser = subparsers.add_parser("cache", help="Manage the LLM response cache")
+    cache_subparsers = cache_parser.add_subparsers(dest="cache_command", help="Cache command to run")
+    migrate_parser = cache_subparsers.add_parser("migrate", help="Import a directory cache into the SQLite cache")
+    migrate_parser.add_argument("--source", "-s", help="Directory cache to import (defaults to CACHE_DIR)")
+    migrate_parser.add_argument("--dest", "-d", help="SQLite file to import into (defaults to CACHE_DIR/cache.sqlite3)")
+    
+    # Bench command
+    bench_parser = subparsers.add_parser("bench", help="Benchmark attribution throughput against a simulated backend")
+    bench_parser.add_argument("--sizes", default="1KB,10KB,100KB,1MB", help="Comma-separated synthetic prompt sizes")
+    bench_parser.add_argument("--mode", choices=["standard", "hierarchical"], default="standard", help="Ablation mode to benchmark")
+    bench_parser.add_argument("--repeats", type=int, default=3, help="Timed runs per case")
+    bench_parser.add_argument("--latency-ms", type=float, default=50.0, help="Simulated latency per request")
+    bench_parser.add_argument("--jitter-ms", type=float, default=0.0, help="Maximum random latency added per request")
+    bench_parser.add_argument("--no-mystery", action="store_true", help="Skip the built-in mystery prompts")
+    bench_parser.add_argument("--warm", action="store_true", help="Reuse the cache across repeats")
+    bench_parser.add_argument("--output", "-o", help="Path for the JSON report")
+    bench_parser.add_argument("--group-ablation", metavar="RATIOS",
+                              help="Comma-separated call ratios at which to compare group ablation with single-segment ablation, e.g. 0.25,0.5")
+    bench_parser.add_argument("--segmentation", metavar="SIZES",
+                              help="Comma-separated sizes of heading-free prompts to benchmark window segmentation on, e.g. 1MB")
+    
     # Parse args
     args = parser.parse_args()
     
@@ -103,6 +419,52 @@ def main():
             output_path=args.output,
             model=args.model
         ))
+    elif args.command == "resume":
+        asyncio.run(resume_cmd(
+            run_id=args.run_id,
+            hierarchical=args.hierarchical,
+            runs_dir=args.runs_dir
+        ))
+    elif args.command == "batch":
+        asyncio.run(batch_cmd(
+            prompts_path=args.prompts,
+            mystery=args.mystery,
+            hierarchical=args.hierarchical,
+            concurrency=args.concurrency,
+            max_cost=args.max_cost,
+            max_active_runs=args.max_active_runs,
+            runs_dir=args.runs_dir,
+            early_stop=not args.no_early_stop,
+            workers=args.workers
+        ))
+    elif args.command == "bench":
+        asyncio.run(bench_cmd(
+            sizes=[size for size in args.sizes.split(",") if size],
+            mode=args.mode,
+            repeats=args.repeats,
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+            include_mystery=not args.no_mystery,
+            warm=args.warm,
+            output_path=args.output,
+            group_call_ratios=[float(r) for r in args.group_ablation.split(",") if r] if args.group_ablation else None,
+            segmentation_sizes=[size for size in args.segmentation.split(",") if size] if args.segmentation else None
+        ))
+    elif args.command == "runs" and args.runs_command == "ls":
+        list_runs_cmd(
+            runs_dir=args.runs_dir,
+            prompt_file=args.prompt_file,
+            prompt_hash=args.prompt_hash,
+            model=args.model,
+            status=args.status,
+            since=args.since,
+            until=args.until,
+            min_delta=args.min_delta,
+            limit=args.limit,
+            reindex=args.reindex
+        )
+    elif args.command == "cache" and args.cache_command == "migrate":
+        migrate_cache_cmd(source_dir=args.source, dest_path=args.dest)
     else:
         parser.print_help()
 
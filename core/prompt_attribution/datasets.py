@@ -5,7 +5,9 @@ from __future__ import annotations
 import json
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Union
+
+from .segmenter import ChatPrompt
 
 # Resolve project root (…/workspace)
 ROOT_DIR = Path(__file__).resolve().parents[2]
@@ -22,12 +24,17 @@ class PromptCase:
     style : str
         Qualitative label of the prompting style.
     text : str
-        Raw prompt text to feed to the attribution engine.
+        Raw prompt text to feed to the attribution engine (for chat
+        prompts, the text of their messages).
+    messages : list of dict, optional
+        Chat messages with ``role`` and ``content``, attributed instead of
+        ``text`` when given.
     """
 
     id: str
     style: str
     text: str
+    messages: Optional[List[Dict[str, str]]] = None
 
 
 def _load_json(path: Path) -> List[dict]:
@@ -44,7 +51,41 @@ def load_mystery_prompts() -> List[PromptCase]:
     return [PromptCase(**rec) for rec in records]
 
 
+def load_prompt_cases(path: Union[str, Path]) -> List[PromptCase]:
+    """Load prompt cases from a JSONL file, one JSON object per line.
+
+    Each object needs a ``text`` (or ``prompt``) field, or a ``messages``
+    list of ``{"role", "content"}`` chat messages; ``id`` defaults to the
+    line number and ``style`` to an empty string. Blank lines are skipped.
+    """
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"Dataset file not found: {path}")
+
+    cases = []
+    with open(path, "r", encoding="utf-8") as fh:
+        for line_no, line in enumerate(fh, start=1):
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            messages = rec.get("messages")
+            if messages:
+                text = ChatPrompt(messages).text
+            else:
+                text = rec.get("text", rec.get("prompt"))
+            if text is None:
+                raise ValueError(f"{path}:{line_no}: missing 'text' field")
+            cases.append(PromptCase(
+                id=str(rec.get("id", f"L-{line_no:04d}")),
+                style=rec.get("style", ""),
+                text=text,
+                messages=messages or None,
+            ))
+    return cases
+
+
 __all__ = [
     "PromptCase",
     "load_mystery_prompts",
+    "load_prompt_cases",
 ] 
\ No newline at end of file
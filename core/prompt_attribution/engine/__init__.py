@@ -1,15 +1,38 @@
 """LLM engine module for making API calls."""
 
+from .backends import LLMBackend, OpenAIBackend, FakeBackend
 from .llm_wrapper import LLMWrapper
+from .rate_controller import RateController, get_rate_controller
 from .run_manager import RunManager, Run, AblationResult
-from .ablation_engine import AblationEngine
+from .run_index import RunIndex, RunSummary
+from .ablation_engine import AblationEngine, RunInterrupted, CostBudget, BudgetExceeded
 from .hierarchical_engine import HierarchicalAblationEngine
+from .adaptive import AdaptiveSampler
+from .group_ablation import GroupAblation
+from .batch import BatchAttributor, BatchResult
+from .sharded import ShardedBatchAttributor, WorkerStats
 
 __all__ = [
+    "LLMBackend",
+    "OpenAIBackend",
+    "FakeBackend",
     "LLMWrapper", 
+    "RateController",
+    "get_rate_controller",
     "RunManager", 
     "Run", 
     "AblationResult", 
+    "RunIndex",
+    "RunSummary",
     "AblationEngine", 
-    "HierarchicalAblationEngine"
+    "RunInterrupted",
+    "CostBudget",
+    "BudgetExceeded",
+    "HierarchicalAblationEngine",
+    "AdaptiveSampler",
+    "GroupAblation",
+    "BatchAttributor",
+    "BatchResult",
+    "ShardedBatchAttributor",
+    "WorkerStats"
 ] 
\ No newline at end of file
@@ -1,68 +1,312 @@
 """Ablation engine for testing segment impact."""
 
 import asyncio
+import random
+import signal
 import time
 import re
-from typing import List, Dict, Optional, Union, Set, Any
+from typing import List, Dict, Optional, Union, Set, Any, Tuple, Callable
 
-from ..segmenter import Span
+import numpy as np
+
+from ..scorer.alignment import align_sentences
+from ..segmenter import ChatPrompt, Span
 from ..settings import get_settings
 from .llm_wrapper import LLMWrapper
 from .run_manager import Run, RunManager, AblationResult
 
 
+class RunInterrupted(Exception):
+    """Raised after a run was checkpointed because of SIGINT or SIGTERM."""
+    
+    def __init__(self, run_id: str, signum: int):
+        super().__init__(f"Run {run_id} interrupted by {signal.Signals(signum).name}; completed results were saved")
+        self.run_id = run_id
+        self.signum = signum
+
+
+def install_signal_handlers(callback) -> List[int]:
+    """Route SIGINT and SIGTERM to `callback` on the running event loop.
+    
+    Args:
+        callback: Function called with the signal number
+        
+    Returns:
+        Signals whose handlers were installed
+    """
+    loop = asyncio.get_running_loop()
+    installed = []
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, callback, signum)
+        except (NotImplementedError, RuntimeError, ValueError):
+            # Not supported on this platform or outside the main thread
+            continue
+        installed.append(signum)
+    return installed
+
+
+def remove_signal_handlers(signals: List[int]) -> None:
+    """Restore the default handling of signals installed by `install_signal_handlers`."""
+    loop = asyncio.get_running_loop()
+    for signum in signals:
+        loop.remove_signal_handler(signum)
+
+
+class BudgetExceeded(ValueError):
+    """Raised when a run's projected cost does not fit in a shared cost budget."""
+
+
+class CostBudget:
+    """Cost budget shared by several runs.
+    
+    Runs reserve their projected cost before sending ablation requests,
+    and refund the part of it that early stopping or an interruption left
+    unspent.
+    """
+    
+    def __init__(self, max_cost: float):
+        """Initialize the budget.
+        
+        Args:
+            max_cost: Total cost allowed across all runs
+        """
+        self.max_cost = max_cost
+        self.reserved = 0.0
+    
+    @property
+    def remaining(self) -> float:
+        """Cost still available."""
+        return self.max_cost - self.reserved
+    
+    def reserve(self, cost: float) -> bool:
+        """Reserve `cost` if it fits in the remaining budget.
+        
+        Args:
+            cost: Projected cost to reserve
+            
+        Returns:
+            Whether the cost was reserved
+        """
+        if cost > self.remaining:
+            return False
+        self.reserved += cost
+        return True
+    
+    def refund(self, cost: float) -> None:
+        """Return reserved cost that was not spent.
+        
+        Args:
+            cost: Reserved cost to release
+        """
+        self.reserved = max(0.0, self.reserved - cost)
+
+
 class AblationEngine:
     """Engine for performing ablation tests on prompt segments.
     
     Features:
-    - Single-segment deletion strategy
+    - Single-segment deletion or group (subset) ablation strategy
+    - Positional or semantic (optimal assignment) sentence alignment
+    - Chat runs: segments are removed from the messages' contents and the
+      rebuilt message list is sent as a chat completion
+    - Optional streaming ablations that stop reading once the result is settled
     - Async batch processing with concurrency control
+    - Results persisted as each ablation completes; interrupted runs can be resumed
     - Cost guardrails to prevent API cost overruns
     """
     
-    def __init__(self, llm: Optional[LLMWrapper] = None, run_manager: Optional[RunManager] = None):
+    def __init__(
+        self,
+        llm: Optional[LLMWrapper] = None,
+        run_manager: Optional[RunManager] = None,
+        semaphore: Optional[asyncio.Semaphore] = None,
+        cost_budget: Optional[CostBudget] = None,
+        handle_signals: bool = True,
+        record_llm_stats: bool = True,
+    ):
         """Initialize the ablation engine.
         
         Args:
             llm: LLM wrapper instance
             run_manager: Run manager instance
+            semaphore: Concurrency limit shared with other runs (defaults to one per run)
+            cost_budget: Cost budget shared with other runs
+            handle_signals: Whether to checkpoint runs on SIGINT/SIGTERM
+            record_llm_stats: Whether to record the LLM wrapper's request
+                counters in run stats; they include other runs' requests
+                when the wrapper is shared by concurrent runs
         """
         self.llm = llm or LLMWrapper()
         self.run_manager = run_manager or RunManager()
         self.settings = get_settings()
+        self.semaphore = semaphore
+        self.handle_signals = handle_signals
+        self.record_llm_stats = record_llm_stats
         
         # Cost tracking
         self.estimated_cost_per_request = 0.003  # Rough estimate for GPT-4o
         self.max_cost = self.settings.max_cost_per_run
+        self.cost_budget = cost_budget
+        
+        # Sentence alignment mode ("positional" or "semantic")
+        self.sentence_alignment = self.settings.sentence_alignment
+        self.alignment_min_similarity = self.settings.alignment_min_similarity
+        
+        # Streaming ablation mode
+        self.stream_ablations = self.settings.stream_ablations
+        self.stream_tolerance = self.settings.stream_tolerance
+        self.stream_settle_delta = self.settings.stream_settle_delta
+        
+        # Seed for breaking ties in the segment test order
+        self.seed = self.settings.ablation_seed
+        
+        # "single" deletes one segment per call, "group" deletes subsets (see GroupAblation)
+        self.ablation_strategy = self.settings.ablation_strategy
+        
+        # Baseline (completion, sentences, normalized embedding matrix) of the last run
+        self._baseline_cache: Optional[Tuple[str, List[str], np.ndarray]] = None
+        
+        # Segment x sentence influence matrix of the last run, rows ordered as influence_span_ids
+        self.influence_matrix: Optional[np.ndarray] = None
+        self.influence_span_ids: List[int] = []
+    
+    def _build_influence_matrix(self, results: List[Dict], num_sentences: int) -> np.ndarray:
+        """Stack per-sentence deltas into a segment x sentence matrix.
+        
+        Args:
+            results: Ablation result dicts, one row each in the given order
+            num_sentences: Number of baseline sentences
+            
+        Returns:
+            float32 matrix of shape (len(results), num_sentences); sentences a
+            result did not score (unread by a partial stream) are zero
+        """
+        matrix = np.zeros((len(results), num_sentences), dtype=np.float32)
+        for row, result in enumerate(results):
+            deltas = result.get("sentence_deltas", [])[:num_sentences]
+            matrix[row, :len(deltas)] = deltas
+        return matrix
+    
+    def _prioritize_segments(self, segments: List[Span]) -> List[Span]:
+        """Order segments for testing, most likely to matter first.
+        
+        Longer segments are tested first, since removing more of the prompt
+        tends to change the completion more. Ties are broken by a shuffle
+        seeded with `self.seed`, so the order is the same on every run.
+        
+        Args:
+            segments: Segments to order
+            
+        Returns:
+            Segments in test order
+        """
+        rng = random.Random(self.seed)
+        tiebreak = {span.id: rng.random() for span in sorted(segments, key=lambda s: s.id)}
+        return sorted(segments, key=lambda s: (-len(s.text), tiebreak[s.id]))
+    
+    def _prompt_of(self, run: Run) -> Union[str, ChatPrompt]:
+        """The prompt ablations of a run remove segments from: its text, or its chat layout."""
+        return ChatPrompt(run.messages) if run.messages else run.prompt
     
-    def _remove_segment(self, prompt: str, span: Span) -> str:
+    def _remove_segment(
+        self, prompt: Union[str, ChatPrompt], span: Span
+    ) -> Union[str, List[Dict[str, str]]]:
         """Remove a segment from the prompt.
         
         Args:
-            prompt: The full prompt
+            prompt: The full prompt, or the layout of a chat prompt
             span: The span to remove
             
         Returns:
-            Prompt with the segment removed
+            Prompt with the segment removed, or the rebuilt chat messages
         """
+        if isinstance(prompt, ChatPrompt):
+            return prompt.without([span])
         return prompt[:span.start] + prompt[span.end:]
     
+    def _remove_segments(
+        self, prompt: Union[str, ChatPrompt], spans: List[Span]
+    ) -> Union[str, List[Dict[str, str]]]:
+        """Remove several segments from the prompt at once.
+        
+        Overlapping or adjacent segments are merged before removal.
+        
+        Args:
+            prompt: The full prompt, or the layout of a chat prompt
+            spans: The spans to remove
+            
+        Returns:
+            Prompt with the segments removed, or the rebuilt chat messages
+        """
+        if isinstance(prompt, ChatPrompt):
+            return prompt.without(spans)
+        
+        parts = []
+        position = 0
+        for span in sorted(spans, key=lambda s: s.start):
+            if span.end <= position:
+                continue
+            parts.append(prompt[position:max(position, span.start)])
+            position = span.end
+        parts.append(prompt[position:])
+        return "".join(parts)
+    
+    def _llm_stats_since(self, before: Dict[str, int]) -> Dict[str, int]:
+        """Return the LLM wrapper's counters accumulated since a snapshot.
+        
+        Args:
+            before: Snapshot taken with `self.llm.get_stats()`
+            
+        Returns:
+            Counter deltas (empty if `record_llm_stats` is off)
+        """
+        if not self.record_llm_stats:
+            return {}
+        after = self.llm.get_stats()
+        return {key: value - before.get(key, 0) for key, value in after.items()}
+    
     def _split_sentences(self, text: str) -> List[str]:
         """Simple sentence splitter based on punctuation."""
         # Split on ., !, ? followed by space or end
         sentences = re.split(r'(?<=[.!?])\s+', text.strip())
         return [s for s in sentences if s]
     
-    async def _process_segment(self, prompt: str, span: Span, scorer: Any,
-                               baseline_sentences: List[str], baseline_embeddings: List[List[float]]) -> AblationResult:
+    async def _get_baseline_matrix(self, completion: str, scorer: Any) -> Tuple[List[str], np.ndarray]:
+        """Split the baseline into sentences and embed them as one normalized matrix.
+        
+        The result is kept for the baseline completion, so later passes over
+        the same run reuse it instead of re-normalizing.
+        
+        Args:
+            completion: The baseline completion
+            scorer: The scorer instance used for normalization
+            
+        Returns:
+            Tuple of (baseline sentences, float32 matrix of unit-length rows)
+        """
+        if self._baseline_cache is not None and self._baseline_cache[0] == completion:
+            return self._baseline_cache[1], self._baseline_cache[2]
+        
+        baseline_sentences = self._split_sentences(completion)
+        baseline_embeddings = await self.llm.get_embeddings(baseline_sentences) if baseline_sentences else []
+        baseline_matrix = scorer.normalize_embeddings(baseline_embeddings)
+        
+        self._baseline_cache = (completion, baseline_sentences, baseline_matrix)
+        return baseline_sentences, baseline_matrix
+    
+    async def _process_segment(self, prompt: Union[str, ChatPrompt], span: Span, scorer: Any,
+                               baseline_sentences: List[str], baseline_matrix: np.ndarray,
+                               seed: int = 42) -> AblationResult:
         """Process a single segment ablation.
         
         Args:
-            prompt: The full prompt
+            prompt: The full prompt, or the layout of a chat prompt
             span: The segment to ablate
             scorer: The scorer instance for calculating impact
             baseline_sentences: List of baseline sentences
-            baseline_embeddings: List of baseline sentence embeddings
+            baseline_matrix: Normalized baseline sentence embeddings, one row per sentence
+            seed: Seed of the ablated completion (vary it to draw repeated samples)
             
         Returns:
             Ablation result
@@ -72,54 +316,191 @@ class AblationEngine:
         # Create ablated prompt by removing the segment
         ablated_prompt = self._remove_segment(prompt, span)
         
+        delta_cos, sentence_deltas, deleted, inserted = await self._score_ablated_prompt(
+            ablated_prompt, scorer, baseline_sentences, baseline_matrix, seed
+        )
+        
+        # Calculate elapsed time
+        elapsed_ms = int((time.time() - start_time) * 1000)
+        
+        return AblationResult(
+            span_id=span.id,
+            delta_cos=delta_cos,
+            elapsed_ms=elapsed_ms,
+            sentence_deltas=sentence_deltas.tolist(),
+            deleted_sentences=deleted,
+            inserted_sentences=inserted,
+            parent_id=span.parent_id,
+            depth=span.depth
+        )
+    
+    async def _score_ablated_prompt(
+        self,
+        ablated_prompt: Union[str, List[Dict[str, str]]],
+        scorer: Any,
+        baseline_sentences: List[str],
+        baseline_matrix: np.ndarray,
+        seed: int = 42,
+    ) -> Tuple[float, np.ndarray, List[int], List[int]]:
+        """Complete an ablated prompt and compare the completion with the baseline.
+        
+        Args:
+            ablated_prompt: The prompt with one or more segments removed, or
+                the chat messages with them removed
+            scorer: The scorer instance for calculating impact
+            baseline_sentences: List of baseline sentences
+            baseline_matrix: Normalized baseline sentence embeddings, one row per sentence
+            seed: Seed of the ablated completion
+            
+        Returns:
+            Tuple of (delta_cos, per-sentence deltas, deleted sentences, inserted sentences)
+        """
         # Get completion for the ablated prompt
-        ablated_completion = await self.llm.get_completion(ablated_prompt)
+        if isinstance(ablated_prompt, str):
+            ablated_completion = await self.llm.get_completion(ablated_prompt, seed=seed)
+        else:
+            ablated_completion = await self.llm.get_chat_completion(ablated_prompt, seed=seed)
+        
+        # A baseline without sentences leaves nothing to compare per sentence
+        if not baseline_sentences:
+            delta_cos = await scorer.calculate_distance(ablated_completion)
+            return delta_cos, np.zeros(0, dtype=np.float32), [], []
         
-        # Split ablated completion into sentences and get embeddings
         ablated_sentences = self._split_sentences(ablated_completion)
-        # Pad to length of baseline
-        while len(ablated_sentences) < len(baseline_sentences):
-            ablated_sentences.append("")
-        
-        embedding_tasks = []
-        for s in ablated_sentences:
-            if s:
-                embedding_tasks.append(self.llm.get_embedding(s))
-            else:
-                embedding_tasks.append(None)
-        # Gather embeddings for non-empty sentences
-        embeddings_results = await asyncio.gather(*[t for t in embedding_tasks if t], return_exceptions=False)
-        idx_res = 0
-        ablated_embeddings = []
-        for t in embedding_tasks:
-            if t is None:
-                ablated_embeddings.append([0.0])  # dummy vector for empty sentence
-            else:
-                ablated_embeddings.append(embeddings_results[idx_res])
-                idx_res += 1
-        
-        # Compute per-sentence distances
-        sentence_deltas = []
-        for base_emb, abl_emb in zip(baseline_embeddings, ablated_embeddings):
-            if len(abl_emb) == 1:  # dummy vector
-                sentence_deltas.append(1.0)
+        if self.sentence_alignment != "semantic":
+            # Only sentences with a baseline counterpart are compared
+            ablated_sentences = ablated_sentences[:len(baseline_sentences)]
+        
+        # Embed the sentences in one batched call while scoring the full completion
+        ablated_embeddings, delta_cos = await asyncio.gather(
+            self.llm.get_embeddings(ablated_sentences),
+            scorer.calculate_distance(ablated_completion),
+        )
+        
+        # Missing or unmatched sentences count as fully changed
+        sentence_deltas = np.ones(len(baseline_sentences), dtype=np.float32)
+        deleted: List[int] = []
+        inserted: List[int] = []
+        if self.sentence_alignment == "semantic":
+            if ablated_sentences and baseline_sentences:
+                similarity = baseline_matrix @ scorer.normalize_embeddings(ablated_embeddings).T
+                alignment = align_sentences(similarity, self.alignment_min_similarity)
+                for base_idx, abl_idx in alignment.pairs:
+                    sentence_deltas[base_idx] = 1.0 - similarity[base_idx, abl_idx]
+                deleted, inserted = alignment.deleted, alignment.inserted
             else:
-                similarity = scorer._cosine_similarity(base_emb, abl_emb)
-                sentence_deltas.append(1.0 - similarity)
+                deleted = list(range(len(baseline_sentences)))
+                inserted = list(range(len(ablated_sentences)))
+        elif ablated_sentences:
+            # Compare sentence i with baseline sentence i
+            ablated_matrix = scorer.normalize_embeddings(ablated_embeddings)
+            count = len(ablated_sentences)
+            similarities = np.einsum("ij,ij->i", baseline_matrix[:count], ablated_matrix)
+            sentence_deltas[:count] = 1.0 - similarities
         
-        # Calculate impact using the scorer
-        delta_cos = await scorer.calculate_distance(ablated_completion)
+        return delta_cos, sentence_deltas, deleted, inserted
+    
+    async def _process_segment_streaming(self, prompt: Union[str, ChatPrompt], span: Span, scorer: Any,
+                                         baseline_sentences: List[str], baseline_matrix: np.ndarray,
+                                         seed: int = 42) -> AblationResult:
+        """Process a single segment ablation from a streamed completion.
         
-        # Calculate elapsed time
-        elapsed_ms = int((time.time() - start_time) * 1000)
+        Sentences are scored positionally as soon as they finish. After k of
+        n baseline sentences, the mean per-sentence delta of the finished
+        response (missing sentences counting as fully changed) lies between
+        S / n and (S + n - k) / n, where S is the sum of the k scored deltas.
+        The stream is cancelled once the rest of the completion can move it
+        by at most the stream tolerance, or once its lower bound reaches the
+        settle delta, so an ablation whose first sentences already diverge
+        stops early.
+        
+        A completion read to the end gets the completion-level delta_cos
+        used without streaming. A cancelled one is flagged as partial: its
+        delta_cos is the mean sentence delta, estimated by the mean of the
+        scored sentences and kept within the bounds above (stored as
+        ci_low/ci_high), and its sentence_deltas hold only the scored
+        sentences.
+        
+        Args:
+            prompt: The full prompt, or the layout of a chat prompt
+            span: The segment to ablate
+            scorer: The scorer instance for calculating impact
+            baseline_sentences: List of baseline sentences
+            baseline_matrix: Normalized baseline sentence embeddings, one row per sentence
+            seed: Seed of the ablated completion
+            
+        Returns:
+            Ablation result
+        """
+        start_time = time.time()
+        num_sent = len(baseline_sentences)
+        sentence_deltas = np.ones(num_sent, dtype=np.float32)
+        scored = 0
+        
+        async def score(sentences: List[str]) -> None:
+            nonlocal scored
+            new = sentences[scored:num_sent]
+            if not new:
+                return
+            embeddings = await self.llm.get_embeddings(new)
+            rows = baseline_matrix[scored:scored + len(new)]
+            similarities = np.einsum("ij,ij->i", rows, scorer.normalize_embeddings(embeddings))
+            sentence_deltas[scored:scored + len(new)] = 1.0 - similarities
+            scored += len(new)
+        
+        ablated_prompt = self._remove_segment(prompt, span)
+        text = ""
+        partial = False
+        chunks = self.llm.stream_completion(ablated_prompt, seed=seed)
+        try:
+            async for chunk in chunks:
+                text += chunk
+                # The last sentence may still be growing
+                await score(self._split_sentences(text)[:-1])
+                if num_sent and self._stream_settled(sentence_deltas, scored):
+                    partial = True
+                    break
+        finally:
+            await chunks.aclose()
+        
+        ci_low = ci_high = None
+        if partial:
+            total = float(sentence_deltas[:scored].sum())
+            ci_low, ci_high = total / num_sent, (total + num_sent - scored) / num_sent
+            delta_cos = min(max(total / scored if scored else 1.0, ci_low), ci_high)
+            sentence_deltas = sentence_deltas[:scored]
+        else:
+            await score(self._split_sentences(text))
+            delta_cos = await scorer.calculate_distance(text)
         
         return AblationResult(
             span_id=span.id,
             delta_cos=delta_cos,
-            elapsed_ms=elapsed_ms,
-            sentence_deltas=sentence_deltas
+            elapsed_ms=int((time.time() - start_time) * 1000),
+            sentence_deltas=sentence_deltas.tolist(),
+            partial=partial,
+            parent_id=span.parent_id,
+            depth=span.depth,
+            ci_low=ci_low,
+            ci_high=ci_high,
         )
     
+    def _stream_settled(self, sentence_deltas: np.ndarray, scored: int) -> bool:
+        """Whether the unread sentences of a streamed completion no longer matter.
+        
+        Args:
+            sentence_deltas: Per-sentence deltas, the first `scored` of them final
+            scored: Number of baseline sentences scored so far
+            
+        Returns:
+            Whether the mean sentence delta is within the stream tolerance of
+            its final value, or already known to reach the settle delta
+        """
+        num_sent = len(sentence_deltas)
+        remaining = (num_sent - scored) / num_sent
+        lower_bound = float(sentence_deltas[:scored].sum()) / num_sent
+        return remaining <= self.stream_tolerance or lower_bound >= self.stream_settle_delta
+    
     async def run_ablation_tests(
         self, 
         run: Run, 
@@ -130,6 +511,19 @@ class AblationEngine:
     ) -> Run:
         """Run ablation tests for each segment.
         
+        Each result is added to the run as soon as its ablation completes.
+        If the run fails or receives SIGINT/SIGTERM, the remaining tests are
+        cancelled and the completed results are saved with status
+        "interrupted", so the run can be continued with `resume`.
+        
+        With early stopping, segments are tested in priority order (see
+        `_prioritize_segments`) and results are committed in that order as
+        they complete. Once the cumulative impact of the committed results
+        reaches `early_stop_threshold`, outstanding tests are cancelled and
+        results that finished out of order are dropped, so the stopping
+        point does not depend on request timing. The number of segments and
+        API calls saved are recorded in the run's stats.
+        
         Args:
             run: The run to process
             segments: Segments to test (defaults to run's segments)
@@ -139,13 +533,18 @@ class AblationEngine:
             
         Returns:
             Updated run with ablation results
+            
+        Raises:
+            RunInterrupted: If the run was stopped by SIGINT or SIGTERM
         """
         # Import here to avoid circular imports
         if scorer is None:
             from ..scorer import Scorer
             scorer = Scorer(run.completion, self.llm)
         
-        prompt = run.prompt
+        prompt = self._prompt_of(run)
+        stats_before = self.llm.get_stats()
+        previous_stats = dict(run.stats)
         
         # Get segments if not provided
         if segments is None:
@@ -154,14 +553,34 @@ class AblationEngine:
                     start=s["start"],
                     end=s["end"],
                     text=s["text"],
-                    id=s["id"]
+                    id=s["id"],
+                    parent_id=s.get("parent_id"),
+                    depth=s.get("depth", 0),
+                    message_index=s.get("message_index"),
+                    message_offset=s.get("message_offset"),
                 )
                 for s in run.segments
             ]
         
+        # Impact of segments tested in an earlier session counts toward early stopping
+        segment_ids = {s.id for s in segments}
+        scorer.reset_impact(sum(
+            result["delta_cos"] for result in run.ablation_results if result["span_id"] in segment_ids
+        ))
+        
         # Filter segments to skip
         if skip_ids:
             segments = [s for s in segments if s.id not in skip_ids]
+        if early_stop and scorer.should_early_stop():
+            segments = []
+        
+        if self.ablation_strategy == "group":
+            # Import here to avoid circular imports
+            from .group_ablation import GroupAblation
+            group = GroupAblation(self)
+            # Subset ablations only pay off when they need fewer calls than segments
+            if segments and group.planned_calls(len(segments)) < len(segments):
+                return await group.run(run, scorer, segments)
         
         # Check if projected cost exceeds limit
         segment_count = len(segments)
@@ -172,58 +591,226 @@ class AblationEngine:
                 f"Projected cost ${projected_cost:.2f} exceeds maximum allowed ${self.max_cost:.2f}. "
                 f"Consider using hierarchical sampling to reduce costs."
             )
+        if self.stream_ablations and self.sentence_alignment == "semantic":
+            raise ValueError(
+                "Streaming ablations score sentences positionally; "
+                "STREAM_ABLATIONS cannot be combined with SENTENCE_ALIGNMENT=semantic."
+            )
+        if self.cost_budget is not None and not self.cost_budget.reserve(projected_cost):
+            raise BudgetExceeded(
+                f"Projected cost ${projected_cost:.2f} exceeds the remaining "
+                f"budget ${self.cost_budget.remaining:.2f}."
+            )
         
         # Process segments in parallel with concurrency limit
-        semaphore = asyncio.Semaphore(self.settings.max_concurrent_requests)
-        cumulative_impact = 0.0
-        early_stop_threshold = self.settings.early_stop_threshold
+        semaphore = self.semaphore or asyncio.Semaphore(self.llm.concurrency_limit)
         
-        # Precompute baseline sentences and embeddings
-        baseline_sentences = self._split_sentences(run.completion)
-        baseline_embeddings = await asyncio.gather(*[self.llm.get_embedding(s) for s in baseline_sentences])
+        # Precompute baseline sentences and their normalized embedding matrix
+        baseline_sentences, baseline_matrix = await self._get_baseline_matrix(run.completion, scorer)
+        
+        process = self._process_segment_streaming if self.stream_ablations else self._process_segment
+        
+        # Ablations that got past the semaphore and may have sent requests
+        started = 0
         
         async def bounded_process(span):
+            nonlocal started
             async with semaphore:
-                return await self._process_segment(prompt, span, scorer,
-                                                   baseline_sentences, baseline_embeddings)
-        
-        # Sort segments by ID to process in order
-        sorted_segments = sorted(segments, key=lambda s: s.id)
-        tasks = []
-        
-        for span in sorted_segments:
-            # Add task to the list
-            tasks.append(bounded_process(span))
-            
-            # Check cumulative impact for early stopping
-            if (early_stop and 
-                tasks and 
-                cumulative_impact >= early_stop_threshold):
-                print(f"Early stopping at {cumulative_impact:.2f} cumulative impact")
-                break
-        
-        # Execute all tasks
-        results = await asyncio.gather(*tasks)
-        
-        # Update run with results
-        for result in results:
-            cumulative_impact += result.delta_cos
+                started += 1
+                return await process(prompt, span, scorer,
+                                     baseline_sentences, baseline_matrix)
+        
+        # Tasks are created in priority order, so they reach the semaphore in that order
+        ordered_segments = self._prioritize_segments(segments)
+        position = {span.id: index for index, span in enumerate(ordered_segments)}
+        
+        run.status = "running"
+        tasks = [asyncio.ensure_future(bounded_process(span)) for span in ordered_segments]
+        recorded: Set[int] = set()
+        interrupted_by: List[int] = []
+        
+        # Results that finished ahead of an earlier segment in the priority order
+        finished: Dict[int, AblationResult] = {}
+        next_position = 0
+        stopped = False
+        
+        def record(result: AblationResult) -> None:
+            nonlocal run
+            recorded.add(result.span_id)
             run = self.run_manager.add_ablation_result(run, result)
         
-        # After gathering results compute controlling mapping
-        num_sent = len(baseline_sentences)
-        control = [-1] * num_sent
-        max_scores = [-1.0] * num_sent
-        for result in results:
-            sid = result.span_id
-            for idx, delta in enumerate(result.sentence_deltas):
-                if idx < num_sent and delta > max_scores[idx]:
-                    max_scores[idx] = delta
-                    control[idx] = sid
+        def commit(result: AblationResult) -> bool:
+            """Record results in priority order; return whether to stop."""
+            nonlocal next_position
+            finished[position[result.span_id]] = result
+            while next_position in finished:
+                result = finished.pop(next_position)
+                next_position += 1
+                record(result)
+                scorer.record_impact(result.delta_cos)
+                if scorer.should_early_stop():
+                    print(f"Early stopping at {scorer.cumulative_impact:.2f} cumulative impact")
+                    return True
+            return False
+        
+        def on_signal(signum: int) -> None:
+            interrupted_by.append(signum)
+            for task in tasks:
+                task.cancel()
+        
+        installed_signals = install_signal_handlers(on_signal) if self.handle_signals else []
+        try:
+            # Persist each result as soon as its ablation finishes
+            for next_result in asyncio.as_completed(tasks):
+                result = await next_result
+                if not early_stop:
+                    record(result)
+                elif commit(result):
+                    stopped = True
+                    break
+            
+            if stopped:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except BaseException:
+            await self._checkpoint_interrupted(
+                run, tasks,
+                lambda result: record(result) if result.span_id not in recorded else None,
+                lambda: len(tasks) - started,
+                stats_before, previous_stats,
+            )
+            if interrupted_by:
+                raise RunInterrupted(run.id, interrupted_by[0]) from None
+            raise
+        finally:
+            remove_signal_handlers(installed_signals)
+        
+        self._refund(len(tasks) - started)
+        self._update_control_mapping(run, len(baseline_sentences))
+        
+        session_stats = self._llm_stats_since(stats_before)
+        if early_stop:
+            # Segments without a result; those whose ablation never got a
+            # request slot saved one completion and one embedding request
+            session_stats["early_stop_skipped_segments"] = len(tasks) - len(recorded)
+            session_stats["api_calls_saved"] = 2 * (len(tasks) - started)
+        run.stats = self._merge_stats(previous_stats, session_stats)
+        run.status = "completed"
+        self.run_manager._save_run(run)
+        
+        return run
+    
+    def _refund(self, calls: int) -> None:
+        """Return the reserved cost of ablations that never sent a request."""
+        if self.cost_budget is not None and calls > 0:
+            self.cost_budget.refund(calls * self.estimated_cost_per_request)
+    
+    async def _checkpoint_interrupted(
+        self,
+        run: Run,
+        tasks: List[asyncio.Future],
+        record: Callable[[Any], None],
+        unstarted: Callable[[], int],
+        stats_before: Dict[str, int],
+        previous_stats: Dict[str, int],
+    ) -> None:
+        """Cancel a run's outstanding ablations and save it as interrupted.
+        
+        Ablations that finished but were not recorded yet are recorded, and
+        the reserved cost of those that never started is refunded.
+        
+        Args:
+            run: The run being processed
+            tasks: Ablation tasks of the run
+            record: Records a finished task's result (skipping recorded ones)
+            unstarted: Number of tasks that never started, once all are done
+            stats_before: LLM stats snapshot taken when the session started
+            previous_stats: Run stats from earlier sessions
+        """
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        
+        # Keep results that finished but had not been recorded yet
+        for task in tasks:
+            if task.done() and not task.cancelled() and task.exception() is None:
+                record(task.result())
+        
+        self._refund(unstarted())
+        run.status = "interrupted"
+        run.stats = self._merge_stats(previous_stats, self._llm_stats_since(stats_before))
+        self.run_manager._save_run(run)
+    
+    def _update_control_mapping(self, run: Run, num_sent: int) -> None:
+        """Sort the run's results and map each response sentence to its controlling segment.
+        
+        Args:
+            run: Run whose results are complete
+            num_sent: Number of baseline sentences
+        """
+        # Keep results in segment order regardless of completion order
+        run.ablation_results.sort(key=lambda r: r["span_id"])
+        
+        # After gathering results compute controlling mapping from the
+        # segment x sentence influence matrix
+        results = run.ablation_results
+        self.influence_matrix = self._build_influence_matrix(results, num_sent)
+        self.influence_span_ids = [result["span_id"] for result in results]
+        if results and num_sent:
+            control = [self.influence_span_ids[i] for i in self.influence_matrix.argmax(axis=0)]
+            max_scores = self.influence_matrix.max(axis=0).tolist()
+        else:
+            control = [-1] * num_sent
+            max_scores = [-1.0] * num_sent
         
         # Update run with control mapping
         run.response_control = control
         run.response_sentence_deltas = max_scores
-        self.run_manager._save_run(run)
+    
+    async def resume(self, run_id: str, scorer: Optional[Any] = None, early_stop: bool = True) -> Run:
+        """Continue an interrupted run, skipping segments that already have results.
+        
+        Args:
+            run_id: ID of the run to resume
+            scorer: Optional scorer instance (will be created if not provided)
+            early_stop: Whether to enable early stopping
+            
+        Returns:
+            Updated run with ablation results
+            
+        Raises:
+            ValueError: If the run does not exist
+        """
+        run = self._load_run(run_id)
+        completed_ids = {result["span_id"] for result in run.ablation_results}
+        
+        return await self.run_ablation_tests(
+            run, skip_ids=completed_ids, early_stop=early_stop, scorer=scorer
+        )
+    
+    def _load_run(self, run_id: str) -> Run:
+        """Load a run for resuming.
         
-        return run 
\ No newline at end of file
+        Args:
+            run_id: ID of the run to load
+            
+        Returns:
+            The run
+            
+        Raises:
+            ValueError: If the run does not exist
+        """
+        run = self.run_manager.get_run(run_id)
+        if run is None:
+            raise ValueError(f"Run {run_id} not found")
+        
+        print(f"Resuming run {run_id} with {len(run.ablation_results)} completed ablations")
+        return run
+    
+    def _merge_stats(self, previous: Dict[str, int], new: Dict[str, int]) -> Dict[str, int]:
+        """Add counters from this session to those saved with the run."""
+        merged = dict(previous)
+        for key, value in new.items():
+            merged[key] = merged.get(key, 0) + value
+        return merged
@@ -0,0 +1,307 @@
+"""Adaptive allocation of repeated ablation samples across segments."""
+
+import asyncio
+import math
+from dataclasses import dataclass, field
+from statistics import NormalDist
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from ..segmenter import Span
+from .ablation_engine import (
+    AblationEngine,
+    BudgetExceeded,
+    RunInterrupted,
+    install_signal_handlers,
+    remove_signal_handlers,
+)
+from .run_manager import AblationResult, Run
+
+
+@dataclass
+class SpanSamples:
+    """Ablation samples drawn for one segment."""
+
+    span: Span
+    deltas: List[float] = field(default_factory=list)
+    sentence_deltas: List[List[float]] = field(default_factory=list)
+    elapsed_ms: int = 0
+
+    @property
+    def count(self) -> int:
+        return len(self.deltas)
+
+    @property
+    def mean(self) -> float:
+        return float(np.mean(self.deltas)) if self.deltas else 0.0
+
+    @property
+    def variance(self) -> float:
+        """Unbiased sample variance (0 with fewer than two samples)."""
+        return float(np.var(self.deltas, ddof=1)) if self.count > 1 else 0.0
+
+    def radius(self, z: float, min_variance: float) -> float:
+        """Half-width of the confidence interval of the mean."""
+        return z * math.sqrt(max(self.variance, min_variance) / max(1, self.count))
+
+
+class AdaptiveSampler:
+    """Repeats ablations where they matter for the top-k ranking.
+
+    A single ablation's delta_cos is noisy even at temperature 0, but
+    sampling every segment many times is expensive. In the spirit of LUCB,
+    each round draws one more sample (with a new seed) for every segment
+    whose confidence interval still overlaps the boundary between the top
+    `top_k` segments and the rest. Sampling stops once the top-k set is
+    separated by its confidence bounds (up to `tolerance`, so segments of
+    practically equal impact do not have to be told apart), segments reach
+    `max_samples`, or `max_cost` or the engine's shared cost budget is
+    spent.
+
+    Each sample is saved with the run as it finishes, so re-running an
+    interrupted sampler only pays for samples it had not drawn yet.
+    """
+
+    def __init__(
+        self,
+        engine: Optional[AblationEngine] = None,
+        top_k: Optional[int] = None,
+        confidence: Optional[float] = None,
+        max_samples: Optional[int] = None,
+        min_samples: int = 2,
+        min_variance: float = 1e-4,
+        tolerance: float = 0.02,
+        max_cost: Optional[float] = None,
+    ):
+        """Initialize the sampler.
+
+        Args:
+            engine: Engine used to run the ablations
+            top_k: Size of the ranking that must be stable (defaults to ADAPTIVE_TOP_K)
+            confidence: Confidence level of the intervals (defaults to ADAPTIVE_CONFIDENCE)
+            max_samples: Most samples drawn for one segment (defaults to ADAPTIVE_MAX_SAMPLES)
+            min_samples: Samples drawn for every segment before adapting
+            min_variance: Variance assumed at least, so a few identical
+                samples do not give a zero-width interval
+            tolerance: Overlap of confidence bounds still accepted as separated
+            max_cost: Cost budget of the run (defaults to MAX_COST_PER_RUN)
+        """
+        self.engine = engine or AblationEngine()
+        settings = self.engine.settings
+        self.top_k = top_k if top_k is not None else settings.adaptive_top_k
+        self.confidence = confidence if confidence is not None else settings.adaptive_confidence
+        self.max_samples = max_samples if max_samples is not None else settings.adaptive_max_samples
+        self.min_samples = min_samples
+        self.min_variance = min_variance
+        self.tolerance = tolerance
+        self.max_cost = max_cost if max_cost is not None else self.engine.max_cost
+
+        self.z = NormalDist().inv_cdf(0.5 + self.confidence / 2)
+
+    async def run(self, run: Run, scorer: Optional[Any] = None, segments: Optional[List[Span]] = None) -> Run:
+        """Sample ablations for a run's segments and record their statistics.
+
+        Each segment gets one result whose delta_cos and sentence_deltas
+        are means over its samples, with the sample count, variance and
+        confidence interval. The run's stats record the samples drawn and
+        whether the top-k ranking was stable when sampling stopped.
+
+        Every sample is saved as soon as it finishes, and each round
+        reserves its cost from the engine's shared budget; a round the
+        budget cannot fully cover draws only the samples it can pay for.
+        Samples recorded in the run's adaptive_samples are not drawn again.
+
+        Args:
+            run: The run to process
+            scorer: Optional scorer instance (will be created if not provided)
+            segments: Segments to test (defaults to the run's segments)
+
+        Returns:
+            Updated run with ablation results
+
+        Raises:
+            ValueError: If the budget does not cover one sample per segment
+            BudgetExceeded: If the shared budget cannot cover one sample per segment
+            RunInterrupted: If the run was stopped by SIGINT or SIGTERM
+        """
+        engine = self.engine
+
+        # Import here to avoid circular imports
+        if scorer is None:
+            from ..scorer import Scorer
+            scorer = Scorer(run.completion, engine.llm)
+
+        if segments is None:
+            segments = [Span(**segment) for segment in run.segments]
+
+        cost = engine.estimated_cost_per_request
+        max_calls = int(self.max_cost / cost)
+        if len(segments) > max_calls:
+            raise ValueError(
+                f"Projected cost ${len(segments) * cost:.2f} exceeds "
+                f"maximum allowed ${self.max_cost:.2f}. Consider using hierarchical sampling to reduce costs."
+            )
+
+        # Samples drawn in an earlier session; each segment's seeds run 42, 43, ...
+        arms = [SpanSamples(span) for span in sorted(segments, key=lambda s: s.id)]
+        by_id = {arm.span.id: arm for arm in arms}
+
+        def add(sample: Dict) -> bool:
+            arm = by_id.get(sample["span_id"])
+            if arm is None or sample["seed"] != 42 + arm.count:
+                return False
+            arm.deltas.append(sample["delta_cos"])
+            arm.sentence_deltas.append(sample["sentence_deltas"])
+            arm.elapsed_ms += sample["elapsed_ms"]
+            return True
+
+        def record(sample: Dict) -> None:
+            nonlocal run
+            if add(sample):
+                run = engine.run_manager.add_adaptive_sample(run, sample)
+
+        for sample in sorted(run.adaptive_samples, key=lambda sample: sample["seed"]):
+            add(sample)
+        calls = sum(arm.count for arm in arms)
+
+        unsampled = [arm for arm in arms if arm.count == 0]
+        if engine.cost_budget is not None and not engine.cost_budget.reserve(len(unsampled) * cost):
+            raise BudgetExceeded(
+                f"Projected cost ${len(unsampled) * cost:.2f} exceeds the remaining "
+                f"budget ${engine.cost_budget.remaining:.2f}."
+            )
+
+        def reserve(round_arms: List[SpanSamples]) -> List[SpanSamples]:
+            """The leading arms of a round, as many as the budgets cover."""
+            round_arms = round_arms[:max_calls - calls]
+            if engine.cost_budget is None:
+                return round_arms
+            n = min(len(round_arms), int(engine.cost_budget.remaining // cost))
+            while n and not engine.cost_budget.reserve(n * cost):
+                n -= 1
+            return round_arms[:n]
+
+        run.status = "running"
+        stats_before = engine.llm.get_stats()
+        previous_stats = dict(run.stats)
+        baseline_sentences, baseline_matrix = await engine._get_baseline_matrix(run.completion, scorer)
+        semaphore = engine.semaphore or asyncio.Semaphore(engine.llm.concurrency_limit)
+        prompt = engine._prompt_of(run)
+
+        tasks: List[asyncio.Future] = []
+        started = 0
+        interrupted_by: List[int] = []
+
+        async def sample(arm: SpanSamples, seed: int) -> Dict:
+            nonlocal started
+            async with semaphore:
+                started += 1
+                result = await engine._process_segment(
+                    prompt, arm.span, scorer, baseline_sentences, baseline_matrix, seed=seed
+                )
+            return {
+                "span_id": arm.span.id,
+                "seed": seed,
+                "delta_cos": float(result.delta_cos),
+                "sentence_deltas": list(result.sentence_deltas),
+                "elapsed_ms": result.elapsed_ms,
+            }
+
+        async def draw(round_arms: List[SpanSamples]) -> None:
+            """Draw one more sample for each arm, saving each as it finishes."""
+            nonlocal tasks, started, calls
+            # The first sample uses the default seed, so it matches a single-sample run
+            started = 0
+            tasks = [asyncio.ensure_future(sample(arm, 42 + arm.count)) for arm in round_arms]
+            if interrupted_by:
+                # Stopped between rounds: the new tasks are cancelled and refunded
+                raise asyncio.CancelledError()
+            for next_sample in asyncio.as_completed(tasks):
+                record(await next_sample)
+            calls += len(round_arms)
+
+        def on_signal(signum: int) -> None:
+            interrupted_by.append(signum)
+            for task in tasks:
+                task.cancel()
+
+        installed_signals = install_signal_handlers(on_signal) if engine.handle_signals else []
+        try:
+            # Initial samples for every segment, as many rounds as the budget allows
+            await draw(unsampled)
+            initial_rounds = max(1, min(self.min_samples, self.max_samples, max_calls // max(1, len(arms))))
+            for count in range(1, initial_rounds):
+                await draw(reserve([arm for arm in arms if arm.count <= count]))
+
+            while calls < max_calls:
+                candidates = [arm for arm in self._unsettled(arms) if arm.count < self.max_samples]
+                # The widest intervals first, in case the budget cuts the round short
+                candidates.sort(key=lambda arm: -arm.radius(self.z, self.min_variance))
+                candidates = reserve(candidates)
+                if not candidates:
+                    break
+                await draw(candidates)
+        except BaseException:
+            await engine._checkpoint_interrupted(
+                run, tasks, record, lambda: len(tasks) - started, stats_before, previous_stats
+            )
+            if interrupted_by:
+                raise RunInterrupted(run.id, interrupted_by[0]) from None
+            raise
+        finally:
+            remove_signal_handlers(installed_signals)
+
+        for arm in arms:
+            radius = arm.radius(self.z, self.min_variance)
+            run = engine.run_manager.add_ablation_result(run, AblationResult(
+                span_id=arm.span.id,
+                delta_cos=arm.mean,
+                elapsed_ms=arm.elapsed_ms,
+                sentence_deltas=np.mean(arm.sentence_deltas, axis=0).tolist() if arm.sentence_deltas else [],
+                parent_id=arm.span.parent_id,
+                depth=arm.span.depth,
+                samples=arm.count,
+                delta_var=arm.variance,
+                ci_low=arm.mean - radius,
+                ci_high=arm.mean + radius,
+            ))
+
+        engine._update_control_mapping(run, len(baseline_sentences))
+        run.stats = engine._merge_stats(previous_stats, engine._llm_stats_since(stats_before))
+        # Totals across sessions, including samples restored from an earlier one
+        run.stats["adaptive_samples"] = calls
+        run.stats["adaptive_stable"] = int(not self._unsettled(arms))
+        run.status = "completed"
+        engine.run_manager._save_run(run)
+
+        return run
+
+    def _unsettled(self, arms: List[SpanSamples]) -> List[SpanSamples]:
+        """Segments whose membership in the top k is not yet settled.
+
+        A top-k segment is unsettled while its lower bound is more than
+        `tolerance` below the highest upper bound outside the top k, and
+        vice versa.
+
+        Args:
+            arms: Samples of all segments
+
+        Returns:
+            Unsettled segments (empty once the top-k ranking is stable)
+        """
+        k = min(self.top_k, len(arms))
+        if k <= 0 or k >= len(arms):
+            return []
+
+        ranked = sorted(arms, key=lambda arm: (-arm.mean, arm.span.id))
+        top, rest = ranked[:k], ranked[k:]
+        bound = {id(arm): arm.radius(self.z, self.min_variance) for arm in ranked}
+
+        lowest_top = min(arm.mean - bound[id(arm)] for arm in top)
+        highest_rest = max(arm.mean + bound[id(arm)] for arm in rest)
+
+        return (
+            [arm for arm in top if arm.mean - bound[id(arm)] + self.tolerance < highest_rest]
+            + [arm for arm in rest if arm.mean + bound[id(arm)] - self.tolerance > lowest_top]
+        )
@@ -0,0 +1,409 @@
+"""Backends that perform the actual completion and embedding requests."""
+
+import asyncio
+import hashlib
+import math
+import random
+import re
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from ..settings import Settings, get_settings
+
+
+@dataclass
+class CompletionResponse:
+    """Result of a single chat completion request."""
+
+    text: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    # Response headers (rate-limit information), if the backend exposes them
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class EmbeddingResponse:
+    """Result of a single (possibly multi-input) embedding request."""
+
+    embeddings: List[List[float]]
+    total_tokens: int = 0
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+class RateLimitExceeded(Exception):
+    """Raised by a backend when a request is rejected with HTTP 429."""
+
+    def __init__(self, message: str = "Rate limit exceeded", retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMBackend(ABC):
+    """Interface for the service that answers completion and embedding requests."""
+
+    @abstractmethod
+    async def complete(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        seed: int,
+        max_tokens: int,
+    ) -> CompletionResponse:
+        """Generate a chat completion for the given messages."""
+
+    @abstractmethod
+    async def embed(self, model: str, texts: List[str]) -> EmbeddingResponse:
+        """Embed each of the given texts."""
+
+    async def stream(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        seed: int,
+        max_tokens: int,
+    ) -> AsyncIterator[str]:
+        """Start a streaming chat completion.
+
+        Awaiting this opens the request, so rate-limit errors surface here;
+        the returned iterator yields text chunks. Closing the iterator early
+        cancels the rest of the completion.
+
+        Backends without native streaming return the full completion as a
+        single chunk.
+        """
+        response = await self.complete(model, messages, temperature, seed, max_tokens)
+
+        async def chunks() -> AsyncIterator[str]:
+            yield response.text
+
+        return chunks()
+
+
+class OpenAIBackend(LLMBackend):
+    """Backend that calls the OpenAI API."""
+
+    def __init__(self, api_key: str):
+        """Initialize the OpenAI backend.
+
+        Args:
+            api_key: OpenAI API key
+        """
+        from openai import AsyncOpenAI
+
+        self.client = AsyncOpenAI(api_key=api_key)
+
+    async def complete(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        seed: int,
+        max_tokens: int,
+    ) -> CompletionResponse:
+        # The raw response exposes the x-ratelimit-* headers
+        raw = await self.client.chat.completions.with_raw_response.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            seed=seed,
+            max_tokens=max_tokens,
+        )
+        response = raw.parse()
+        usage = response.usage
+        return CompletionResponse(
+            text=response.choices[0].message.content,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+            headers=dict(raw.headers),
+        )
+
+    async def stream(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        seed: int,
+        max_tokens: int,
+    ) -> AsyncIterator[str]:
+        response = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            seed=seed,
+            max_tokens=max_tokens,
+            stream=True,
+        )
+
+        async def chunks() -> AsyncIterator[str]:
+            try:
+                async for chunk in response:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                # Closing the HTTP response cancels the rest of the generation
+                await response.close()
+
+        return chunks()
+
+    async def embed(self, model: str, texts: List[str]) -> EmbeddingResponse:
+        raw = await self.client.embeddings.with_raw_response.create(model=model, input=texts)
+        response = raw.parse()
+
+        # The API returns one item per input, tagged with its input index
+        data = sorted(response.data, key=lambda item: item.index)
+        usage = response.usage
+        return EmbeddingResponse(
+            embeddings=[item.embedding for item in data],
+            total_tokens=usage.total_tokens if usage else 0,
+            headers=dict(raw.headers),
+        )
+
+
+class FakeBackend(LLMBackend):
+    """Offline stand-in backend with deterministic outputs.
+
+    Completions are built from the prompt text: every sentence or line of
+    the messages yields one output sentence derived from its hash, so
+    removing a segment removes (or changes) the matching sentences.
+    Embeddings are hashed bag-of-words vectors, so similar texts get similar
+    vectors. Latency, jitter and 429 responses can be simulated, either at
+    random or by enforcing per-minute request and token limits, in which case
+    responses carry OpenAI-style x-ratelimit-* headers.
+    """
+
+    _WORDS = (
+        "the model should focus on clear concise answers with careful reasoning "
+        "about risk data users context format tone examples rules safety output "
+        "summary detail evidence steps constraints style length priority review"
+    ).split()
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        token_latency_ms: float = 0.0,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        dimensions: int = 1536,
+        max_sentences: int = 15,
+        seed: int = 0,
+        sample_noise: float = 0.0,
+    ):
+        """Initialize the fake backend.
+
+        Args:
+            latency_ms: Simulated latency per request
+            jitter_ms: Maximum random latency added to each request
+            rate_limit_rate: Probability that a request fails with a 429
+            token_latency_ms: Simulated delay between streamed chunks
+            requests_per_minute: Requests accepted per minute (0 = unlimited)
+            tokens_per_minute: Tokens accepted per minute (0 = unlimited)
+            dimensions: Length of the embedding vectors
+            max_sentences: Maximum number of sentences per completion
+            seed: Seed for the jitter and 429 injection
+            sample_noise: Fraction of sentences that vary with the request seed
+                even at temperature 0, like real models do
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit_rate = rate_limit_rate
+        self.token_latency_ms = token_latency_ms
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.dimensions = dimensions
+        self.max_sentences = max_sentences
+        self.sample_noise = sample_noise
+        self._rng = random.Random(seed)
+        
+        # (time, tokens) of requests accepted within the last minute
+        self._window: Deque[Tuple[float, int]] = deque()
+
+        # Counters for reporting
+        self.completion_calls = 0
+        self.embedding_calls = 0
+        self.rate_limited_calls = 0
+
+    async def _simulate_request(self, tokens: int = 0) -> Dict[str, str]:
+        """Sleep for the simulated latency and maybe answer with a 429.
+
+        Args:
+            tokens: Tokens the request counts against the per-minute limit
+
+        Returns:
+            Rate-limit headers for the response
+        """
+        delay = self.latency_ms + self._rng.uniform(0.0, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000.0)
+
+        if self.rate_limit_rate and self._rng.random() < self.rate_limit_rate:
+            self.rate_limited_calls += 1
+            raise RateLimitExceeded(retry_after=(self.latency_ms or 100.0) / 1000.0)
+
+        return self._check_limits(tokens)
+
+    def _check_limits(self, tokens: int) -> Dict[str, str]:
+        """Admit a request against the sliding one-minute window or raise a 429."""
+        if not self.requests_per_minute and not self.tokens_per_minute:
+            return {}
+
+        now = time.monotonic()
+        while self._window and now - self._window[0][0] >= 60.0:
+            self._window.popleft()
+
+        used_tokens = sum(t for _, t in self._window)
+        over_requests = self.requests_per_minute and len(self._window) >= self.requests_per_minute
+        over_tokens = self.tokens_per_minute and used_tokens + tokens > self.tokens_per_minute
+        if over_requests or over_tokens:
+            self.rate_limited_calls += 1
+            retry_after = 60.0 - (now - self._window[0][0]) if self._window else 1.0
+            raise RateLimitExceeded(retry_after=retry_after)
+
+        self._window.append((now, tokens))
+        headers = {}
+        if self.requests_per_minute:
+            headers["x-ratelimit-limit-requests"] = str(self.requests_per_minute)
+            headers["x-ratelimit-remaining-requests"] = str(self.requests_per_minute - len(self._window))
+        if self.tokens_per_minute:
+            headers["x-ratelimit-limit-tokens"] = str(self.tokens_per_minute)
+            headers["x-ratelimit-remaining-tokens"] = str(self.tokens_per_minute - used_tokens - tokens)
+        return headers
+
+    @staticmethod
+    def _request_tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+        """Tokens a completion request counts against the limit (prompt plus max_tokens)."""
+        return sum(len(m.get("content") or "") for m in messages) // 4 + max_tokens
+
+    def _sentence_for(self, text: str, salt: str = "") -> str:
+        """Build a deterministic sentence from the hash of a text."""
+        digest = hashlib.sha256((salt + text).encode()).digest()
+        words = [self._WORDS[b % len(self._WORDS)] for b in digest[: 6 + digest[-1] % 6]]
+        return " ".join(words).capitalize() + "."
+
+    async def complete(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        seed: int,
+        max_tokens: int,
+    ) -> CompletionResponse:
+        headers = await self._simulate_request(self._request_tokens(messages, max_tokens))
+        self.completion_calls += 1
+        response = self._complete_text(messages, temperature, seed, max_tokens)
+        response.headers = headers
+        return response
+
+    def _complete_text(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        seed: int,
+        max_tokens: int,
+    ) -> CompletionResponse:
+        """Build the deterministic completion for the given messages."""
+        prompt = "\n".join(m.get("content") or "" for m in messages)
+        lines = [part.strip() for part in re.split(r"(?<=[.!?])\s+|\n+", prompt) if part.strip()]
+
+        # Non-zero temperature makes the answer depend on the seed as well;
+        # with sample noise, some sentences do even at temperature 0
+        sentences = []
+        for line in lines[: self.max_sentences]:
+            varies = temperature > 0 or (
+                self.sample_noise and self._noise_draw(line, seed) < self.sample_noise
+            )
+            sentences.append(self._sentence_for(line, f"{seed}:" if varies else ""))
+        text = " ".join(sentences)
+
+        # Respect max_tokens using the usual 4-chars-per-token approximation
+        text = text[: max_tokens * 4]
+        return CompletionResponse(
+            text=text,
+            prompt_tokens=len(prompt) // 4,
+            completion_tokens=len(text) // 4,
+        )
+
+    @staticmethod
+    def _noise_draw(line: str, seed: int) -> float:
+        """Deterministic uniform draw in [0, 1) for a sentence and seed."""
+        digest = hashlib.blake2b(f"{seed}:{line}".encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "little") / 2.0 ** 64
+
+    async def stream(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        seed: int,
+        max_tokens: int,
+    ) -> AsyncIterator[str]:
+        await self._simulate_request(self._request_tokens(messages, max_tokens))
+        self.completion_calls += 1
+        response = self._complete_text(messages, temperature, seed, max_tokens)
+
+        async def chunks() -> AsyncIterator[str]:
+            # One chunk per word, like a token stream
+            for chunk in re.findall(r"\S+\s*", response.text):
+                if self.token_latency_ms:
+                    await asyncio.sleep(self.token_latency_ms / 1000.0)
+                yield chunk
+
+        return chunks()
+
+    def _embed_text(self, text: str) -> List[float]:
+        """Hashed bag-of-words embedding, normalized to unit length."""
+        vector = [0.0] * self.dimensions
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+
+        norm = math.sqrt(sum(v * v for v in vector))
+        if norm == 0:
+            return vector
+        return [v / norm for v in vector]
+
+    async def embed(self, model: str, texts: List[str]) -> EmbeddingResponse:
+        total_tokens = sum(len(text) // 4 for text in texts)
+        headers = await self._simulate_request(total_tokens)
+        self.embedding_calls += 1
+
+        return EmbeddingResponse(
+            embeddings=[self._embed_text(text) for text in texts],
+            total_tokens=total_tokens,
+            headers=headers,
+        )
+
+
+def create_backend(settings: Optional[Settings] = None) -> LLMBackend:
+    """Create the LLM backend selected in the settings.
+
+    Args:
+        settings: Settings to use (defaults to the global settings)
+
+    Returns:
+        Configured backend
+    """
+    settings = settings or get_settings()
+
+    if settings.llm_backend == "openai":
+        return OpenAIBackend(settings.openai_api_key.get_secret_value())
+    if settings.llm_backend == "fake":
+        return FakeBackend(
+            latency_ms=settings.fake_latency_ms,
+            jitter_ms=settings.fake_jitter_ms,
+            rate_limit_rate=settings.fake_rate_limit_rate,
+            token_latency_ms=settings.fake_token_latency_ms,
+            requests_per_minute=settings.fake_requests_per_minute,
+            tokens_per_minute=settings.fake_tokens_per_minute,
+            sample_noise=settings.fake_sample_noise,
+        )
+
+    raise ValueError(f"Unknown LLM backend: {settings.llm_backend}")
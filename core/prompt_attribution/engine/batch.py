@@ -0,0 +1,229 @@
+"""Batch attribution of many prompts with shared concurrency and cost budgets."""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Union
+
+from ..datasets import PromptCase
+from ..segmenter import Segmenter
+from ..settings import get_settings
+from .ablation_engine import (
+    AblationEngine,
+    BudgetExceeded,
+    CostBudget,
+    install_signal_handlers,
+    remove_signal_handlers,
+)
+from .hierarchical_engine import HierarchicalAblationEngine
+from .llm_wrapper import LLMWrapper
+from .run_manager import Run, RunManager
+
+
+@dataclass
+class BatchResult:
+    """Outcome of attributing one prompt in a batch.
+
+    Attributes:
+        case_id: Identifier of the prompt case
+        status: "completed", "interrupted", "skipped" (over budget) or "failed"
+        run: The attribution run, if one was created
+        error: Error message for skipped or failed cases
+        elapsed_s: Wall time from the case starting to finishing
+    """
+
+    case_id: str
+    status: str
+    run: Optional[Run] = None
+    error: Optional[str] = None
+    elapsed_s: float = 0.0
+
+
+class BatchAttributor:
+    """Attributes many prompts through one shared work queue.
+
+    Baseline completions and ablations of all prompts wait on the same
+    FIFO concurrency limit, and every run reserves its projected cost from
+    one batch budget, refunding what early stopping saved. Only a few runs
+    are active at a time, so finished runs stream out while later prompts
+    are still queued.
+    
+    Runs share one LLM wrapper, whose request counters cannot tell the
+    runs apart, so run stats only hold per-run counters such as the
+    segments early stopping skipped; `get_stats` reports the batch totals.
+    """
+
+    def __init__(
+        self,
+        llm: Optional[LLMWrapper] = None,
+        run_manager: Optional[RunManager] = None,
+        max_concurrency: Optional[int] = None,
+        max_cost: Optional[float] = None,
+        max_active_runs: int = 4,
+        hierarchical: bool = False,
+        early_stop: bool = True,
+    ):
+        """Initialize the batch attributor.
+
+        Args:
+            llm: LLM wrapper shared by all runs
+            run_manager: Run manager shared by all runs
+            max_concurrency: Requests in flight across all runs (defaults to the LLM's limit)
+            max_cost: Total projected cost allowed for the batch (defaults to MAX_BATCH_COST)
+            max_active_runs: Number of prompts being attributed at the same time
+            hierarchical: Whether to use the hierarchical engine
+            early_stop: Whether to enable early stopping
+        """
+        settings = get_settings()
+        self.llm = llm or LLMWrapper()
+        self.run_manager = run_manager or RunManager()
+        self.max_concurrency = max_concurrency or self.llm.concurrency_limit
+        self.cost_budget = CostBudget(max_cost if max_cost is not None else settings.max_batch_cost)
+        self.max_active_runs = max_active_runs
+        self.hierarchical = hierarchical
+        self.early_stop = early_stop
+        self.segmenter = Segmenter()
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Return the shared LLM wrapper's request and cache counters."""
+        return self.llm.get_stats()
+
+    async def run(self, prompts: Iterable[Union[str, PromptCase]]) -> List[BatchResult]:
+        """Attribute all prompts and return the results in completion order.
+
+        Args:
+            prompts: Prompt texts or prompt cases
+
+        Returns:
+            One result per prompt
+        """
+        return [result async for result in self.stream(prompts)]
+
+    async def stream(self, prompts: Iterable[Union[str, PromptCase]]) -> AsyncIterator[BatchResult]:
+        """Attribute all prompts, yielding each result as its run finishes.
+
+        SIGINT/SIGTERM stop the batch: runs in progress are checkpointed
+        (see `AblationEngine.resume`) and reported as "interrupted", and
+        prompts that had not started are not reported.
+
+        Args:
+            prompts: Prompt texts or prompt cases
+
+        Yields:
+            Batch results in completion order
+        """
+        cases = [
+            prompt if isinstance(prompt, PromptCase) else PromptCase(id=f"prompt-{i}", style="", text=prompt)
+            for i, prompt in enumerate(prompts)
+        ]
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        run_slots = asyncio.Semaphore(self.max_active_runs)
+        interrupted: List[int] = []
+
+        tasks = [
+            asyncio.ensure_future(self._attribute_case(case, semaphore, run_slots, interrupted))
+            for case in cases
+        ]
+
+        def on_signal(signum: int) -> None:
+            interrupted.append(signum)
+            for task in tasks:
+                task.cancel()
+
+        # Engines of individual runs leave signal handling to the batch
+        installed_signals = install_signal_handlers(on_signal)
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                try:
+                    result = await next_result
+                except asyncio.CancelledError:
+                    # A case cancelled before it started
+                    if interrupted:
+                        continue
+                    raise
+                yield result
+        finally:
+            remove_signal_handlers(installed_signals)
+            for task in tasks:
+                task.cancel()
+
+    async def _attribute_case(
+        self,
+        case: PromptCase,
+        semaphore: asyncio.Semaphore,
+        run_slots: asyncio.Semaphore,
+        interrupted: List[int],
+    ) -> BatchResult:
+        """Attribute a single prompt case.
+
+        Args:
+            case: The prompt case
+            semaphore: Concurrency limit shared by all requests of the batch
+            run_slots: Limit on the number of active runs
+            interrupted: Signals received by the batch so far
+
+        Returns:
+            Result for the case
+        """
+        async with run_slots:
+            start = time.perf_counter()
+            run = None
+
+            engine_args = dict(
+                semaphore=semaphore,
+                cost_budget=self.cost_budget,
+                handle_signals=False,
+                record_llm_stats=False,
+            )
+            if self.hierarchical:
+                engine = HierarchicalAblationEngine(self.llm, self.run_manager, **engine_args)
+            else:
+                engine = AblationEngine(self.llm, self.run_manager, **engine_args)
+
+            try:
+                if not self.cost_budget.reserve(engine.estimated_cost_per_request):
+                    raise BudgetExceeded("The batch budget is exhausted.")
+                
+                # The baseline completion waits in the same queue as ablations
+                async with semaphore:
+                    if case.messages:
+                        baseline = await self.llm.get_chat_completion(case.messages)
+                    else:
+                        baseline = await self.llm.get_completion(case.text)
+
+                if self.hierarchical:
+                    segments = []
+                elif case.messages:
+                    segments = self.segmenter.segment_messages(case.messages)
+                else:
+                    segments = self.segmenter.segment(case.text)
+                run = self.run_manager.create_run(case.text, baseline, segments, messages=case.messages)
+
+                if self.hierarchical:
+                    run = await engine.run_hierarchical_ablation(run, early_stop=self.early_stop)
+                else:
+                    run = await engine.run_ablation_tests(run, early_stop=self.early_stop)
+                status, error = "completed", None
+            except asyncio.CancelledError:
+                if not interrupted:
+                    raise
+                status, error = "interrupted", None
+            except BudgetExceeded as e:
+                status, error = "skipped", str(e)
+            except Exception as e:
+                status, error = "failed", f"{type(e).__name__}: {e}"
+            
+            # A run stopped between ablation passes (or before the first)
+            # is checkpointed as resumable instead of left "running"
+            if run is not None and status != "completed" and run.status != "interrupted":
+                run.status = "interrupted"
+                self.run_manager._save_run(run)
+
+            return BatchResult(
+                case_id=case.id,
+                status=status,
+                run=run,
+                error=error,
+                elapsed_s=time.perf_counter() - start,
+            )
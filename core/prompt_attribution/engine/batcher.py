@@ -0,0 +1,113 @@
+"""Micro-batching of concurrent embedding requests."""
+
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+
+EmbedFn = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent embedding requests into multi-input API calls.
+
+    Requests submitted within a short time window are gathered and sent as a
+    single batch. A batch is flushed as soon as it reaches `max_batch_size`
+    inputs or once `max_wait_ms` has elapsed since its first request,
+    whichever comes first. Each caller receives only its own vector; if
+    the request fails, or returns a different number of vectors than it
+    was sent inputs, every caller in the batch receives the error.
+    """
+
+    def __init__(self, embed_fn: EmbedFn, max_batch_size: int = 128, max_wait_ms: float = 10.0):
+        """Initialize the batcher.
+
+        Args:
+            embed_fn: Async function that embeds a list of texts in one request
+            max_batch_size: Maximum number of inputs per request
+            max_wait_ms: Maximum time to hold a request before flushing
+        """
+        self.embed_fn = embed_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._in_flight: Set[asyncio.Task] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # Counters for reporting
+        self.requests_sent = 0
+        self.inputs_sent = 0
+
+    async def submit(self, text: str) -> List[float]:
+        """Queue a text for embedding and wait for its vector.
+
+        Args:
+            text: The text to embed
+
+        Returns:
+            Embedding vector for the text
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Requests and the flush timer left by a loop that has since
+            # stopped (e.g. a previous asyncio.run) can never be sent
+            self._pending, self._timer, self._loop = [], None, loop
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        """Send all pending requests as one batch."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        task = asyncio.ensure_future(self._send(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        """Embed one batch and fan the vectors back out to the waiters.
+
+        Args:
+            batch: Pending (text, future) pairs
+        """
+        # Identical texts within a batch are only sent once
+        unique_texts = list(dict.fromkeys(text for text, _ in batch))
+
+        try:
+            self.requests_sent += 1
+            self.inputs_sent += len(unique_texts)
+            vectors = await self.embed_fn(unique_texts)
+        except BaseException as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+
+        if len(vectors) != len(unique_texts):
+            error = ValueError(
+                f"Embedding request for {len(unique_texts)} inputs returned {len(vectors)} vectors"
+            )
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        by_text = dict(zip(unique_texts, vectors))
+        for text, future in batch:
+            if not future.done():
+                future.set_result(by_text[text])
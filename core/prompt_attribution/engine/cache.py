@@ -0,0 +1,412 @@
+"""Cache backends for storing LLM responses and embedding vectors."""
+
+import atexit
+import json
+import os
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from ..settings import Settings, get_settings
+
+
+# Value kinds stored by the SQLite backend
+_KIND_TEXT = 0
+_KIND_VECTOR = 1
+
+# Marks an SQLite cache into which the directory cache beside it was imported
+_DIRECTORY_MIGRATED_KEY = "meta_directory_cache_migrated"
+
+
+class CacheBackend(ABC):
+    """Interface for key-value stores used by the LLM wrapper.
+
+    Text entries hold completions; vector entries hold embeddings. Backends
+    are free to store the two kinds differently.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """Return the text stored under `key`, or None."""
+
+    @abstractmethod
+    def set(self, key: str, value: str) -> None:
+        """Store a text value under `key`."""
+
+    @abstractmethod
+    def get_vector(self, key: str) -> Optional[List[float]]:
+        """Return the vector stored under `key`, or None."""
+
+    @abstractmethod
+    def set_vector(self, key: str, vector: List[float]) -> None:
+        """Store a vector under `key`."""
+
+    @abstractmethod
+    def items(self) -> Iterator[Tuple[str, object]]:
+        """Iterate over all (key, value) pairs; vectors are lists of floats."""
+
+    def flush(self) -> None:
+        """Persist any buffered writes."""
+
+    def close(self) -> None:
+        """Flush and release any resources."""
+        self.flush()
+
+
+class DirectoryCache(CacheBackend):
+    """One JSON file per entry in a directory (the original cache layout)."""
+
+    def __init__(self, cache_dir: str):
+        """Initialize the directory cache.
+
+        Args:
+            cache_dir: Directory holding the cache files
+        """
+        self.cache_dir = Path(cache_dir)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[str]:
+        cache_file = self.cache_dir / f"{key}.json"
+        if cache_file.exists():
+            try:
+                with open(cache_file, "r") as f:
+                    return f.read()
+            except Exception:
+                return None
+
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        cache_file = self.cache_dir / f"{key}.json"
+        try:
+            # Ensure the cache directory exists
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+            # Write with atomic replacement to avoid partial writes
+            temp_file = cache_file.with_suffix(f".{uuid.uuid4().hex}.tmp")
+            with open(temp_file, "w") as f:
+                f.write(value)
+            temp_file.replace(cache_file)
+        except Exception:
+            # Silently fail if caching encounters an error
+            # This way, the main operation can continue even if caching fails
+            pass
+
+    def get_vector(self, key: str) -> Optional[List[float]]:
+        cached = self.get(key)
+        if not cached:
+            return None
+        try:
+            return json.loads(cached)
+        except ValueError:
+            return None
+
+    def set_vector(self, key: str, vector: List[float]) -> None:
+        self.set(key, json.dumps(vector))
+
+    def items(self) -> Iterator[Tuple[str, object]]:
+        for cache_file in sorted(self.cache_dir.glob("*.json")):
+            key = cache_file.stem
+            try:
+                with open(cache_file, "r") as f:
+                    content = f.read()
+            except OSError:
+                continue
+
+            # Embedding entries are JSON lists of floats
+            if key.startswith("embed_"):
+                try:
+                    yield key, json.loads(content)
+                except ValueError:
+                    continue
+            else:
+                yield key, content
+
+
+class SQLiteCache(CacheBackend):
+    """Single-file SQLite key-value store.
+
+    Features:
+    - WAL journaling so readers never block the writer
+    - Writes are buffered in memory and committed in batches, so the write
+      lock is only held for the short flush transaction and several
+      processes can share one file
+    - Vectors stored as packed float32 blobs
+    """
+
+    def __init__(self, path: str, commit_every: int = 64, commit_interval: float = 1.0):
+        """Initialize the SQLite cache.
+
+        Args:
+            path: Path to the database file
+            commit_every: Number of buffered writes that triggers a commit
+            commit_interval: Seconds after which buffered writes are committed
+        """
+        self.path = Path(path)
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+
+        os.makedirs(self.path.parent, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=30.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, kind INTEGER NOT NULL, value BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+        # key -> (kind, value) written since the last flush
+        self._pending: Dict[str, Tuple[int, bytes]] = {}
+        self._last_commit = time.monotonic()
+        atexit.register(self.close)
+
+    def _get_entry(self, key: str, kind: int) -> Optional[bytes]:
+        pending = self._pending.get(key)
+        if pending is not None:
+            return pending[1] if pending[0] == kind else None
+        if self._conn is None:
+            return None
+        row = self._conn.execute(
+            "SELECT value FROM entries WHERE key = ? AND kind = ?", (key, kind)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set_entry(self, key: str, kind: int, value: bytes) -> None:
+        if self._conn is None:
+            return
+
+        self._pending[key] = (kind, value)
+        if (len(self._pending) >= self.commit_every
+                or time.monotonic() - self._last_commit >= self.commit_interval):
+            self.flush()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._get_entry(key, _KIND_TEXT)
+        return value.decode("utf-8") if value is not None else None
+
+    def set(self, key: str, value: str) -> None:
+        self._set_entry(key, _KIND_TEXT, value.encode("utf-8"))
+
+    def get_vector(self, key: str) -> Optional[List[float]]:
+        value = self._get_entry(key, _KIND_VECTOR)
+        if value is None:
+            return None
+        vector = array("f")
+        vector.frombytes(value)
+        return vector.tolist()
+
+    def set_vector(self, key: str, vector: List[float]) -> None:
+        self._set_entry(key, _KIND_VECTOR, array("f", vector).tobytes())
+
+    def items(self) -> Iterator[Tuple[str, object]]:
+        if self._conn is None:
+            return
+        self.flush()
+        for key, kind, value in self._conn.execute("SELECT key, kind, value FROM entries"):
+            if kind == _KIND_VECTOR:
+                vector = array("f")
+                vector.frombytes(value)
+                yield key, vector.tolist()
+            else:
+                yield key, value.decode("utf-8")
+
+    def flush(self) -> None:
+        if self._conn is None or not self._pending:
+            return
+        rows = [(key, kind, value) for key, (kind, value) in self._pending.items()]
+        try:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO entries (key, kind, value) VALUES (?, ?, ?)", rows
+                )
+        except sqlite3.Error:
+            # Caching failures must not break the main operation
+            pass
+        self._pending.clear()
+        self._last_commit = time.monotonic()
+
+    def close(self) -> None:
+        if self._conn is None:
+            return
+        self.flush()
+        self._conn.close()
+        self._conn = None
+
+
+class MemoryCache(CacheBackend):
+    """Bounded in-process LRU tier in front of another cache backend.
+
+    Reads are served from memory when possible and fall through to the
+    backing store on a miss; writes go to both. Entries are evicted in
+    least-recently-used order once either the entry or the byte limit is
+    exceeded. Vectors are held as packed float32, so a vector read from
+    memory equals the one the SQLite backend returns.
+    """
+
+    def __init__(self, backend: CacheBackend, max_entries: int = 10000, max_bytes: int = 256 * 1024 * 1024):
+        """Initialize the memory tier.
+
+        Args:
+            backend: Backing store consulted on a miss
+            max_entries: Maximum number of entries held in memory
+            max_bytes: Maximum approximate size of the held values in bytes
+        """
+        self.backend = backend
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        # key -> (kind, value, size); vectors are held as packed float32
+        self._entries: "OrderedDict[str, Tuple[int, Union[str, array], int]]" = OrderedDict()
+        self.current_bytes = 0
+
+        # Counters for reporting: hits served from memory, hits served by
+        # the backing store, and lookups found in neither
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, key: str, kind: int) -> Optional[Union[str, array]]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != kind:
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def _store(self, key: str, kind: int, value: Union[str, array], size: int) -> None:
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.current_bytes -= previous[2]
+
+        self._entries[key] = (kind, value, size)
+        self.current_bytes += size
+
+        while len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self.current_bytes -= evicted_size
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._lookup(key, _KIND_TEXT)
+        if value is not None:
+            return value
+
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.store_hits += 1
+        self._store(key, _KIND_TEXT, value, len(value))
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self._store(key, _KIND_TEXT, value, len(value))
+        self.backend.set(key, value)
+
+    def get_vector(self, key: str) -> Optional[List[float]]:
+        value = self._lookup(key, _KIND_VECTOR)
+        if value is not None:
+            return value.tolist()
+
+        vector = self.backend.get_vector(key)
+        if vector is None:
+            self.misses += 1
+            return None
+        self.store_hits += 1
+        packed = array("f", vector)
+        self._store(key, _KIND_VECTOR, packed, len(packed) * packed.itemsize)
+        return packed.tolist()
+
+    def set_vector(self, key: str, vector: List[float]) -> None:
+        packed = array("f", vector)
+        self._store(key, _KIND_VECTOR, packed, len(packed) * packed.itemsize)
+        self.backend.set_vector(key, vector)
+
+    def items(self) -> Iterator[Tuple[str, object]]:
+        return self.backend.items()
+
+    def flush(self) -> None:
+        self.backend.flush()
+
+    def close(self) -> None:
+        self.backend.close()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Memory hit, store hit, miss and eviction counters plus the current size."""
+        return {
+            "hits": self.hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+        }
+
+
+def create_cache_backend(settings: Optional[Settings] = None) -> CacheBackend:
+    """Create the cache backend selected in the settings.
+
+    Args:
+        settings: Settings to use (defaults to the global settings)
+
+    Returns:
+        Configured cache backend, wrapped in a memory tier if enabled
+    """
+    settings = settings or get_settings()
+    cache_dir = Path(settings.cache_dir)
+
+    if settings.cache_backend == "directory":
+        backend: CacheBackend = DirectoryCache(str(cache_dir))
+    elif settings.cache_backend == "sqlite":
+        backend = SQLiteCache(str(cache_dir / "cache.sqlite3"))
+        # Entries of a directory cache from before SQLite became the default
+        # are imported once, instead of being silently ignored
+        if backend.get(_DIRECTORY_MIGRATED_KEY) is None and any(cache_dir.glob("*.json")):
+            migrate_directory_cache(str(cache_dir), backend)
+            backend.set(_DIRECTORY_MIGRATED_KEY, "1")
+            backend.flush()
+    else:
+        raise ValueError(f"Unknown cache backend: {settings.cache_backend}")
+
+    # Put the in-process LRU tier in front of the disk backend
+    if settings.memory_cache_max_entries > 0:
+        backend = MemoryCache(
+            backend,
+            max_entries=settings.memory_cache_max_entries,
+            max_bytes=settings.memory_cache_max_bytes,
+        )
+
+    return backend
+
+
+def migrate_directory_cache(source_dir: str, dest: CacheBackend) -> int:
+    """Import every entry of a directory cache into another backend.
+
+    Args:
+        source_dir: Directory holding one JSON file per entry
+        dest: Backend to import into
+
+    Returns:
+        Number of entries imported
+    """
+    count = 0
+    for key, value in DirectoryCache(source_dir).items():
+        if isinstance(value, list):
+            dest.set_vector(key, value)
+        else:
+            dest.set(key, value)
+        count += 1
+
+    dest.flush()
+    return count
@@ -0,0 +1,311 @@
+"""Group-testing ablation: attribute many segments from ablations of segment subsets."""
+
+import asyncio
+import itertools
+import math
+import random
+import time
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+
+from ..segmenter import Span
+from .ablation_engine import (
+    AblationEngine,
+    BudgetExceeded,
+    RunInterrupted,
+    install_signal_handlers,
+    remove_signal_handlers,
+)
+from .run_manager import AblationResult, Run
+
+
+def kernel_shap_masks(num_segments: int, num_masks: int, rng: random.Random) -> np.ndarray:
+    """Choose which segments each ablation removes.
+
+    Subset sizes are drawn from the Shapley kernel, which favours removing
+    very few or very many segments, and each subset is paired with its
+    complement. When the budget covers every non-trivial subset, all of
+    them are enumerated instead.
+
+    Args:
+        num_segments: Number of segments M
+        num_masks: Number of ablations to plan
+        rng: Random number generator
+
+    Returns:
+        Binary matrix of shape (masks, M); 1 marks a removed segment
+    """
+    m = num_segments
+    if m == 1:
+        return np.ones((1, 1), dtype=np.float64)
+
+    if num_masks >= 2 ** m - 2:
+        masks = [
+            [1.0 if i in removed else 0.0 for i in range(m)]
+            for size in range(1, m)
+            for removed in itertools.combinations(range(m), size)
+        ]
+        return np.array(masks)
+
+    sizes = list(range(1, m))
+    weights = [(m - 1) / (size * (m - size)) for size in sizes]
+
+    masks: List[tuple] = []
+    seen: Set[tuple] = set()
+    attempts = 0
+    while len(masks) < num_masks and attempts < 20 * num_masks:
+        attempts += 1
+        size = rng.choices(sizes, weights)[0]
+        removed = set(rng.sample(range(m), size))
+        mask = tuple(1 if i in removed else 0 for i in range(m))
+        for candidate in (mask, tuple(1 - bit for bit in mask)):
+            if candidate not in seen and len(masks) < num_masks:
+                seen.add(candidate)
+                masks.append(candidate)
+
+    return np.array(masks, dtype=np.float64)
+
+
+def kernel_shap_weights(masks: np.ndarray) -> np.ndarray:
+    """Shapley kernel weight of each enumerated subset.
+
+    Sampled masks already follow the kernel's size distribution, so only
+    enumerated masks need these weights.
+
+    Args:
+        masks: Binary matrix of shape (masks, M)
+
+    Returns:
+        Weight per mask
+    """
+    m = masks.shape[1]
+    sizes = masks.sum(axis=1).astype(int)
+    weights = np.ones(len(masks))
+    for row, size in enumerate(sizes):
+        if 0 < size < m:
+            weights[row] = (m - 1) / (math.comb(m, size) * size * (m - size))
+    return weights / weights.sum()
+
+
+def fit_contributions(
+    masks: np.ndarray,
+    targets: np.ndarray,
+    weights: Optional[np.ndarray] = None,
+    ridge: float = 1e-3,
+) -> np.ndarray:
+    """Fit additive per-segment contributions to subset ablation outcomes.
+
+    Solves the weighted ridge regression targets ≈ masks @ contributions
+    without an intercept, since removing nothing changes nothing.
+
+    Args:
+        masks: Binary matrix of shape (masks, M)
+        targets: Outcomes of shape (masks, outputs)
+        weights: Optional weight per mask
+        ridge: L2 regularization strength
+
+    Returns:
+        Contributions of shape (M, outputs)
+    """
+    if weights is None:
+        weights = np.full(len(masks), 1.0 / len(masks))
+    weighted = masks * weights[:, None]
+    gram = weighted.T @ masks + ridge * np.eye(masks.shape[1])
+    return np.linalg.solve(gram, weighted.T @ targets)
+
+
+class GroupAblation:
+    """Estimates every segment's impact from ablations that remove several at once.
+
+    Single-segment deletion needs one completion per segment. Here each
+    call removes a subset of the segments chosen as in KernelSHAP, and a
+    linear surrogate fitted to the subsets' delta_cos and per-sentence
+    deltas gives each segment's contribution. For M segments this takes
+    about `call_ratio * M` calls; the estimates are exact only when the
+    segments' effects add up, so the ranking is what to rely on.
+
+    Each subset's outcome is persisted as soon as it completes. As with
+    single-segment deletion, a failure or SIGINT/SIGTERM saves the run as
+    "interrupted" and refunds the cost of subsets never sent; resuming
+    reuses the recorded subsets, since the same seed plans the same ones.
+    """
+
+    def __init__(
+        self,
+        engine: Optional[AblationEngine] = None,
+        num_calls: Optional[int] = None,
+        call_ratio: Optional[float] = None,
+        min_calls: int = 4,
+        seed: Optional[int] = None,
+        ridge: float = 1e-3,
+        max_cost: Optional[float] = None,
+    ):
+        """Initialize group ablation.
+
+        Args:
+            engine: Engine used to run the ablations
+            num_calls: Number of ablations (overrides call_ratio)
+            call_ratio: Ablations per segment (defaults to GROUP_ABLATION_CALL_RATIO)
+            min_calls: Fewest ablations planned from call_ratio
+            seed: Seed of the subset sampling (defaults to ABLATION_SEED)
+            ridge: L2 regularization of the regression
+            max_cost: Cost budget of the run (defaults to MAX_COST_PER_RUN)
+        """
+        self.engine = engine or AblationEngine()
+        settings = self.engine.settings
+        self.num_calls = num_calls
+        self.call_ratio = call_ratio if call_ratio is not None else settings.group_ablation_call_ratio
+        self.min_calls = min_calls
+        self.seed = seed if seed is not None else self.engine.seed
+        self.ridge = ridge
+        self.max_cost = max_cost if max_cost is not None else self.engine.max_cost
+
+    def planned_calls(self, num_segments: int) -> int:
+        """Number of ablations planned for a number of segments."""
+        if self.num_calls is not None:
+            calls = self.num_calls
+        else:
+            calls = max(self.min_calls, math.ceil(self.call_ratio * num_segments))
+        if num_segments <= 1:
+            return min(calls, num_segments)
+        return min(calls, 2 ** num_segments - 2)
+
+    async def run(self, run: Run, scorer: Optional[Any] = None, segments: Optional[List[Span]] = None) -> Run:
+        """Run subset ablations for a run's segments and record the fitted contributions.
+
+        Each segment gets one result whose delta_cos and sentence_deltas
+        are its fitted contributions, with `samples` set to the number of
+        ablations that removed it. The run's stats record the calls made.
+        Subsets already recorded in the run's group_samples are not sent
+        again.
+
+        Args:
+            run: The run to process
+            scorer: Optional scorer instance (will be created if not provided)
+            segments: Segments to test (defaults to the run's segments)
+
+        Returns:
+            Updated run with ablation results
+
+        Raises:
+            ValueError: If the projected cost exceeds the run's maximum
+            BudgetExceeded: If the shared budget cannot cover the projected cost
+            RunInterrupted: If the run was stopped by SIGINT or SIGTERM
+        """
+        engine = self.engine
+
+        # Import here to avoid circular imports
+        if scorer is None:
+            from ..scorer import Scorer
+            scorer = Scorer(run.completion, engine.llm)
+
+        if segments is None:
+            segments = [Span(**segment) for segment in run.segments]
+        segments = sorted(segments, key=lambda s: s.id)
+
+        calls = self.planned_calls(len(segments))
+        masks = kernel_shap_masks(len(segments), calls, random.Random(self.seed))
+        enumerated = len(segments) > 1 and len(masks) == 2 ** len(segments) - 2
+        weights = kernel_shap_weights(masks) if enumerated else None
+
+        # Subsets completed in an earlier session, keyed by removed span IDs
+        def removed_ids(mask: np.ndarray) -> tuple:
+            return tuple(span.id for span, bit in zip(segments, mask) if bit)
+
+        outcomes = {
+            tuple(sample["removed"]): np.concatenate([[sample["delta_cos"]], sample["sentence_deltas"]])
+            for sample in run.group_samples
+        }
+        todo = [mask for mask in masks if removed_ids(mask) not in outcomes]
+
+        projected_cost = len(todo) * engine.estimated_cost_per_request
+        if projected_cost > self.max_cost:
+            raise ValueError(
+                f"Projected cost ${projected_cost:.2f} exceeds maximum allowed ${self.max_cost:.2f}. "
+                f"Consider lowering GROUP_ABLATION_CALL_RATIO."
+            )
+        if engine.cost_budget is not None and not engine.cost_budget.reserve(projected_cost):
+            raise BudgetExceeded(
+                f"Projected cost ${projected_cost:.2f} exceeds the remaining "
+                f"budget ${engine.cost_budget.remaining:.2f}."
+            )
+
+        run.status = "running"
+        stats_before = engine.llm.get_stats()
+        previous_stats = dict(run.stats)
+        baseline_sentences, baseline_matrix = await engine._get_baseline_matrix(run.completion, scorer)
+        semaphore = engine.semaphore or asyncio.Semaphore(engine.llm.concurrency_limit)
+
+        prompt = engine._prompt_of(run)
+        started = 0
+
+        async def ablate(mask: np.ndarray) -> Dict:
+            nonlocal started
+            removed = [span for span, bit in zip(segments, mask) if bit]
+            ablated_prompt = engine._remove_segments(prompt, removed)
+            async with semaphore:
+                started += 1
+                delta_cos, sentence_deltas, _, _ = await engine._score_ablated_prompt(
+                    ablated_prompt, scorer, baseline_sentences, baseline_matrix
+                )
+            return {
+                "removed": [span.id for span in removed],
+                "delta_cos": float(delta_cos),
+                "sentence_deltas": sentence_deltas.tolist(),
+            }
+
+        def record(sample: Dict) -> None:
+            nonlocal run
+            key = tuple(sample["removed"])
+            if key not in outcomes:
+                outcomes[key] = np.concatenate([[sample["delta_cos"]], sample["sentence_deltas"]])
+                run = engine.run_manager.add_group_sample(run, sample)
+
+        start = time.time()
+        tasks = [asyncio.ensure_future(ablate(mask)) for mask in todo]
+        interrupted_by: List[int] = []
+
+        def on_signal(signum: int) -> None:
+            interrupted_by.append(signum)
+            for task in tasks:
+                task.cancel()
+
+        installed_signals = install_signal_handlers(on_signal) if engine.handle_signals else []
+        try:
+            # Persist each subset's outcome as soon as it finishes
+            for next_sample in asyncio.as_completed(tasks):
+                record(await next_sample)
+        except BaseException:
+            await engine._checkpoint_interrupted(
+                run, tasks, record, lambda: len(tasks) - started, stats_before, previous_stats
+            )
+            if interrupted_by:
+                raise RunInterrupted(run.id, interrupted_by[0]) from None
+            raise
+        finally:
+            remove_signal_handlers(installed_signals)
+
+        targets = np.array([outcomes[removed_ids(mask)] for mask in masks])
+        contributions = fit_contributions(masks, targets, weights, self.ridge)
+        elapsed_ms = int((time.time() - start) * 1000 / max(1, len(segments)))
+
+        for span, contribution, removals in zip(segments, contributions, masks.sum(axis=0)):
+            run = engine.run_manager.add_ablation_result(run, AblationResult(
+                span_id=span.id,
+                delta_cos=float(contribution[0]),
+                elapsed_ms=elapsed_ms,
+                sentence_deltas=contribution[1:].tolist(),
+                parent_id=span.parent_id,
+                depth=span.depth,
+                samples=int(removals),
+            ))
+
+        engine._update_control_mapping(run, len(baseline_sentences))
+        session_stats = engine._llm_stats_since(stats_before)
+        session_stats["group_ablation_calls"] = len(masks)
+        run.stats = engine._merge_stats(previous_stats, session_stats)
+        run.status = "completed"
+        engine.run_manager._save_run(run)
+
+        return run
@@ -1,11 +1,13 @@
 """Hierarchical ablation engine for efficient prompt attribution."""
 
 import asyncio
+import math
+from dataclasses import asdict, replace
 from typing import Dict, List, Optional, Set, Tuple, Any
 
-from ..segmenter import HierarchicalSegmenter, Span, Segmenter
+from ..segmenter import ChatPrompt, HierarchicalSegmenter, Span, Segmenter
 from ..settings import get_settings
-from .ablation_engine import AblationEngine
+from .ablation_engine import AblationEngine, CostBudget
 from .llm_wrapper import LLMWrapper
 from .run_manager import Run, RunManager
 
@@ -19,13 +21,24 @@ class HierarchicalAblationEngine(AblationEngine):
     
     This approach typically reduces API calls by 60-80% compared to testing
     every segment individually, while maintaining high attribution accuracy.
+    
+    With HIERARCHICAL_MODE=recursive, refinement instead descends level by
+    level into every segment with a high enough impact, down to a minimum
+    span size and within a call budget (see `run_recursive_ablation`).
+    
+    In chat runs the first pass tests whole messages, and refined segments
+    carry the message they lie in.
     """
     
     def __init__(
         self, 
         llm: Optional[LLMWrapper] = None, 
         run_manager: Optional[RunManager] = None,
-        hierarchical_segmenter: Optional[HierarchicalSegmenter] = None
+        hierarchical_segmenter: Optional[HierarchicalSegmenter] = None,
+        semaphore: Optional[asyncio.Semaphore] = None,
+        cost_budget: Optional[CostBudget] = None,
+        handle_signals: bool = True,
+        record_llm_stats: bool = True,
     ):
         """Initialize the hierarchical ablation engine.
         
@@ -33,10 +46,21 @@ class HierarchicalAblationEngine(AblationEngine):
             llm: LLM wrapper instance
             run_manager: Run manager instance
             hierarchical_segmenter: Hierarchical segmenter instance
+            semaphore: Concurrency limit shared with other runs (defaults to one per run)
+            cost_budget: Cost budget shared with other runs
+            handle_signals: Whether to checkpoint runs on SIGINT/SIGTERM
+            record_llm_stats: Whether to record the LLM wrapper's request counters in run stats
         """
-        super().__init__(llm, run_manager)
+        super().__init__(llm, run_manager, semaphore, cost_budget, handle_signals, record_llm_stats)
         self.hierarchical_segmenter = hierarchical_segmenter or HierarchicalSegmenter()
         
+        # Refinement mode ("two_pass" or "recursive") and recursive limits
+        self.mode = self.settings.hierarchical_mode
+        self.refine_threshold = self.settings.refine_delta_threshold
+        self.refine_top_fraction = self.settings.refine_top_fraction
+        self.min_span_chars = self.settings.refine_min_span_chars
+        self.max_refine_calls = self.settings.refine_max_calls
+        
     async def run_hierarchical_ablation(
         self, 
         run: Run, 
@@ -46,6 +70,11 @@ class HierarchicalAblationEngine(AblationEngine):
     ) -> Run:
         """Run hierarchical ablation tests.
         
+        Both passes record their results in the same run; second-pass
+        segments are numbered after the first-pass ones. Segments that
+        already have results in the run are skipped, so calling this on an
+        interrupted run continues where it stopped.
+        
         Args:
             run: The run to process
             scorer: Optional scorer instance (will be created if not provided)
@@ -55,91 +84,223 @@ class HierarchicalAblationEngine(AblationEngine):
         Returns:
             Updated run with ablation results
         """
+        if self.mode == "recursive":
+            return await self.run_recursive_ablation(run, scorer=scorer)
+        
         # Import here to avoid circular imports
         if scorer is None:
             from ..scorer import Scorer
             scorer = Scorer(run.completion, self.llm)
         
         prompt = run.prompt
+        completed_ids = {r["span_id"] for r in run.ablation_results}
         
         # Get original segments for reference
-        original_segmenter = Segmenter()
-        original_segments = original_segmenter.segment(prompt)
+        original_segments = self._original_segments(run)
         
         # FIRST PASS: Coarse segmentation
         print("Starting first pass with coarse segments...")
-        first_pass_segments = self.hierarchical_segmenter.segment_first_pass(prompt)
+        first_pass_segments = self._first_pass_segments(run)
+        first_pass_ids = {s.id for s in first_pass_segments}
         
         print(f"First pass: Testing {len(first_pass_segments)} coarse segments")
         
+        run.segments = [asdict(s) for s in first_pass_segments]
+        
         # Run first pass ablation
-        first_pass_run = await self.run_ablation_tests(
+        run = await self.run_ablation_tests(
             run,
             segments=first_pass_segments,
+            skip_ids=completed_ids,
             scorer=scorer,
             early_stop=early_stop
         )
+        first_pass_results = [r for r in run.ablation_results if r["span_id"] in first_pass_ids]
         
         # If second pass is disabled or there are no results, return first pass results
-        if not second_pass_enabled or not first_pass_run.ablation_results:
-            return first_pass_run
+        if not second_pass_enabled or not first_pass_results:
+            return run
         
         # SECOND PASS: Fine-grained segmentation of the highest-impact region
         high_impact_span = self.hierarchical_segmenter.get_first_pass_high_impact(
-            first_pass_segments, first_pass_run.ablation_results
+            first_pass_segments, first_pass_results
         )
         
         if not high_impact_span:
-            return first_pass_run
+            return run
         
         print(f"Highest impact region identified: Segment {high_impact_span.id}")
         
-        # Get fine-grained segments for the high-impact region
-        second_pass_segments = self.hierarchical_segmenter.segment_second_pass(
-            prompt, high_impact_span, original_segments
-        )
+        # Get fine-grained segments for the high-impact region, numbered
+        # after the first-pass segments and linked to it as their parent
+        id_offset = max(first_pass_ids) + 1
+        second_pass_segments = [
+            replace(s, id=s.id + id_offset, parent_id=high_impact_span.id, depth=1)
+            for s in self._locate(run, self.hierarchical_segmenter.segment_second_pass(
+                prompt, high_impact_span, original_segments
+            ))
+        ]
         
         print(f"Second pass: Testing {len(second_pass_segments)} fine-grained segments")
         
-        # Skip the IDs of segments we've already tested
-        tested_ids = set(r["span_id"] for r in first_pass_run.ablation_results)
-        
-        # Create a temporary run object for the second pass
-        temp_run = Run(
-            id=run.id,
-            prompt=prompt,
-            completion=run.completion,
-            segments=[s.__dict__ for s in second_pass_segments]
-        )
+        run.segments = [asdict(s) for s in first_pass_segments + second_pass_segments]
         
         # Run second pass ablation
-        second_pass_run = await self.run_ablation_tests(
-            temp_run,
+        return await self.run_ablation_tests(
+            run,
             segments=second_pass_segments,
+            skip_ids=completed_ids,
             scorer=scorer,
             early_stop=early_stop
         )
+    
+    async def run_recursive_ablation(
+        self,
+        run: Run,
+        scorer: Optional[Any] = None,
+        threshold: Optional[float] = None,
+        top_fraction: Optional[float] = None,
+        min_span_chars: Optional[int] = None,
+        max_calls: Optional[int] = None,
+    ) -> Run:
+        """Refine the coarse segments level by level.
         
-        # Combine first and second pass results
-        all_segments = first_pass_segments + second_pass_segments
-        combined_results = self.hierarchical_segmenter.combine_results(
-            first_pass_run.ablation_results,
-            second_pass_run.ablation_results,
-            all_segments
-        )
+        Starting from the first-pass segments, every tested segment whose
+        delta_cos reaches `threshold`, or that ranks in the top
+        `top_fraction` of its level, is split into children (see
+        `HierarchicalSegmenter.split_span`) that are tested as the next
+        level. Refinement stops when no segment qualifies, segments reach
+        `min_span_chars`, or `max_calls` ablations have been run; the
+        highest-ranked segments of a level are tested first when the budget
+        runs out. Results record their parent segment, so
+        `Run.result_tree()` returns the refinement tree.
         
-        # Create a final run with combined results
-        final_run = Run(
-            id=run.id,
-            timestamp=run.timestamp,
-            prompt=prompt,
-            completion=run.completion,
-            segments=[s.__dict__ for s in all_segments],
-            ablation_results=combined_results,
-            settings=run.settings
-        )
+        Segment IDs are assigned level by level in order of position, so
+        calling this on an interrupted run rebuilds the same tree and only
+        tests the segments without results. Early stopping does not apply;
+        the call budget bounds the run.
         
-        # Save the final run
-        self.run_manager._save_run(final_run)
+        Args:
+            run: The run to process
+            scorer: Optional scorer instance (will be created if not provided)
+            threshold: Impact at which a segment is refined (defaults to REFINE_DELTA_THRESHOLD)
+            top_fraction: Fraction of each level refined regardless of threshold (defaults to REFINE_TOP_FRACTION)
+            min_span_chars: Segments no longer than this are not split (defaults to REFINE_MIN_SPAN_CHARS)
+            max_calls: Maximum number of ablations in the run (defaults to REFINE_MAX_CALLS)
+            
+        Returns:
+            Updated run with ablation results
+        """
+        # Import here to avoid circular imports
+        if scorer is None:
+            from ..scorer import Scorer
+            scorer = Scorer(run.completion, self.llm)
         
-        return final_run 
\ No newline at end of file
+        threshold = self.refine_threshold if threshold is None else threshold
+        top_fraction = self.refine_top_fraction if top_fraction is None else top_fraction
+        min_span_chars = self.min_span_chars if min_span_chars is None else min_span_chars
+        max_calls = self.max_refine_calls if max_calls is None else max_calls
+        
+        prompt = run.prompt
+        original_segments = self._original_segments(run)
+        
+        level = self._first_pass_segments(run)
+        tree_segments: List[Span] = []
+        # First-pass IDs need not be contiguous, so children are numbered after the highest
+        next_id = max((s.id for s in level), default=-1) + 1
+        depth = 0
+        
+        while level:
+            completed = {r["span_id"]: r for r in run.ablation_results}
+            budget = max_calls - sum(1 for s in tree_segments if s.id in completed)
+            
+            # Test as much of the level as the budget allows, most promising first
+            untested = [s for s in level if s.id not in completed]
+            if len(untested) > budget:
+                ranked = self._prioritize_segments(untested)[:max(0, budget)]
+                kept = {s.id for s in ranked}
+                level = [s for s in level if s.id in completed or s.id in kept]
+            if not level:
+                break
+            
+            tree_segments.extend(level)
+            run.segments = [asdict(s) for s in tree_segments]
+            
+            print(f"Level {depth}: Testing {len(level)} segments")
+            run = await self.run_ablation_tests(
+                run,
+                segments=level,
+                skip_ids=set(completed),
+                scorer=scorer,
+                early_stop=False
+            )
+            
+            deltas = {r["span_id"]: r["delta_cos"] for r in run.ablation_results}
+            tested = [s for s in level if s.id in deltas]
+            ranked = sorted(tested, key=lambda s: (-deltas[s.id], s.id))
+            top_count = math.ceil(top_fraction * len(ranked))
+            refine = [
+                s for rank, s in enumerate(ranked)
+                if deltas[s.id] >= threshold or rank < top_count
+            ]
+            
+            # Children are numbered in order of position
+            children: List[Span] = []
+            for span in sorted(refine, key=lambda s: s.id):
+                children.extend(self._locate(
+                    run, self.hierarchical_segmenter.split_span(prompt, span, original_segments, min_span_chars)
+                ))
+            level = []
+            for child in children:
+                level.append(replace(child, id=next_id))
+                next_id += 1
+            depth += 1
+        
+        return run
+    
+    def _original_segments(self, run: Run) -> List[Span]:
+        """Natural segments of a run's prompt, segmented per message in chat runs."""
+        if run.messages:
+            return Segmenter().segment_messages(run.messages)
+        return Segmenter().segment(run.prompt)
+    
+    def _first_pass_segments(self, run: Run) -> List[Span]:
+        """Coarse segments of a run's prompt: its messages in chat runs."""
+        if not run.messages:
+            return self.hierarchical_segmenter.segment_first_pass(run.prompt)
+        
+        layout = ChatPrompt(run.messages)
+        return [
+            Span(start=start, end=end, text=layout.text[start:end], id=i,
+                 message_index=i, message_offset=0)
+            for i, (start, end) in enumerate(layout.turn_bounds())
+        ]
+    
+    def _locate(self, run: Run, spans: List[Span]) -> List[Span]:
+        """Give segments of a chat run the message coordinates of their offsets."""
+        if not run.messages:
+            return spans
+        
+        layout = ChatPrompt(run.messages)
+        located = []
+        for span in spans:
+            message_index, message_offset = layout.locate(span.start, span.end)
+            located.append(replace(span, message_index=message_index, message_offset=message_offset))
+        return located
+    
+    async def resume(self, run_id: str, scorer: Optional[Any] = None, early_stop: bool = True) -> Run:
+        """Continue an interrupted hierarchical run.
+        
+        Args:
+            run_id: ID of the run to resume
+            scorer: Optional scorer instance (will be created if not provided)
+            early_stop: Whether to enable early stopping
+            
+        Returns:
+            Updated run with ablation results
+            
+        Raises:
+            ValueError: If the run does not exist
+        """
+        run = self._load_run(run_id)
+        return await self.run_hierarchical_ablation(run, scorer=scorer, early_stop=early_stop)
@@ -6,30 +6,44 @@ import json
 import os
 import time
 from pathlib import Path
-from typing import Dict, List, Optional, Any, Union
+from typing import AsyncIterator, Dict, List, Optional, Any, Union
 
 import openai
-from openai import AsyncOpenAI
 from tqdm.asyncio import tqdm_asyncio
 
 from ..settings import get_settings
+from .backends import LLMBackend, RateLimitExceeded, create_backend
+from .batcher import EmbeddingBatcher
+from .cache import CacheBackend, create_cache_backend
+from .rate_controller import RateController, get_rate_controller
 
 
 class LLMWrapper:
     """Wrapper for interacting with LLMs via OpenAI's API.
     
+    Requests go through a pluggable backend (OpenAI by default, or an
+    offline fake for benchmarks and development).
+    
     Features:
     - Async batch processing
+    - Coalescing of concurrent embedding requests into multi-input calls
+    - Single-flight deduplication of identical in-flight requests
     - Caching based on prompt hash
+    - Shared, adaptive rate control across all wrappers in the process
     - Automatic retry with exponential backoff
     """
     
-    def __init__(self):
-        """Initialize the LLM wrapper with settings."""
+    def __init__(self, cache: Optional[CacheBackend] = None, backend: Optional[LLMBackend] = None):
+        """Initialize the LLM wrapper with settings.
+        
+        Args:
+            cache: Cache backend to use (defaults to the configured backend)
+            backend: LLM backend to use (defaults to the configured backend)
+        """
         settings = get_settings()
         
-        # Initialize AsyncOpenAI client
-        self.client = AsyncOpenAI(api_key=settings.openai_api_key.get_secret_value())
+        # Initialize the backend (OpenAI client unless configured otherwise)
+        self.backend = backend or create_backend(settings)
         
         # API settings
         self.completion_model = settings.completion_model
@@ -37,14 +51,54 @@ class LLMWrapper:
         
         # Performance settings
         self.max_concurrent = settings.max_concurrent_requests
+        self.embedding_batch_size = settings.embedding_batch_size
+        
+        # Requests to the same backend and model share one rate controller
+        self.completion_rate_controller: Optional[RateController] = None
+        self.embedding_rate_controller: Optional[RateController] = None
+        if settings.adaptive_concurrency:
+            backend_name = type(self.backend).__name__
+            self.completion_rate_controller = get_rate_controller(
+                f"{backend_name}:{self.completion_model}", settings
+            )
+            self.embedding_rate_controller = get_rate_controller(
+                f"{backend_name}:{self.embedding_model}", settings
+            )
+        
+        # Concurrent get_embedding calls are gathered into shared requests
+        self._embedding_batcher = EmbeddingBatcher(
+            self._request_embeddings,
+            max_batch_size=self.embedding_batch_size,
+            max_wait_ms=settings.embedding_batch_window_ms,
+        )
         
         # Cache settings
         self.enable_cache = settings.enable_cache
         self.cache_dir = Path(settings.cache_dir)
-        
-        # Ensure cache directory exists if caching is enabled
+        self.cache = None
         if self.enable_cache:
-            os.makedirs(self.cache_dir, exist_ok=True)
+            self.cache = cache or create_cache_backend(settings)
+        
+        # In-flight requests keyed by cache key, shared by duplicate callers
+        self._inflight: Dict[str, asyncio.Future] = {}
+        
+        # Counters for reporting
+        self.completion_requests = 0
+        self.coalesced_calls = 0
+        self.streams_aborted = 0
+        self.rate_limited_calls = 0
+    
+    @property
+    def concurrency_limit(self) -> int:
+        """Number of concurrent tasks callers should allow.
+        
+        With adaptive rate control the controller throttles the actual
+        requests, so callers only need to allow its maximum, which is
+        MAX_CONCURRENT_REQUESTS unless MAX_ADAPTIVE_CONCURRENCY is higher.
+        """
+        if self.completion_rate_controller is not None:
+            return self.completion_rate_controller.max_concurrency
+        return self.max_concurrent
     
     async def get_completion(
         self, 
@@ -65,38 +119,84 @@ class LLMWrapper:
             The model's completion text
         """
         # Check cache first if enabled
-        if self.enable_cache:
-            cache_key = self._get_cache_key(prompt, temperature, seed, max_tokens)
-            cached_response = self._get_from_cache(cache_key)
-            if cached_response:
-                return cached_response
+        cache_key = self._get_cache_key(prompt, temperature, seed, max_tokens)
+        cached_response = self._get_from_cache(cache_key)
+        if cached_response:
+            return cached_response
         
         # Format the message for the API
         messages = [{"role": "user", "content": prompt}]
         
-        # Make the API call with retries
-        response = await self._call_with_retry(
-            lambda: self.client.chat.completions.create(
-                model=self.completion_model,
-                messages=messages,
-                temperature=temperature,
-                seed=seed,
-                max_tokens=max_tokens,
-            )
+        return await self._single_flight(
+            cache_key,
+            lambda: self._request_completion(cache_key, messages, temperature, seed, max_tokens),
         )
+    
+    async def stream_completion(
+        self,
+        prompt: Union[str, List[Dict[str, str]]],
+        temperature: float = 0,
+        seed: int = 42,
+        max_tokens: int = 1000,
+    ) -> AsyncIterator[str]:
+        """Stream a completion from the model in text chunks.
         
-        # Extract the completion text
-        completion_text = response.choices[0].message.content
+        Closing the iterator early cancels the rest of the completion. Only
+        completions that were read to the end are cached; a cached completion
+        is returned as a single chunk.
         
-        # Cache the response if enabled
-        if self.enable_cache:
-            self._save_to_cache(cache_key, completion_text)
+        Args:
+            prompt: The prompt to send to the model, or a list of chat messages
+            temperature: Sampling temperature (lower = more deterministic)
+            seed: Random seed for reproducibility
+            max_tokens: Maximum tokens to generate
+            
+        Yields:
+            Chunks of the completion text
+        """
+        if isinstance(prompt, str):
+            messages = [{"role": "user", "content": prompt}]
+        else:
+            messages = prompt
         
-        return completion_text
+        # Check cache first if enabled
+        cache_key = self._get_chat_cache_key(messages, temperature, seed, max_tokens)
+        cached_response = self._get_from_cache(cache_key)
+        if cached_response:
+            yield cached_response
+            return
+        
+        self.completion_requests += 1
+        
+        # Open the stream with retries; errors after the first chunk are not retried
+        chunks = await self._call_with_retry(
+            lambda: self.backend.stream(
+                self.completion_model, messages, temperature, seed, max_tokens
+            ),
+            rate_controller=self.completion_rate_controller,
+            estimated_tokens=self._estimate_completion_tokens(messages, max_tokens),
+        )
+        
+        received = []
+        finished = False
+        try:
+            async for chunk in chunks:
+                received.append(chunk)
+                yield chunk
+            finished = True
+        finally:
+            await chunks.aclose()
+            if finished:
+                self._save_to_cache(cache_key, "".join(received))
+            else:
+                self.streams_aborted += 1
     
     async def get_embedding(self, text: str) -> List[float]:
         """Get an embedding vector for the given text.
         
+        Cache misses are queued on the embedding batcher so that concurrent
+        calls are sent together as one multi-input request.
+        
         Args:
             text: The text to embed
             
@@ -104,27 +204,79 @@ class LLMWrapper:
             List of embedding values
         """
         # Check cache first if enabled
-        if self.enable_cache:
-            cache_key = self._get_cache_key(text, prefix="embed")
-            cached_response = self._get_from_cache(cache_key)
-            if cached_response:
-                return json.loads(cached_response)
+        cached_embedding = self._get_embedding_from_cache(text)
+        if cached_embedding:
+            return cached_embedding
         
-        # Make the API call with retries
-        response = await self._call_with_retry(
-            lambda: self.client.embeddings.create(
-                model=self.embedding_model,
-                input=[text],
+        return await self._submit_embedding(text)
+    
+    async def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Get embedding vectors for several texts.
+        
+        Each text is looked up in the cache first; only the misses are sent
+        to the API, in as few requests as the batch size allows.
+        
+        Args:
+            texts: The texts to embed
+            
+        Returns:
+            List of embedding vectors, in the same order as `texts`
+        """
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        misses: Dict[str, List[int]] = {}
+        
+        for i, text in enumerate(texts):
+            cached_embedding = self._get_embedding_from_cache(text)
+            if cached_embedding:
+                embeddings[i] = cached_embedding
+            else:
+                misses.setdefault(text, []).append(i)
+        
+        if misses:
+            vectors = await asyncio.gather(
+                *[self._submit_embedding(text) for text in misses]
             )
+            for indices, vector in zip(misses.values(), vectors):
+                for i in indices:
+                    embeddings[i] = vector
+        
+        return embeddings
+    
+    async def _submit_embedding(self, text: str) -> List[float]:
+        """Queue a cache miss on the batcher, joining an identical in-flight request.
+        
+        Args:
+            text: The text to embed
+            
+        Returns:
+            Embedding vector for the text
+        """
+        return await self._single_flight(
+            self._get_cache_key(text, prefix="embed"),
+            lambda: self._embedding_batcher.submit(text),
         )
+    
+    async def _request_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts in a single API request and cache the results.
         
-        embedding = response.data[0].embedding
+        Args:
+            texts: The texts to embed
+            
+        Returns:
+            List of embedding vectors, in the same order as `texts`
+        """
+        response = await self._call_with_retry(
+            lambda: self.backend.embed(self.embedding_model, texts),
+            rate_controller=self.embedding_rate_controller,
+            estimated_tokens=sum(len(text) for text in texts) // 4,
+        )
+        embeddings = response.embeddings
         
-        # Cache the response if enabled
-        if self.enable_cache:
-            self._save_to_cache(cache_key, json.dumps(embedding))
+        # Cache the responses if enabled
+        for text, embedding in zip(texts, embeddings):
+            self._save_embedding_to_cache(text, embedding)
         
-        return embedding
+        return embeddings
     
     async def get_chat_completion(
         self,
@@ -145,34 +297,103 @@ class LLMWrapper:
             The model's completion text
         """
         # Check cache first if enabled
-        if self.enable_cache:
-            # Create a string representation of messages for caching
-            messages_str = json.dumps(messages)
-            cache_key = self._get_cache_key(messages_str, temperature, seed, max_tokens, prefix="chat_msgs")
-            cached_response = self._get_from_cache(cache_key)
-            if cached_response:
-                return cached_response
+        cache_key = self._get_chat_cache_key(messages, temperature, seed, max_tokens)
+        cached_response = self._get_from_cache(cache_key)
+        if cached_response:
+            return cached_response
+        
+        return await self._single_flight(
+            cache_key,
+            lambda: self._request_completion(cache_key, messages, temperature, seed, max_tokens),
+        )
+    
+    async def _request_completion(
+        self,
+        cache_key: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        seed: int,
+        max_tokens: int,
+    ) -> str:
+        """Request a chat completion from the API and cache the result.
+        
+        Args:
+            cache_key: Cache key to store the completion under
+            messages: List of message dictionaries with 'role' and 'content'
+            temperature: Sampling temperature
+            seed: Random seed
+            max_tokens: Maximum tokens to generate
+            
+        Returns:
+            The model's completion text
+        """
+        self.completion_requests += 1
         
         # Make the API call with retries
         response = await self._call_with_retry(
-            lambda: self.client.chat.completions.create(
-                model=self.completion_model,
-                messages=messages,
-                temperature=temperature,
-                seed=seed,
-                max_tokens=max_tokens,
-            )
+            lambda: self.backend.complete(
+                self.completion_model, messages, temperature, seed, max_tokens
+            ),
+            rate_controller=self.completion_rate_controller,
+            estimated_tokens=self._estimate_completion_tokens(messages, max_tokens),
         )
-        
-        # Extract the completion text
-        completion_text = response.choices[0].message.content
+        completion_text = response.text
         
         # Cache the response if enabled
-        if self.enable_cache:
-            self._save_to_cache(cache_key, completion_text)
+        self._save_to_cache(cache_key, completion_text)
         
         return completion_text
     
+    async def _single_flight(self, key: str, request) -> Any:
+        """Run a request once per key, sharing the result with concurrent duplicates.
+        
+        Identical calls made while a request is still in flight await the
+        same future instead of issuing their own API call; the cache cannot
+        help until the first one has finished.
+        
+        Args:
+            key: Cache key identifying the request
+            request: Zero-argument function returning the request coroutine
+            
+        Returns:
+            The request's result
+        """
+        future = self._inflight.get(key)
+        if future is not None and not future.done():
+            self.coalesced_calls += 1
+        else:
+            future = asyncio.ensure_future(request())
+            self._inflight[key] = future
+            future.add_done_callback(
+                lambda f: self._inflight.pop(key, None) if self._inflight.get(key) is f else None
+            )
+        
+        # Shield so one cancelled caller does not cancel the others
+        return await asyncio.shield(future)
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Return request and cache counters accumulated by this wrapper.
+        
+        Returns:
+            Dictionary of counter names to values
+        """
+        stats = {
+            "completion_requests": self.completion_requests,
+            "embedding_requests": self._embedding_batcher.requests_sent,
+            "embedding_inputs": self._embedding_batcher.inputs_sent,
+            "coalesced_calls": self.coalesced_calls,
+            "streams_aborted": self.streams_aborted,
+            "rate_limited_calls": self.rate_limited_calls,
+        }
+        
+        cache_stats = getattr(self.cache, "stats", None)
+        if cache_stats:
+            stats["cache_hits"] = cache_stats["hits"]
+            stats["cache_store_hits"] = cache_stats["store_hits"]
+            stats["cache_misses"] = cache_stats["misses"]
+        
+        return stats
+    
     async def batch_completions(
         self, 
         prompts: List[str],
@@ -194,7 +415,7 @@ class LLMWrapper:
             List of completion texts
         """
         tasks = []
-        semaphore = asyncio.Semaphore(self.max_concurrent)
+        semaphore = asyncio.Semaphore(self.concurrency_limit)
         
         async def bounded_completion(prompt):
             async with semaphore:
@@ -218,14 +439,22 @@ class LLMWrapper:
         max_retries: int = 3, 
         base_delay: float = 1.0,
         max_delay: float = 16.0,
+        rate_controller: Optional[RateController] = None,
+        estimated_tokens: int = 0,
     ) -> Any:
         """Make API call with exponential backoff retry.
         
+        With a rate controller, each attempt waits for a slot and budget,
+        and a 429 pauses every request sharing the controller instead of
+        backing off this call alone.
+        
         Args:
             api_call: Async function to call
             max_retries: Maximum number of retries
             base_delay: Initial delay in seconds
             max_delay: Maximum delay in seconds
+            rate_controller: Shared rate controller, if any
+            estimated_tokens: Tokens to reserve from the controller's budget
         
         Returns:
             API response
@@ -237,19 +466,86 @@ class LLMWrapper:
         delay = base_delay
         
         while True:
+            if rate_controller is not None:
+                await rate_controller.acquire(estimated_tokens)
+            start = time.monotonic()
+            
             try:
-                return await api_call()
-            except (openai.RateLimitError, openai.APITimeoutError) as e:
+                response = await api_call()
+            except (openai.RateLimitError, openai.APITimeoutError, RateLimitExceeded) as e:
+                rate_limited = not isinstance(e, openai.APITimeoutError)
+                if rate_limited:
+                    self.rate_limited_calls += 1
+                
+                if rate_controller is not None:
+                    if rate_limited:
+                        await rate_controller.on_rate_limited(self._get_retry_after(e))
+                    else:
+                        await rate_controller.on_failure()
+                
                 retries += 1
                 if retries > max_retries:
                     raise
                 
+                # The controller's shared pause replaces the per-call backoff
+                if rate_controller is not None and rate_limited:
+                    continue
+                
                 # Calculate delay with exponential backoff and jitter
                 jitter = 0.1 * delay * (2 * (0.5 - (hash(str(e)) % 10) / 10))
                 delay = min(delay * 2 + jitter, max_delay)
                 
                 # Wait before retrying
                 await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                if rate_controller is not None:
+                    await rate_controller.on_failure()
+                raise
+            
+            if rate_controller is not None:
+                await rate_controller.on_success(
+                    time.monotonic() - start,
+                    estimated_tokens,
+                    self._get_used_tokens(response),
+                    getattr(response, "headers", None),
+                )
+            return response
+    
+    @staticmethod
+    def _estimate_completion_tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+        """Estimate the tokens a completion request counts against the budget.
+        
+        Rate limits reserve the prompt plus `max_tokens` up front, so the
+        estimate does the same, using ~4 characters per token.
+        """
+        return sum(len(m.get("content") or "") for m in messages) // 4 + max_tokens
+    
+    @staticmethod
+    def _get_used_tokens(response: Any) -> Optional[int]:
+        """Return the tokens a backend response reports as used, if any."""
+        if hasattr(response, "total_tokens"):
+            return response.total_tokens
+        if hasattr(response, "completion_tokens"):
+            return response.prompt_tokens + response.completion_tokens
+        return None
+    
+    @staticmethod
+    def _get_retry_after(error: Exception) -> Optional[float]:
+        """Return the server's requested wait in seconds from a 429 error."""
+        if isinstance(error, RateLimitExceeded):
+            return error.retry_after
+        
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None) or {}
+        try:
+            if "retry-after-ms" in headers:
+                return float(headers["retry-after-ms"]) / 1000.0
+            if "retry-after" in headers:
+                return float(headers["retry-after"])
+        except ValueError:
+            return None
+        return None
     
     def _get_cache_key(self, content: str, *args, prefix: str = "chat") -> str:
         """Generate a cache key from content and args.
@@ -269,6 +565,32 @@ class LLMWrapper:
         hash_val = hashlib.sha256(hash_content.encode()).hexdigest()
         return f"{prefix}_{hash_val}"
     
+    def _get_chat_cache_key(self, messages: List[Dict[str, str]], *args) -> str:
+        """Generate a cache key for a list of chat messages.
+        
+        Messages are hashed in a canonical serialization (role and content
+        only, sorted keys, no whitespace), so the same conversation built
+        in different runs or with extra message fields hits the same entry.
+        A lone user message shares the key of the equivalent plain prompt.
+        
+        Args:
+            messages: List of message dictionaries with 'role' and 'content'
+            *args: Additional args to include in the hash
+            
+        Returns:
+            Cache key string
+        """
+        if len(messages) == 1 and messages[0]["role"] == "user":
+            return self._get_cache_key(messages[0].get("content") or "", *args)
+        
+        canonical = json.dumps(
+            [{"role": m["role"], "content": m.get("content") or ""} for m in messages],
+            sort_keys=True,
+            separators=(",", ":"),
+            ensure_ascii=False,
+        )
+        return self._get_cache_key(canonical, *args, prefix="chat_msgs")
+    
     def _get_from_cache(self, cache_key: str) -> Optional[str]:
         """Get a response from the cache.
         
@@ -281,15 +603,7 @@ class LLMWrapper:
         if not self.enable_cache:
             return None
         
-        cache_file = self.cache_dir / f"{cache_key}.json"
-        if cache_file.exists():
-            try:
-                with open(cache_file, "r") as f:
-                    return f.read()
-            except Exception:
-                return None
-        
-        return None
+        return self.cache.get(cache_key)
     
     def _save_to_cache(self, cache_key: str, content: str) -> None:
         """Save a response to the cache.
@@ -301,17 +615,30 @@ class LLMWrapper:
         if not self.enable_cache:
             return
         
-        cache_file = self.cache_dir / f"{cache_key}.json"
-        try:
-            # Ensure the cache directory exists
-            os.makedirs(self.cache_dir, exist_ok=True)
+        self.cache.set(cache_key, content)
+    
+    def _get_embedding_from_cache(self, text: str) -> Optional[List[float]]:
+        """Get an embedding vector from the cache.
+        
+        Args:
+            text: The embedded text
             
-            # Write with atomic replacement to avoid partial writes
-            temp_file = cache_file.with_suffix(".tmp")
-            with open(temp_file, "w") as f:
-                f.write(content)
-            temp_file.replace(cache_file)
-        except Exception:
-            # Silently fail if caching encounters an error
-            # This way, the main operation can continue even if caching fails
-            pass 
\ No newline at end of file
+        Returns:
+            Cached vector if found, None otherwise
+        """
+        if not self.enable_cache:
+            return None
+        
+        return self.cache.get_vector(self._get_cache_key(text, prefix="embed"))
+    
+    def _save_embedding_to_cache(self, text: str, embedding: List[float]) -> None:
+        """Save an embedding vector to the cache.
+        
+        Args:
+            text: The embedded text
+            embedding: Vector to cache
+        """
+        if not self.enable_cache:
+            return
+        
+        self.cache.set_vector(self._get_cache_key(text, prefix="embed"), embedding)
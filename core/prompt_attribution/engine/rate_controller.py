@@ -0,0 +1,335 @@
+"""Shared rate limiting and adaptive concurrency for LLM requests."""
+
+import asyncio
+import re
+import time
+from typing import Dict, Optional
+
+from ..settings import Settings, get_settings
+
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_reset_duration(value: str) -> Optional[float]:
+    """Parse a rate-limit reset header such as '1s', '6m0s' or '120ms'.
+
+    Args:
+        value: Header value
+
+    Returns:
+        Duration in seconds, or None if the value cannot be parsed
+    """
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_SECONDS[unit] for amount, unit in parts)
+
+
+class TokenBucket:
+    """Budget that refills continuously up to a per-minute capacity."""
+
+    def __init__(self, per_minute: float):
+        """Initialize the bucket, starting full.
+
+        Args:
+            per_minute: Capacity refilled every minute (0 disables the limit)
+        """
+        self.per_minute = per_minute
+        self.level = per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.per_minute, self.level + (now - self._updated) * self.per_minute / 60.0)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it is available now)."""
+        if self.per_minute <= 0:
+            return 0.0
+        self._refill()
+        # Requests larger than the whole budget only wait for a full bucket
+        amount = min(amount, self.per_minute)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60.0 / self.per_minute
+
+    def take(self, amount: float) -> None:
+        """Spend `amount`; the level may go negative when correcting estimates."""
+        if self.per_minute <= 0:
+            return
+        self._refill()
+        self.level -= amount
+
+    def clamp(self, remaining: float) -> None:
+        """Lower the level to what the server reports as remaining."""
+        if self.per_minute <= 0:
+            return
+        self._refill()
+        self.level = min(self.level, remaining)
+
+
+class RateController:
+    """Requests/min and tokens/min budgets plus AIMD concurrency control.
+
+    Every request first waits for a concurrency slot and for room in both
+    budgets. The concurrency limit grows additively (about one slot per
+    limit's worth of successful requests) and shrinks multiplicatively on
+    429s and when recent latency rises well above its long-run average.
+    Rate-limit response headers set unknown budgets and correct the local
+    budget levels; a 429 pauses every request sharing the controller.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        initial_concurrency: int = 10,
+        min_concurrency: int = 1,
+        max_concurrency: int = 64,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 2.0,
+        base_backoff: float = 1.0,
+        max_backoff: float = 16.0,
+    ):
+        """Initialize the controller.
+
+        Args:
+            requests_per_minute: Request budget (0 = learn it from response headers)
+            tokens_per_minute: Token budget (0 = learn it from response headers)
+            initial_concurrency: Starting concurrency limit
+            min_concurrency: Lowest concurrency limit
+            max_concurrency: Highest concurrency limit
+            decrease_factor: Multiplier applied to the limit on a 429
+            latency_tolerance: Ratio of recent to long-run latency treated as congestion
+            base_backoff: Pause after a 429 without a Retry-After value
+            max_backoff: Longest pause after repeated 429s
+        """
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(max(min_concurrency, min(initial_concurrency, max_concurrency)))
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self.in_flight = 0
+        self._paused_until = 0.0
+        self._backoff = base_backoff
+        self._last_decrease = 0.0
+        self._latency_short: Optional[float] = None
+        self._latency_long: Optional[float] = None
+
+        # Waiters are bound to the event loop they were created in
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._condition: Optional[asyncio.Condition] = None
+
+        # Counters for reporting
+        self.rate_limited = 0
+        self.decreases = 0
+        self.throttled_seconds = 0.0
+
+    def _get_condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._loop is not loop:
+            # A new event loop cannot inherit requests from a finished one
+            self._loop = loop
+            self._condition = asyncio.Condition()
+            self.in_flight = 0
+        return self._condition
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """Wait for a concurrency slot and budget for one request.
+
+        Every successful `acquire` must be followed by exactly one call to
+        `on_success`, `on_rate_limited` or `on_failure`.
+
+        Args:
+            tokens: Estimated tokens the request will consume
+        """
+        condition = self._get_condition()
+        started = time.monotonic()
+
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < int(self.concurrency))
+            self.in_flight += 1
+
+        try:
+            while True:
+                delay = max(
+                    self._paused_until - time.monotonic(),
+                    self.requests.wait_time(1),
+                    self.tokens.wait_time(tokens),
+                )
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+        except BaseException:
+            await self._release()
+            raise
+
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        self.throttled_seconds += time.monotonic() - started
+
+    async def _release(self) -> None:
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight = max(0, self.in_flight - 1)
+            condition.notify_all()
+
+    async def on_success(
+        self,
+        latency: float,
+        estimated_tokens: int = 0,
+        used_tokens: Optional[int] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """Record a successful request and release its slot.
+
+        Args:
+            latency: Request latency in seconds
+            estimated_tokens: Tokens reserved in `acquire`
+            used_tokens: Tokens actually consumed, if known
+            headers: Response headers with rate-limit information
+        """
+        if used_tokens is not None:
+            self.tokens.take(used_tokens - estimated_tokens)
+        if headers:
+            self._apply_headers(headers)
+
+        self._backoff = self.base_backoff
+        self._record_latency(latency)
+
+        # Additive increase: about one extra slot per `concurrency` successes
+        if int(self.concurrency) <= self.in_flight:
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / self.concurrency)
+
+        await self._release()
+
+    async def on_rate_limited(self, retry_after: Optional[float] = None) -> None:
+        """Record a 429, pause all requests and release the slot.
+
+        Args:
+            retry_after: Server-provided wait in seconds, if any
+        """
+        self.rate_limited += 1
+
+        if retry_after is None:
+            retry_after = self._backoff
+            self._backoff = min(self._backoff * 2, self.max_backoff)
+        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+        self._decrease()
+        await self._release()
+
+    async def on_failure(self) -> None:
+        """Release the slot of a request that failed for another reason."""
+        await self._release()
+
+    def _decrease(self) -> None:
+        """Multiplicative decrease, at most once per typical request latency.
+
+        A burst of failures from requests that were sent together is a
+        single congestion signal.
+        """
+        now = time.monotonic()
+        cooldown = self._latency_long or 1.0
+        if now - self._last_decrease < cooldown:
+            return
+
+        self.concurrency = max(self.min_concurrency, self.concurrency * self.decrease_factor)
+        self._last_decrease = now
+        self.decreases += 1
+
+    def _record_latency(self, latency: float) -> None:
+        """Update latency averages and back off when latency climbs."""
+        if self._latency_long is None:
+            self._latency_short = self._latency_long = latency
+            return
+
+        self._latency_short = 0.5 * self._latency_short + 0.5 * latency
+        self._latency_long = 0.95 * self._latency_long + 0.05 * latency
+
+        if self._latency_short > self.latency_tolerance * self._latency_long:
+            self._decrease()
+
+    def _apply_headers(self, headers: Dict[str, str]) -> None:
+        """Use x-ratelimit-* headers to learn budgets and correct levels."""
+        headers = {key.lower(): value for key, value in headers.items()}
+
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            limit = headers.get(f"x-ratelimit-limit-{kind}")
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+
+            try:
+                if limit is not None and bucket.per_minute <= 0:
+                    bucket.per_minute = float(limit)
+                    bucket.level = bucket.per_minute
+                if remaining is not None:
+                    bucket.clamp(float(remaining))
+            except ValueError:
+                continue
+
+            # An exhausted budget pauses everyone until the server resets it
+            reset = headers.get(f"x-ratelimit-reset-{kind}")
+            if remaining is not None and reset is not None and remaining.strip() in ("0", "0.0"):
+                seconds = parse_reset_duration(reset)
+                if seconds is not None:
+                    self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        """Current limit, in-flight requests and throttling counters."""
+        return {
+            "concurrency": int(self.concurrency),
+            "in_flight": self.in_flight,
+            "requests_per_minute": self.requests.per_minute,
+            "tokens_per_minute": self.tokens.per_minute,
+            "rate_limited": self.rate_limited,
+            "decreases": self.decreases,
+            "throttled_seconds": self.throttled_seconds,
+        }
+
+
+# One controller per backend and model, shared by every wrapper in the process
+_controllers: Dict[str, RateController] = {}
+
+
+def get_rate_controller(name: str, settings: Optional[Settings] = None) -> RateController:
+    """Return the process-wide rate controller for a backend and model.
+
+    Args:
+        name: Identifier of the rate-limited resource, e.g. "OpenAIBackend:gpt-4o"
+        settings: Settings used when the controller is first created
+
+    Returns:
+        Shared rate controller
+    """
+    controller = _controllers.get(name)
+    if controller is None:
+        settings = settings or get_settings()
+        controller = RateController(
+            requests_per_minute=settings.rate_limit_rpm,
+            tokens_per_minute=settings.rate_limit_tpm,
+            initial_concurrency=settings.max_concurrent_requests,
+            max_concurrency=max(settings.max_concurrent_requests, settings.max_adaptive_concurrency),
+        )
+        _controllers[name] = controller
+
+    return controller
+
+
+def reset_rate_controllers() -> None:
+    """Forget all shared controllers (e.g. between benchmark cases)."""
+    _controllers.clear()
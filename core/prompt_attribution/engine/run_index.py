@@ -0,0 +1,176 @@
+"""SQLite index of attribution runs for listing and querying."""
+
+import atexit
+import hashlib
+import os
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, List, Optional
+
+
+def prompt_hash(prompt: str) -> str:
+    """Hash identifying a prompt text in the run index."""
+    return hashlib.sha256(prompt.encode()).hexdigest()
+
+
+@dataclass
+class RunSummary:
+    """Indexed summary of a run."""
+
+    id: str
+    timestamp: str
+    prompt_hash: str
+    completion_model: str
+    embedding_model: str
+    segment_count: int
+    result_count: int
+    max_delta: Optional[float]
+    status: str
+
+
+_COLUMNS = (
+    "id", "timestamp", "prompt_hash", "completion_model", "embedding_model",
+    "segment_count", "result_count", "max_delta", "status",
+)
+
+
+class RunIndex:
+    """Embedded SQLite table with one row per run.
+
+    The run directories remain the source of truth; the index holds the
+    columns needed to list and filter runs without opening them.
+    """
+
+    def __init__(self, path: str):
+        """Open (or create) the index.
+
+        Args:
+            path: Path to the database file
+        """
+        self.path = Path(path)
+        os.makedirs(self.path.parent, exist_ok=True)
+        self.is_new = not self.path.exists()
+
+        self._conn = sqlite3.connect(str(self.path), timeout=30.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "id TEXT PRIMARY KEY, timestamp TEXT NOT NULL, prompt_hash TEXT NOT NULL, "
+            "completion_model TEXT, embedding_model TEXT, segment_count INTEGER, "
+            "result_count INTEGER, max_delta REAL, status TEXT)"
+        )
+        # Filters are combined with newest-first ordering, so index them with the timestamp
+        self._conn.execute("CREATE INDEX IF NOT EXISTS runs_timestamp ON runs (timestamp)")
+        for column in ("prompt_hash", "completion_model", "status"):
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS runs_{column} ON runs ({column}, timestamp)")
+        self._conn.commit()
+        atexit.register(self.close)
+
+    def upsert(self, run: Any) -> None:
+        """Add or update the row for a run.
+
+        Args:
+            run: Run to index
+        """
+        if self._conn is None:
+            return
+
+        deltas = [result.get("delta_cos", 0.0) for result in run.ablation_results]
+        row = (
+            run.id,
+            run.timestamp,
+            prompt_hash(run.prompt),
+            run.settings.get("completion_model"),
+            run.settings.get("embedding_model"),
+            len(run.segments),
+            len(run.ablation_results),
+            max(deltas) if deltas else None,
+            run.status,
+        )
+        try:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO runs ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                row,
+            )
+            self._conn.commit()
+        except sqlite3.Error:
+            # The index can be rebuilt; it must not break saving the run
+            return
+
+    def delete(self, run_id: str) -> None:
+        """Remove a run from the index."""
+        if self._conn is None:
+            return
+        self._conn.execute("DELETE FROM runs WHERE id = ?", (run_id,))
+        self._conn.commit()
+
+    def query(
+        self,
+        prompt_hash: Optional[str] = None,
+        completion_model: Optional[str] = None,
+        embedding_model: Optional[str] = None,
+        status: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        min_max_delta: Optional[float] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> List[RunSummary]:
+        """Return indexed runs matching all given filters, newest first.
+
+        Args:
+            prompt_hash: Only runs of the prompt with this hash
+            completion_model: Only runs using this completion model
+            embedding_model: Only runs using this embedding model
+            status: Only runs with this status
+            since: Only runs at or after this ISO timestamp
+            until: Only runs before this ISO timestamp
+            min_max_delta: Only runs whose highest delta is at least this
+            limit: Maximum number of runs returned
+            offset: Number of matching runs to skip
+
+        Returns:
+            Matching run summaries
+        """
+        if self._conn is None:
+            return []
+
+        conditions = []
+        params: List[Any] = []
+        for column, op, value in (
+            ("prompt_hash", "=", prompt_hash),
+            ("completion_model", "=", completion_model),
+            ("embedding_model", "=", embedding_model),
+            ("status", "=", status),
+            ("timestamp", ">=", since),
+            ("timestamp", "<", until),
+            ("max_delta", ">=", min_max_delta),
+        ):
+            if value is not None:
+                conditions.append(f"{column} {op} ?")
+                params.append(value)
+
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM runs"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY timestamp DESC"
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([limit if limit is not None else -1, offset])
+
+        return [RunSummary(*row) for row in self._conn.execute(sql, params)]
+
+    def count(self) -> int:
+        """Number of indexed runs."""
+        if self._conn is None:
+            return 0
+        return self._conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def close(self) -> None:
+        """Close the database connection."""
+        if self._conn is None:
+            return
+        self._conn.close()
+        self._conn = None
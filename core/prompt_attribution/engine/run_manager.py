@@ -1,16 +1,28 @@
 """Run manager for persisting attribution runs and results."""
 
+import atexit
+import hashlib
 import json
 import os
 import time
 import uuid
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field, asdict, fields, replace
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 
-from ..segmenter import Span
+import numpy as np
+
+from ..segmenter import ChatPrompt, Span, SpanView
 from ..settings import get_settings
+from .run_index import RunIndex, RunSummary, prompt_hash
+
+
+# Run fields that are fixed once the run is created; stored in header.json
+_HEADER_FIELDS = ("id", "timestamp", "prompt", "messages", "completion", "segments", "settings")
+
+# Scalar result fields stored as typed columns in the snapshot's .npz sidecar
+_RESULT_COLUMNS = {"span_id": np.int32, "delta_cos": np.float32, "elapsed_ms": np.int32}
 
 
 @dataclass
@@ -22,6 +34,24 @@ class AblationResult:
     elapsed_ms: int
     # Per-sentence impact values (optional)
     sentence_deltas: List[float] = field(default_factory=list)
+    # Semantic alignment only: baseline sentences with no match in the ablated
+    # response, and ablated sentences with no match in the baseline
+    deleted_sentences: List[int] = field(default_factory=list)
+    inserted_sentences: List[int] = field(default_factory=list)
+    # Streaming only: the completion was cut off once its unread sentences
+    # could no longer matter; delta_cos is then the estimated mean sentence
+    # delta (ci_low/ci_high bound it) and sentence_deltas cover only the
+    # sentences read
+    partial: bool = False
+    # Recursive refinement: ID of the segment this one was split from, and its level
+    parent_id: Optional[int] = None
+    depth: int = 0
+    # Adaptive sampling: number of samples behind delta_cos (their mean),
+    # their variance and the confidence interval of the mean
+    samples: int = 1
+    delta_var: float = 0.0
+    ci_low: Optional[float] = None
+    ci_high: Optional[float] = None
 
 
 @dataclass
@@ -34,15 +64,28 @@ class Run:
     # Input data
     prompt: str = ""
     completion: str = ""
+    # Chat runs: the prompt's messages ('role' and 'content'); `prompt` then
+    # holds their `ChatPrompt` text, which segment offsets refer to
+    messages: List[Dict[str, str]] = field(default_factory=list)
     
     # Segmentation
     segments: List[Dict] = field(default_factory=list)
     
     # Results
     ablation_results: List[Dict] = field(default_factory=list)
+    # Group ablation: outcome of each subset ablation ('removed' span IDs,
+    # 'delta_cos', 'sentence_deltas'), kept so an interrupted run can resume
+    group_samples: List[Dict] = field(default_factory=list)
+    # Adaptive sampling: each repeated ablation ('span_id', 'seed',
+    # 'delta_cos', 'sentence_deltas', 'elapsed_ms'), kept for the same reason
+    adaptive_samples: List[Dict] = field(default_factory=list)
     
     # Metadata
     settings: Dict = field(default_factory=dict)
+    # Request counters for this run (API calls, coalesced calls, cache hits)
+    stats: Dict = field(default_factory=dict)
+    # "running", "interrupted" (checkpointed and resumable) or "completed"
+    status: str = "running"
     # Response sentence -> controlling segment mapping (index = sentence idx, value = segment id)
     response_control: List[int] = field(default_factory=list)
     response_sentence_deltas: List[float] = field(default_factory=list)
@@ -50,9 +93,99 @@ class Run:
     # Rewrite suggestions - keyed by "seg{span_id}_sent{sentence_idx}"
     rewrite_suggestions: Dict[str, List[str]] = field(default_factory=dict)
     
+    def __post_init__(self):
+        # Typed result columns loaded from the snapshot sidecar (see `_unpack_results`)
+        self._columns: Optional[Dict[str, np.ndarray]] = None
+    
     def to_dict(self) -> Dict:
-        """Convert to dictionary for serialization."""
-        return asdict(self)
+        """Convert to dictionary for serialization.
+        
+        Per-sentence deltas loaded as float32 row views become lists here.
+        """
+        data = asdict(replace(self, ablation_results=[]))
+        data["ablation_results"] = [_json_result(result) for result in self.ablation_results]
+        return data
+    
+    def influence_matrix(self, num_sentences: Optional[int] = None) -> np.ndarray:
+        """Segment x sentence influence matrix.
+        
+        Row i holds the per-sentence deltas of the segment with span ID i
+        (zeros for segments without a result); column j is response
+        sentence j.
+        
+        Args:
+            num_sentences: Number of columns (defaults to the number of
+                response sentences, or the longest result if unknown)
+            
+        Returns:
+            float32 matrix of shape (segments, num_sentences); for a loaded
+            run this may be the snapshot's read-only matrix itself
+        """
+        results = self.ablation_results
+        columns = self._columns
+        stored = columns["sentence_deltas"] if columns is not None else None
+        # Results added since loading (or all of them, if the snapshot rows changed)
+        added = [r for r in results if not isinstance(r.get("sentence_deltas"), np.ndarray)]
+        if stored is not None and len(results) - len(added) != len(stored):
+            stored, added = None, results
+        
+        if num_sentences is None:
+            num_sentences = len(self.response_sentence_deltas) or max(
+                [len(r.get("sentence_deltas", [])) for r in added]
+                + [stored.shape[1] if stored is not None else 0]
+            )
+        num_rows = max([len(self.segments)] + [r["span_id"] + 1 for r in results])
+        
+        if stored is not None:
+            span_ids = columns["span_id"]
+            # Serve the loaded matrix itself when it already has this layout
+            if (not added and stored.shape == (num_rows, num_sentences)
+                    and np.array_equal(span_ids, np.arange(num_rows))):
+                return stored
+            matrix = np.zeros((num_rows, num_sentences), dtype=np.float32)
+            width = min(num_sentences, stored.shape[1])
+            matrix[span_ids, :width] = stored[:, :width]
+        else:
+            matrix = np.zeros((num_rows, num_sentences), dtype=np.float32)
+        
+        for result in added:
+            deltas = np.asarray(result.get("sentence_deltas", []), dtype=np.float32)[:num_sentences]
+            matrix[result["span_id"], :len(deltas)] = deltas
+        return matrix
+    
+    def result_tree(self) -> List[Dict]:
+        """Arrange the results of a hierarchical run as a tree.
+        
+        Each node holds a tested segment (span_id, start, end, text, depth,
+        delta_cos) and the nodes of the segments it was split into under
+        "children". Segments without a result are left out.
+        
+        Returns:
+            Root nodes (segments without a parent), in span ID order
+        """
+        spans = {segment["id"]: segment for segment in self.segments}
+        nodes: Dict[int, Dict] = {}
+        for result in sorted(self.ablation_results, key=lambda r: r["span_id"]):
+            span = spans.get(result["span_id"], {})
+            nodes[result["span_id"]] = {
+                "span_id": result["span_id"],
+                "start": span.get("start"),
+                "end": span.get("end"),
+                "text": span.get("text", ""),
+                "depth": result.get("depth", 0),
+                "delta_cos": result["delta_cos"],
+                "children": [],
+            }
+        
+        roots = []
+        for result in sorted(self.ablation_results, key=lambda r: r["span_id"]):
+            node = nodes[result["span_id"]]
+            parent_id = result.get("parent_id")
+            if parent_id in nodes:
+                nodes[parent_id]["children"].append(node)
+            else:
+                roots.append(node)
+        return roots
     
     def get_key_for_rewrite(self, span_id: int, sentence_idx: int) -> str:
         """Generate consistent key for rewrite suggestions dictionary.
@@ -78,35 +211,161 @@ class Run:
         self.rewrite_suggestions[key] = suggestions
 
 
+def _pack_results(results: List[Dict]) -> Tuple[Dict[str, np.ndarray], List[Dict]]:
+    """Split result dicts into typed columns and the remaining JSON fields.
+    
+    Args:
+        results: Ablation result dicts
+        
+    Returns:
+        Tuple of (arrays for the .npz sidecar, per-result dicts of other fields)
+    """
+    count = len(results)
+    arrays = {
+        name: np.fromiter((r.get(name, 0) for r in results), dtype=dtype, count=count)
+        for name, dtype in _RESULT_COLUMNS.items()
+    }
+    
+    # Ragged per-sentence deltas are padded into a matrix plus row lengths
+    lengths = np.fromiter((len(r.get("sentence_deltas", [])) for r in results), dtype=np.int32, count=count)
+    matrix = np.zeros((count, int(lengths.max()) if count else 0), dtype=np.float32)
+    for row, result in enumerate(results):
+        if lengths[row]:
+            matrix[row, :lengths[row]] = result["sentence_deltas"]
+    arrays["sentence_deltas"] = matrix
+    arrays["sentence_counts"] = lengths
+    
+    rest = [
+        {key: value for key, value in r.items() if key not in _RESULT_COLUMNS and key != "sentence_deltas"}
+        for r in results
+    ]
+    return arrays, rest
+
+
+def _unpack_results(arrays: Dict[str, np.ndarray], rest: List[Dict]) -> List[Dict]:
+    """Rebuild result dicts from typed columns and the remaining JSON fields.
+    
+    Per-sentence deltas become read-only float32 views into a single
+    matrix rather than lists of Python floats; `Run.to_dict` turns them
+    into lists.
+    
+    Args:
+        arrays: Mapping of column name to array, as written by `_pack_results`
+        rest: Per-result dicts of the other fields
+        
+    Returns:
+        Ablation result dicts
+    """
+    columns = {name: arrays[name].tolist() for name in _RESULT_COLUMNS}
+    matrix = arrays["sentence_deltas"]
+    matrix.flags.writeable = False
+    lengths = arrays["sentence_counts"].tolist()
+    
+    return [
+        {
+            **{name: values[row] for name, values in columns.items()},
+            "sentence_deltas": matrix[row, :lengths[row]],
+            **rest[row],
+        }
+        for row in range(len(rest))
+    ]
+
+
+def _json_result(result: Dict) -> Dict:
+    """Copy of a result dict with float32 row views turned into lists."""
+    deltas = result.get("sentence_deltas")
+    if isinstance(deltas, np.ndarray):
+        return {**result, "sentence_deltas": deltas.tolist()}
+    return dict(result)
+
+
 class RunManager:
-    """Manages persistence of attribution runs."""
+    """Manages persistence of attribution runs.
+    
+    Each run directory holds:
+    - header.json: prompt, messages, completion, segments and settings, written once
+    - snapshot.json: everything else as of the last compaction
+    - snapshot.<generation>.npz: the snapshot's results as typed columns
+      (span_id int32, delta_cos float32, elapsed_ms int32) and a float32
+      results x sentences matrix of per-sentence deltas
+    - results.<generation>.jsonl: results (and group ablation samples)
+      appended since that snapshot
     
-    def __init__(self, base_dir: Optional[str] = None):
+    Results are appended to the log as they are added, or in batches of
+    `flush_every`. `_save_run` compacts the log into a new snapshot, and
+    `get_run` replays header, snapshot and log.
+    Runs saved as a single run.json by older versions are still readable.
+    
+    An SQLite index (index.sqlite3 in the base directory) is updated on
+    every save, so runs can be listed and filtered without opening them.
+    """
+    
+    def __init__(
+        self,
+        base_dir: Optional[str] = None,
+        flush_every: Optional[int] = None,
+        flush_interval: float = 1.0,
+    ):
         """Initialize the run manager.
         
         Args:
             base_dir: Base directory for storing runs
+            flush_every: Number of buffered results that triggers a log append
+                (defaults to RUN_FLUSH_EVERY). With 1, every result is on disk
+                once it is added; larger batches write less often, but results
+                still buffered when the process is killed are lost
+            flush_interval: Seconds after which buffered results are appended
         """
         settings = get_settings()
         self.base_dir = Path(base_dir) if base_dir else Path("examples/runs")
+        self.flush_every = max(1, flush_every if flush_every is not None else settings.run_flush_every)
+        self.flush_interval = flush_interval
         os.makedirs(self.base_dir, exist_ok=True)
+        
+        # Per run ID: buffered log lines, last append time, log generation,
+        # and digest of the header on disk
+        self._pending: Dict[str, List[str]] = {}
+        self._last_flush: Dict[str, float] = {}
+        self._generations: Dict[str, int] = {}
+        self._header_digests: Dict[str, str] = {}
+        atexit.register(self.flush)
+        
+        # Index existing run directories the first time the index is created
+        self.index = RunIndex(str(self.base_dir / "index.sqlite3"))
+        if self.index.is_new:
+            self.rebuild_index()
     
-    def create_run(self, prompt: str, completion: str, segments: List[Span]) -> Run:
+    def create_run(
+        self,
+        prompt: str,
+        completion: str,
+        segments: List[Span],
+        messages: Optional[List[Dict[str, str]]] = None,
+    ) -> Run:
         """Create a new attribution run.
         
         Args:
-            prompt: The input prompt
+            prompt: The input prompt (ignored for chat runs)
             completion: The model's baseline completion
-            segments: List of prompt segments
+            segments: List of prompt segments (spans or span views)
+            messages: Messages of a chat prompt, attributed instead of `prompt`
             
         Returns:
             New Run object
         """
+        if messages:
+            layout = ChatPrompt(messages)
+            prompt, messages = layout.text, layout.messages
+        
         # Create run object
         run = Run(
             prompt=prompt,
+            messages=messages or [],
             completion=completion,
-            segments=[asdict(segment) for segment in segments],
+            segments=[
+                asdict(segment.materialize() if isinstance(segment, SpanView) else segment)
+                for segment in segments
+            ],
             settings={
                 "completion_model": get_settings().completion_model,
                 "embedding_model": get_settings().embedding_model,
@@ -132,10 +391,115 @@ class RunManager:
         Returns:
             Updated Run object
         """
-        run.ablation_results.append(asdict(result))
-        self._save_run(run)
+        result_dict = asdict(result)
+        # Round to the snapshot's float32 columns now, so a result reads the
+        # same whether it was replayed from the log or loaded from a snapshot
+        result_dict["delta_cos"] = float(np.float32(result_dict["delta_cos"]))
+        result_dict["sentence_deltas"] = np.asarray(result_dict["sentence_deltas"], dtype=np.float32).tolist()
+        run.ablation_results.append(result_dict)
+        
+        self._append_to_log(run.id, result_dict)
+        return run
+    
+    def add_group_sample(self, run: Run, sample: Dict) -> Run:
+        """Add the outcome of a group ablation's subset ablation to a run.
+        
+        Samples share the results log, so they are as durable as results.
+        
+        Args:
+            run: The run to update
+            sample: 'removed' span IDs, 'delta_cos' and 'sentence_deltas'
+            
+        Returns:
+            Updated Run object
+        """
+        run.group_samples.append(sample)
+        self._append_to_log(run.id, {"group_sample": sample})
         return run
     
+    def add_adaptive_sample(self, run: Run, sample: Dict) -> Run:
+        """Add one of the adaptive sampler's repeated ablations to a run.
+        
+        Args:
+            run: The run to update
+            sample: 'span_id', 'seed', 'delta_cos', 'sentence_deltas' and 'elapsed_ms'
+            
+        Returns:
+            Updated Run object
+        """
+        run.adaptive_samples.append(sample)
+        self._append_to_log(run.id, {"adaptive_sample": sample})
+        return run
+    
+    def _append_to_log(self, run_id: str, record: Dict) -> None:
+        """Buffer a log line, appending the buffer once it is due."""
+        pending = self._pending.setdefault(run_id, [])
+        pending.append(json.dumps(record, separators=(",", ":")) + "\n")
+        if (len(pending) >= self.flush_every
+                or time.monotonic() - self._last_flush.get(run_id, 0.0) >= self.flush_interval):
+            self.flush(run_id)
+    
+    def flush(self, run_id: Optional[str] = None) -> None:
+        """Append buffered results to the results log.
+        
+        Args:
+            run_id: Run to flush (defaults to all runs)
+        """
+        run_ids = [run_id] if run_id is not None else list(self._pending)
+        for rid in run_ids:
+            lines = self._pending.pop(rid, None)
+            self._last_flush[rid] = time.monotonic()
+            if not lines:
+                continue
+            
+            log_file = self._log_file(rid, self._get_generation(rid))
+            os.makedirs(log_file.parent, exist_ok=True)
+            with open(log_file, "a") as f:
+                f.write("".join(lines))
+    
+    def list_runs(self, limit: Optional[int] = None) -> List[RunSummary]:
+        """List indexed runs, newest first.
+        
+        Args:
+            limit: Maximum number of runs to return
+            
+        Returns:
+            Run summaries
+        """
+        return self.index.query(limit=limit)
+    
+    def query_runs(self, prompt: Optional[str] = None, **filters: Any) -> List[RunSummary]:
+        """Find indexed runs matching the given filters, newest first.
+        
+        Args:
+            prompt: Only runs of exactly this prompt text
+            **filters: Filters accepted by `RunIndex.query` (prompt_hash,
+                completion_model, embedding_model, status, since, until,
+                min_max_delta, limit, offset)
+            
+        Returns:
+            Matching run summaries
+        """
+        if prompt is not None:
+            filters["prompt_hash"] = prompt_hash(prompt)
+        return self.index.query(**filters)
+    
+    def rebuild_index(self) -> int:
+        """Re-index every run directory under the base directory.
+        
+        Returns:
+            Number of runs indexed
+        """
+        count = 0
+        for run_dir in sorted(self.base_dir.iterdir()):
+            if not run_dir.is_dir():
+                continue
+            run = self.get_run(run_dir.name)
+            if run is not None:
+                self.index.upsert(run)
+                count += 1
+        return count
+    
     def get_run(self, run_id: str) -> Optional[Run]:
         """Get a run by ID.
         
@@ -145,6 +509,63 @@ class RunManager:
         Returns:
             Run object if found, None otherwise
         """
+        run_dir = self.base_dir / run_id
+        header_file = run_dir / "header.json"
+        if not header_file.exists():
+            return self._get_legacy_run(run_id)
+        
+        # Make results buffered by this manager visible
+        self.flush(run_id)
+        
+        try:
+            with open(header_file, "r") as f:
+                header = json.load(f)
+            
+            snapshot = {}
+            snapshot_file = run_dir / "snapshot.json"
+            if snapshot_file.exists():
+                with open(snapshot_file, "r") as f:
+                    snapshot = json.load(f)
+            
+            generation = snapshot.pop("log_generation", 0)
+            data = {**snapshot, **header}
+            results = data.setdefault("ablation_results", [])
+            
+            columns = None
+            columns_file = self._columns_file(run_id, generation)
+            if columns_file.exists():
+                with np.load(columns_file) as npz:
+                    columns = {name: npz[name] for name in npz.files}
+                results = data["ablation_results"] = _unpack_results(columns, results)
+            
+            # Replay results appended since the snapshot
+            log_file = self._log_file(run_id, generation)
+            if log_file.exists():
+                group_samples = data.setdefault("group_samples", [])
+                adaptive_samples = data.setdefault("adaptive_samples", [])
+                with open(log_file, "r") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            # A torn last line from an interrupted append
+                            break
+                        if "group_sample" in record:
+                            group_samples.append(record["group_sample"])
+                        elif "adaptive_sample" in record:
+                            adaptive_samples.append(record["adaptive_sample"])
+                        else:
+                            results.append(record)
+            
+            self._generations[run_id] = generation
+            run = Run(**data)
+            run._columns = columns
+            return run
+        except Exception:
+            return None
+    
+    def _get_legacy_run(self, run_id: str) -> Optional[Run]:
+        """Load a run saved as a single run.json file."""
         run_file = self.base_dir / run_id / "run.json"
         if not run_file.exists():
             return None
@@ -152,21 +573,91 @@ class RunManager:
         try:
             with open(run_file, "r") as f:
                 data = json.load(f)
-                return Run(**data)
+            # Older runs were only saved once finished
+            data.setdefault("status", "completed")
+            return Run(**data)
         except Exception:
             return None
     
+    def _log_file(self, run_id: str, generation: int) -> Path:
+        """Path of a run's results log for a snapshot generation."""
+        return self.base_dir / run_id / f"results.{generation}.jsonl"
+    
+    def _columns_file(self, run_id: str, generation: int) -> Path:
+        """Path of the typed result columns of a snapshot generation."""
+        return self.base_dir / run_id / f"snapshot.{generation}.npz"
+    
+    def _get_generation(self, run_id: str) -> int:
+        """Return the log generation of a run, reading its snapshot if needed."""
+        if run_id not in self._generations:
+            generation = 0
+            snapshot_file = self.base_dir / run_id / "snapshot.json"
+            if snapshot_file.exists():
+                try:
+                    with open(snapshot_file, "r") as f:
+                        generation = json.load(f).get("log_generation", 0)
+                except (OSError, ValueError):
+                    pass
+            self._generations[run_id] = generation
+        
+        return self._generations[run_id]
+    
+    def _write_atomic(self, path: Path, content: str) -> None:
+        """Write a file via a temporary file so readers never see partial content."""
+        temp_file = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        with open(temp_file, "w") as f:
+            f.write(content)
+        temp_file.replace(path)
+    
     def _save_run(self, run: Run) -> None:
-        """Save a run to disk.
+        """Save a run to disk, compacting its results log into a snapshot.
+        
+        The header is only rewritten if it changed. The new snapshot points
+        at a fresh log generation, so a crash between writing it and
+        deleting the old log never replays results twice.
         
         Args:
             run: Run to save
         """
         run_dir = self.base_dir / run.id
-        run_file = run_dir / "run.json"
         
         # Ensure the run directory exists
         os.makedirs(run_dir, exist_ok=True)
         
-        with open(run_file, "w") as f:
-            json.dump(run.to_dict(), f, indent=2) 
\ No newline at end of file
+        data = {f.name: getattr(run, f.name) for f in fields(run)}
+        
+        header = json.dumps({key: data.pop(key) for key in _HEADER_FIELDS}, separators=(",", ":"))
+        digest = hashlib.sha256(header.encode()).hexdigest()
+        header_file = run_dir / "header.json"
+        if self._header_digests.get(run.id) != digest or not header_file.exists():
+            self._write_atomic(header_file, header)
+            self._header_digests[run.id] = digest
+        
+        # Buffered results are already part of the run being snapshotted
+        self._pending.pop(run.id, None)
+        self._last_flush[run.id] = time.monotonic()
+        old_generation = self._get_generation(run.id)
+        generation = old_generation + 1
+        data["log_generation"] = generation
+        
+        # Results go to the typed sidecar; only their other fields stay in JSON
+        arrays, data["ablation_results"] = _pack_results(run.ablation_results)
+        columns_file = self._columns_file(run.id, generation)
+        temp_file = columns_file.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        with open(temp_file, "wb") as f:
+            np.savez(f, **arrays)
+        temp_file.replace(columns_file)
+        
+        self._write_atomic(run_dir / "snapshot.json", json.dumps(data, separators=(",", ":")))
+        self._generations[run.id] = generation
+        
+        stale_files = (
+            self._log_file(run.id, old_generation),
+            self._columns_file(run.id, old_generation),
+            run_dir / "run.json",
+        )
+        for stale in stale_files:
+            if stale.exists():
+                stale.unlink()
+        
+        self.index.upsert(run) 
\ No newline at end of file
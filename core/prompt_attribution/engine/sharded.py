@@ -0,0 +1,273 @@
+"""Batch attribution sharded across worker processes."""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from ..datasets import PromptCase
+from ..segmenter import flush_segmentation_cache
+from ..settings import get_settings
+from .ablation_engine import install_signal_handlers, remove_signal_handlers
+from .batch import BatchAttributor, BatchResult
+from .llm_wrapper import LLMWrapper
+from .run_manager import RunManager
+
+
+@dataclass
+class WorkerStats:
+    """Throughput of one worker process.
+
+    Attributes:
+        worker: Shard index
+        pid: Process ID of the worker
+        cases: Prompts assigned to the worker
+        completed: Prompts whose runs completed
+        segments: Ablation results produced
+        api_calls: Completion and embedding requests sent
+        elapsed_s: Wall time spent on the shard
+        cpu_s: CPU time spent on the shard
+    """
+
+    worker: int
+    pid: int
+    cases: int
+    completed: int
+    segments: int
+    api_calls: int
+    elapsed_s: float
+    cpu_s: float
+
+    @property
+    def segments_per_sec(self) -> float:
+        """Ablation results produced per second of wall time."""
+        return self.segments / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+
+def shard_cases(cases: List[PromptCase], shards: int) -> List[List[PromptCase]]:
+    """Split prompt cases into shards of similar total prompt length.
+
+    Longest prompts are placed first, each into the currently lightest
+    shard, since the work of a run grows with the length of its prompt.
+
+    Args:
+        cases: Prompt cases to split
+        shards: Number of shards
+
+    Returns:
+        Non-empty shards, each in the original order of its cases
+    """
+    buckets: List[List[int]] = [[] for _ in range(max(1, shards))]
+    loads = [0] * len(buckets)
+
+    for index in sorted(range(len(cases)), key=lambda i: len(cases[i].text), reverse=True):
+        lightest = loads.index(min(loads))
+        buckets[lightest].append(index)
+        loads[lightest] += len(cases[index].text)
+
+    return [[cases[i] for i in sorted(bucket)] for bucket in buckets if bucket]
+
+
+def _run_shard(
+    worker: int,
+    cases: List[PromptCase],
+    runs_dir: str,
+    options: Dict[str, Any],
+    settings_overrides: Dict[str, Any],
+) -> Tuple[List[Tuple[BatchResult, Optional[str]]], WorkerStats]:
+    """Attribute one shard in a worker process with its own event loop.
+
+    Args:
+        worker: Shard index
+        cases: Prompt cases of the shard
+        runs_dir: Runs directory shared by all workers
+        options: Keyword arguments for `BatchAttributor`
+        settings_overrides: Settings replaced in this worker (its share of the rate limits)
+
+    Returns:
+        Results without their runs paired with the run IDs, and worker stats
+    """
+    settings = get_settings()
+    for name, value in settings_overrides.items():
+        setattr(settings, name, value)
+
+    return asyncio.run(_run_shard_async(worker, cases, runs_dir, options))
+
+
+async def _run_shard_async(
+    worker: int,
+    cases: List[PromptCase],
+    runs_dir: str,
+    options: Dict[str, Any],
+) -> Tuple[List[Tuple[BatchResult, Optional[str]]], WorkerStats]:
+    """Event-loop half of `_run_shard`."""
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+
+    llm = LLMWrapper()
+    run_manager = RunManager(runs_dir)
+    attributor = BatchAttributor(llm=llm, run_manager=run_manager, **options)
+
+    results: List[Tuple[BatchResult, Optional[str]]] = []
+    segments = 0
+    try:
+        async for result in attributor.stream(cases):
+            run_id = None
+            if result.run is not None:
+                run_id = result.run.id
+                segments += len(result.run.ablation_results)
+            # Runs are read back from the shared store rather than pickled
+            results.append((replace(result, run=None), run_id))
+    finally:
+        # Worker processes exit without running atexit handlers
+        run_manager.flush()
+        if llm.cache is not None:
+            llm.cache.flush()
+        flush_segmentation_cache()
+
+    llm_stats = llm.get_stats()
+    stats = WorkerStats(
+        worker=worker,
+        pid=os.getpid(),
+        cases=len(cases),
+        completed=sum(1 for result, _ in results if result.status == "completed"),
+        segments=segments,
+        api_calls=llm_stats["completion_requests"] + llm_stats["embedding_requests"],
+        elapsed_s=time.perf_counter() - start,
+        cpu_s=time.process_time() - cpu_start,
+    )
+    return results, stats
+
+
+class ShardedBatchAttributor:
+    """Attributes a batch of prompts across several worker processes.
+
+    Each worker runs a `BatchAttributor` on its shard with its own event
+    loop and `LLMWrapper`, so CPU-bound work (cache decoding, cosine
+    similarity, run serialization) uses every core. Workers share the
+    on-disk cache and write their runs into one runs directory, whose run
+    index merges them. Concurrency, rate limits and the cost budget are
+    divided between the workers.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        runs_dir: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        max_cost: Optional[float] = None,
+        max_active_runs: int = 4,
+        hierarchical: bool = False,
+        early_stop: bool = True,
+    ):
+        """Initialize the sharded attributor.
+
+        Args:
+            workers: Number of worker processes (defaults to the CPU count)
+            runs_dir: Directory for the runs (defaults to examples/runs)
+            max_concurrency: Requests in flight across all workers
+            max_cost: Total projected cost allowed for the batch (defaults to MAX_BATCH_COST)
+            max_active_runs: Prompts attributed at the same time by each worker
+            hierarchical: Whether to use the hierarchical engine
+            early_stop: Whether to enable early stopping
+        """
+        settings = get_settings()
+        self.workers = workers or os.cpu_count() or 1
+        # Opening the store here creates the run index before workers share it
+        self.run_manager = RunManager(runs_dir)
+        self.max_concurrency = max_concurrency or settings.max_concurrent_requests
+        self.max_cost = max_cost if max_cost is not None else settings.max_batch_cost
+        self.max_active_runs = max_active_runs
+        self.hierarchical = hierarchical
+        self.early_stop = early_stop
+
+    async def run(
+        self, prompts: Iterable[Union[str, PromptCase]]
+    ) -> Tuple[List[BatchResult], List[WorkerStats]]:
+        """Attribute all prompts and merge the shards' results.
+
+        SIGINT/SIGTERM are forwarded to the workers, which checkpoint their
+        active runs (see `AblationEngine.resume`).
+
+        Args:
+            prompts: Prompt texts or prompt cases
+
+        Returns:
+            Results in shard completion order, and per-worker stats
+        """
+        cases = [
+            prompt if isinstance(prompt, PromptCase) else PromptCase(id=f"prompt-{i}", style="", text=prompt)
+            for i, prompt in enumerate(prompts)
+        ]
+        shards = shard_cases(cases, self.workers)
+        if not shards:
+            return [], []
+
+        total_length = sum(len(case.text) for case in cases) or 1
+        worker_settings = self._worker_settings(len(shards))
+        loop = asyncio.get_running_loop()
+
+        # Spawned workers do not inherit open database connections or event loops
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=len(shards), mp_context=context) as executor:
+            futures = []
+            for worker, shard in enumerate(shards):
+                share = sum(len(case.text) for case in shard) / total_length
+                options = dict(
+                    max_concurrency=max(1, self.max_concurrency // len(shards)),
+                    max_cost=self.max_cost * share,
+                    max_active_runs=self.max_active_runs,
+                    hierarchical=self.hierarchical,
+                    early_stop=self.early_stop,
+                )
+                futures.append(loop.run_in_executor(
+                    executor, _run_shard, worker, shard, str(self.run_manager.base_dir), options, worker_settings
+                ))
+
+            def on_signal(signum: int) -> None:
+                for process in multiprocessing.active_children():
+                    os.kill(process.pid, signum)
+
+            installed_signals = install_signal_handlers(on_signal)
+            try:
+                shard_outputs = []
+                for next_output in asyncio.as_completed(futures):
+                    shard_outputs.append(await next_output)
+            finally:
+                remove_signal_handlers(installed_signals)
+
+        results: List[BatchResult] = []
+        worker_stats: List[WorkerStats] = []
+        for shard_results, stats in shard_outputs:
+            for result, run_id in shard_results:
+                run = self.run_manager.get_run(run_id) if run_id else None
+                results.append(replace(result, run=run))
+            worker_stats.append(stats)
+
+        worker_stats.sort(key=lambda stats: stats.worker)
+        return results, worker_stats
+
+    def _worker_settings(self, shards: int) -> Dict[str, Any]:
+        """Settings replaced in each worker: its share of the concurrency and rate limits.
+
+        Args:
+            shards: Number of workers sharing the limits
+
+        Returns:
+            Setting names and values
+        """
+        settings = get_settings()
+
+        def share(limit: int) -> int:
+            # 0 (learn the budget from response headers) stays 0
+            return max(1, limit // shards) if limit else 0
+
+        return dict(
+            max_concurrent_requests=max(1, self.max_concurrency // shards),
+            max_adaptive_concurrency=share(settings.max_adaptive_concurrency),
+            rate_limit_rpm=share(settings.rate_limit_rpm),
+            rate_limit_tpm=share(settings.rate_limit_tpm),
+        )
@@ -10,6 +10,8 @@ from typing import Dict, List, Optional, Any, Tuple
 import logging
 import json
 
+import numpy as np
+
 from .engine.llm_wrapper import LLMWrapper
 from .settings import get_settings
 
@@ -177,14 +179,14 @@ def format_matrix_snippet(matrix, span_id: int, sentence_idx: int) -> str:
     """Format a small section of the influence matrix around the point of interest.
     
     Args:
-        matrix: 2D list of influence values
+        matrix: 2D array of influence values
         span_id: The span ID to center on
         sentence_idx: The sentence index to center on
         
     Returns:
         ASCII art representation of the matrix snippet
     """
-    if not matrix or not matrix[0]:
+    if len(matrix) == 0 or len(matrix[0]) == 0:
         return ""
     
     # Get matrix dimensions
@@ -217,14 +219,14 @@ def format_full_matrix_json(matrix, segments, sentences) -> str:
     """Format the full influence matrix as JSON.
     
     Args:
-        matrix: 2D list of influence values
+        matrix: 2D array of influence values
         segments: List of prompt segments
         sentences: List of response sentences
         
     Returns:
         JSON string representation of the matrix with segment and sentence info
     """
-    if not matrix or not matrix[0]:
+    if len(matrix) == 0 or len(matrix[0]) == 0:
         return "{}"
     
     matrix_data = {
@@ -256,12 +258,12 @@ def format_full_matrix_json(matrix, segments, sentences) -> str:
         })
     
     # Add matrix values
-    for i in range(len(matrix)):
-        for j in range(len(matrix[0])):
+    for i, row in enumerate(np.asarray(matrix).tolist()):
+        for j, value in enumerate(row):
             matrix_data["values"].append({
                 "segment_id": i,
                 "sentence_id": j,
-                "value": matrix[i][j]
+                "value": value
             })
     
     return json.dumps(matrix_data, indent=2)
@@ -332,17 +334,7 @@ async def generate_rewrites_for_run(
     
     # Build influence matrix if we have the data
     if hasattr(run, "ablation_results") and run.ablation_results:
-        # Build matrix from ablation results
-        num_spans = len(run.segments)
-        num_sentences = len(sentences)
-        matrix = [[0.0 for _ in range(num_sentences)] for _ in range(num_spans)]
-        
-        for result in run.ablation_results:
-            sid = result["span_id"]
-            deltas = result.get("sentence_deltas", [])
-            for j, d in enumerate(deltas):
-                if j < num_sentences and sid < num_spans:
-                    matrix[sid][j] = d
+        matrix = run.influence_matrix(len(sentences))
         
         # Format matrix snippet
         matrix_snippet = format_matrix_snippet(matrix, primary_span_id, sentence_idx)
@@ -376,7 +368,7 @@ async def generate_rewrites_for_run(
                     secondary_influences.append({
                         "span_id": result["span_id"],
                         "delta_cos": result["delta_cos"],
-                        "sentence_delta": result["sentence_deltas"][sentence_idx]
+                        "sentence_delta": float(result["sentence_deltas"][sentence_idx])
                     })
         
         # Sort by sentence-specific delta if available, otherwise by overall delta
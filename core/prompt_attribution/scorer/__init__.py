@@ -1,5 +1,6 @@
 """Scorer components for prompt attribution."""
 
 from .scorer import Scorer
+from .alignment import SentenceAlignment, align_sentences
 
-__all__ = ["Scorer"] 
\ No newline at end of file
+__all__ = ["Scorer", "SentenceAlignment", "align_sentences"] 
\ No newline at end of file
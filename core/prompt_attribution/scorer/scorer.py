@@ -65,9 +65,6 @@ class Scorer:
         # 0.0 means identical (no impact)
         distance = (1.0 - similarity)
         
-        # Update cumulative impact
-        self.cumulative_impact += distance
-        
         return distance
     
     def _cosine_similarity(self, a: List[float], b: List[float]) -> float:
@@ -92,6 +89,47 @@ class Scorer:
         
         return dot_product / (norm_a * norm_b)
     
+    def normalize_embeddings(self, embeddings: List[List[float]]) -> np.ndarray:
+        """Stack embeddings into a float32 matrix with unit-length rows.
+        
+        Dot products between rows of normalized matrices are cosine
+        similarities. Zero vectors stay zero, giving a similarity of 0.
+        
+        Args:
+            embeddings: Embedding vectors of equal length
+            
+        Returns:
+            Matrix of shape (len(embeddings), dimensions); for no embeddings,
+            an empty matrix as wide as the baseline embedding (if known)
+        """
+        if len(embeddings) == 0:
+            dimensions = len(self._baseline_embedding) if self._baseline_embedding is not None else 0
+            return np.zeros((0, dimensions), dtype=np.float32)
+        
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim != 2:
+            return matrix.reshape(len(embeddings), -1)
+        
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+    
+    def reset_impact(self, impact: float = 0.0) -> None:
+        """Restart cumulative impact tracking, e.g. for a new set of segments.
+        
+        Args:
+            impact: Impact already accumulated by earlier results
+        """
+        self.cumulative_impact = impact
+    
+    def record_impact(self, delta: float) -> None:
+        """Add the impact of a committed ablation result.
+        
+        Args:
+            delta: The result's normalized distance (0-1)
+        """
+        self.cumulative_impact += delta
+    
     def should_early_stop(self) -> bool:
         """Check if early stopping threshold has been reached.
         
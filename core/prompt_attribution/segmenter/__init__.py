@@ -1,6 +1,10 @@
 """Prompt segmentation module."""
 
-from .segmenter import Segmenter, Span
+from .segmenter import Segmenter, Span, SpanView
+from .cache import cached_bounds, clear_segmentation_cache, flush_segmentation_cache, segmentation_cache_stats
 from .hierarchical import HierarchicalSegmenter
+from .messages import ChatPrompt
+from .structural import Section, StructuralSegmenter
+from .tokenizer import BPETokenizer, TokenizedText, get_tokenizer
 
-__all__ = ["Segmenter", "Span", "HierarchicalSegmenter"] 
\ No newline at end of file
+__all__ = ["Segmenter", "Span", "SpanView", "HierarchicalSegmenter", "ChatPrompt", "Section", "StructuralSegmenter", "BPETokenizer", "TokenizedText", "get_tokenizer", "cached_bounds", "clear_segmentation_cache", "flush_segmentation_cache", "segmentation_cache_stats"] 
\ No newline at end of file
@@ -0,0 +1,112 @@
+"""Content-addressed segmentation cache shared by all segmenters of a process."""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional, Sequence, Tuple
+
+# Segment bounds of a text: (start, end) of each segment
+Bounds = Tuple[Tuple[int, int], ...]
+
+# Segmentations kept per process, keyed by segmenter config and text hash
+_SEGMENTATION_CACHE_SIZE = 256
+
+# Bumped when segmentation rules change, so persisted entries are not reused
+_FORMAT_VERSION = 1
+
+_segmentations: "OrderedDict[Tuple[str, str], Bounds]" = OrderedDict()
+_lock = threading.Lock()
+_store = None
+_store_opened = False
+_stats = {"hits": 0, "misses": 0, "store_hits": 0}
+
+
+def _get_store():
+    """Open the persistent segmentation store once, if SEGMENT_CACHE_PERSIST is enabled."""
+    global _store, _store_opened
+    if _store_opened:
+        return _store
+    _store_opened = True
+
+    # Import here to avoid circular imports
+    from ..settings import get_settings
+    settings = get_settings()
+    if settings.segment_cache_persist and settings.cache_dir:
+        from ..engine.cache import SQLiteCache
+        _store = SQLiteCache(str(Path(settings.cache_dir) / "segments.sqlite3"))
+    return _store
+
+
+def cached_bounds(
+    text: str,
+    config: str,
+    compute: Callable[[str], Sequence[Tuple[int, int]]],
+) -> Bounds:
+    """Get the segment bounds of a text, computing them only on a cache miss.
+
+    Entries are shared by every segmenter with the same configuration, and
+    with other processes through the persistent store when enabled.
+
+    Args:
+        text: Text to segment
+        config: Key of everything besides the text that determines the segments
+        compute: Segments the text on a miss
+
+    Returns:
+        Immutable (start, end) of each segment
+    """
+    digest = hashlib.sha256(text.encode()).hexdigest()
+    key = (config, digest)
+    with _lock:
+        cached = _segmentations.get(key)
+        if cached is not None:
+            _segmentations.move_to_end(key)
+            _stats["hits"] += 1
+            return cached
+
+    store = _get_store()
+    store_key = f"segments:v{_FORMAT_VERSION}:{config}:{digest}"
+    bounds: Optional[Bounds] = None
+    if store is not None:
+        value = store.get(store_key)
+        if value is not None:
+            bounds = tuple((start, end) for start, end in json.loads(value))
+            _stats["store_hits"] += 1
+
+    if bounds is None:
+        bounds = tuple((start, end) for start, end in compute(text))
+        _stats["misses"] += 1
+        if store is not None:
+            store.set(store_key, json.dumps(bounds, separators=(",", ":")))
+
+    with _lock:
+        _segmentations[key] = bounds
+        if len(_segmentations) > _SEGMENTATION_CACHE_SIZE:
+            _segmentations.popitem(last=False)
+    return bounds
+
+
+def flush_segmentation_cache() -> None:
+    """Write buffered entries to the persistent store, if one is open.
+
+    Worker processes exit without running atexit handlers, so they call
+    this before returning.
+    """
+    if _store is not None:
+        _store.flush()
+
+
+def clear_segmentation_cache() -> None:
+    """Drop the in-process entries (the persistent store is kept)."""
+    with _lock:
+        _segmentations.clear()
+        for name in _stats:
+            _stats[name] = 0
+
+
+def segmentation_cache_stats() -> dict:
+    """Hits, misses and persistent-store hits since the cache was last cleared."""
+    with _lock:
+        return {**_stats, "entries": len(_segmentations)}
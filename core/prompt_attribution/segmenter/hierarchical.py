@@ -1,12 +1,16 @@
 """Hierarchical segmentation for efficient prompt attribution."""
 
-import hashlib
+import re
+from dataclasses import replace
 from typing import Dict, List, Optional, Set, Tuple, Any
-from functools import lru_cache
 
 from .segmenter import Segmenter, Span
 
 
+# A sentence and its trailing whitespace
+_SENTENCE_PATTERN = re.compile(r"\S.*?(?:[.!?](?=\s|$)|$)\s*", re.DOTALL)
+
+
 class HierarchicalSegmenter:
     """Two-pass segmentation for efficient prompt attribution.
     
@@ -15,6 +19,14 @@ class HierarchicalSegmenter:
     
     This approach dramatically reduces the number of API calls needed while
     still providing high-resolution attribution for the most important sections.
+    
+    When the base segmenter has a structural segmenter, the levels of the
+    prompt's section tree are used as the passes: top-level sections first,
+    then the sections nested in the highest-impact one.
+    
+    Segmentations come from the base segmenter's process-wide cache, so
+    hierarchical segmenters and engines with the same configuration share
+    them; the returned spans are immutable and never adjusted in place.
     """
     
     def __init__(
@@ -30,37 +42,23 @@ class HierarchicalSegmenter:
             base_segmenter: Base segmenter to use (creates new one if None)
             coarse_segment_ratio: Target size of coarse segments as ratio of total prompt
             fine_segment_ratio: Target size of fine segments as ratio of total prompt
-            cache_size: Size of the segmenter's LRU cache
+            cache_size: Unused; segmentations are cached per process by the
+                segmentation cache (kept for compatibility)
         """
         self.base_segmenter = base_segmenter or Segmenter()
         self.coarse_ratio = coarse_segment_ratio
         self.fine_ratio = fine_segment_ratio
-        self._segment_cache = {}
-        
-        # Enable memoization
-        self.segment_with_cache = lru_cache(maxsize=cache_size)(self._segment_uncached)
-    
-    def _get_cache_key(self, text: str) -> str:
-        """Generate a cache key for the given text.
-        
-        Args:
-            text: Text to hash
-            
-        Returns:
-            Cache key string
-        """
-        return hashlib.sha256(text.encode()).hexdigest()
     
-    def _segment_uncached(self, text: str) -> List[Span]:
-        """Segment the text without using the cache.
+    def segment_with_cache(self, text: str) -> Tuple[Span, ...]:
+        """Segment the text, reusing the cached segmentation of an identical text.
         
         Args:
             text: Text to segment
             
         Returns:
-            List of spans
+            Immutable tuple of spans
         """
-        return self.base_segmenter.segment(text)
+        return tuple(self.base_segmenter.segment(text))
     
     def segment_first_pass(self, prompt: str) -> List[Span]:
         """Perform first-pass segmentation with coarse chunks.
@@ -76,7 +74,12 @@ class HierarchicalSegmenter:
         
         # If we have very few segments, just return them
         if len(segments) <= 5:
-            return segments
+            return list(segments)
+        
+        # The top level of the prompt's section tree is the coarse pass as is
+        structural = self.base_segmenter.structural
+        if structural is not None and structural.sections(prompt):
+            return list(segments)
         
         # If we have too many segments, create coarser segments
         target_segment_count = max(5, int(len(segments) * self.coarse_ratio))
@@ -123,6 +126,16 @@ class HierarchicalSegmenter:
         # Extract the high-impact region
         region_text = high_impact_span.text
         
+        # The sections nested in a section of the prompt are the fine pass
+        structural = self.base_segmenter.structural
+        if structural is not None:
+            sections = structural.subsections(prompt, high_impact_span.start, high_impact_span.end)
+            if sections:
+                return [
+                    Span(start=section.start, end=section.end, text=prompt[section.start:section.end], id=i)
+                    for i, section in enumerate(sections)
+                ]
+        
         # Find any original segments contained within this region
         contained_segments = [
             s for s in original_segments 
@@ -137,62 +150,92 @@ class HierarchicalSegmenter:
         # Use natural segmentation first
         segments = self.segment_with_cache(region_text)
         
-        # Adjust segment positions to account for the offset
+        # Shift copies of the cached segments to their position in the prompt
         offset = high_impact_span.start
-        for segment in segments:
-            segment.start += offset
-            segment.end += offset
+        segments = [
+            replace(segment, start=segment.start + offset, end=segment.end + offset)
+            for segment in segments
+        ]
         
         # If still too few segments, use sliding window with finer granularity
         if len(segments) <= 3:
             # Create a temporary segmenter with smaller window size
             fine_segmenter = Segmenter(
                 window_size=20,  # Smaller window size for finer granularity
-                window_overlap=5
+                window_overlap=5,
+                window_unit=self.base_segmenter.window_unit,
+                tokenizer=self.base_segmenter.tokenizer
+            )
+            # Token windows reuse the whole prompt's tokenization
+            segments = fine_segmenter.segment_region(
+                prompt, high_impact_span.start, high_impact_span.end
             )
-            segments = fine_segmenter.segment(region_text)
-            
-            # Adjust segment positions
-            for segment in segments:
-                segment.start += offset
-                segment.end += offset
-                segment.id = None  # Will be assigned later
         
         # Assign new IDs
-        for i, segment in enumerate(segments):
-            segment.id = i
-        
-        return segments
+        return [replace(segment, id=i) for i, segment in enumerate(segments)]
     
-    def combine_results(
+    def split_span(
         self,
-        first_pass_results: List[Dict],
-        second_pass_results: List[Dict],
-        all_segments: List[Span]
-    ) -> List[Dict]:
-        """Combine results from both passes into unified results.
+        prompt: str,
+        span: Span,
+        original_segments: List[Span],
+        min_span_chars: int = 0,
+    ) -> List[Span]:
+        """Split a span into smaller child spans for recursive refinement.
+        
+        Tries, in order: the original segments inside the span, natural
+        segmentation of the span's text, its sentences, and finally two
+        halves split at whitespace. Children carry the span as their parent
+        and are one level deeper; IDs are left for the caller to assign.
         
         Args:
-            first_pass_results: Results from first pass
-            second_pass_results: Results from second pass
-            all_segments: All segments (first pass + second pass refined segments)
+            prompt: The full prompt text
+            span: The span to split
+            original_segments: Segments of the whole prompt
+            min_span_chars: Spans no longer than this are not split
             
         Returns:
-            Combined attribution results
+            Two or more strictly smaller child spans, or an empty list if the
+            span is too small or cannot be split
         """
-        # Start with first pass results
-        combined = first_pass_results.copy()
+        length = span.end - span.start
+        if length <= max(1, min_span_chars):
+            return []
         
-        # Add second pass results, mapping segment IDs to the correct range
-        segment_ids = [s.id for s in all_segments]
-        max_id = max(segment_ids) if segment_ids else 0
+        def children_of(bounds: List[Tuple[int, int]]) -> List[Span]:
+            # Drop empty pieces and pieces that cover the whole span
+            bounds = [(start, end) for start, end in bounds
+                      if prompt[start:end].strip() and end - start < length]
+            if len(bounds) < 2:
+                return []
+            return [
+                Span(start=start, end=end, text=prompt[start:end],
+                     parent_id=span.id, depth=span.depth + 1)
+                for start, end in bounds
+            ]
         
-        for result in second_pass_results:
-            result_copy = result.copy()
-            result_copy["span_id"] = result_copy["span_id"] + max_id + 1
-            combined.append(result_copy)
+        candidates = [
+            # Original segments contained in the span
+            lambda: [(s.start, s.end) for s in original_segments
+                     if s.start >= span.start and s.end <= span.end],
+            # Natural segmentation of the span's own text, with token
+            # windows taken from the whole prompt's tokenization
+            lambda: [(s.start, s.end)
+                     for s in self.base_segmenter.segment_region(prompt, span.start, span.end)],
+            # Sentences
+            lambda: [(span.start + m.start(), span.start + m.end())
+                     for m in _SENTENCE_PATTERN.finditer(span.text)],
+        ]
+        for candidate in candidates:
+            children = children_of(candidate())
+            if children:
+                return children
         
-        return combined
+        # Halves, split at the whitespace closest to the middle
+        middle = span.start + length // 2
+        whitespace = [i for i in range(span.start + 1, span.end) if prompt[i].isspace()]
+        cut = min(whitespace, key=lambda i: abs(i - middle)) if whitespace else middle
+        return children_of([(span.start, cut), (cut, span.end)])
     
     def get_first_pass_high_impact(
         self,
@@ -0,0 +1,103 @@
+"""Chat prompts laid out as one text for segmentation and ablation."""
+
+from bisect import bisect_right
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Separates the turns of a chat prompt's text
+_TURN_SEPARATOR = "\n\n"
+
+
+class ChatPrompt:
+    """A list of chat messages laid out as one text.
+
+    Each message is written as "Role: content", and turns are separated by
+    a blank line, so a chat prompt can be segmented, refined and displayed
+    like a plain prompt (the role headers also start sections for
+    structural segmentation). Offsets into `text` map back to a message
+    and an offset in its content, and ablated spans are removed from the
+    messages' contents rather than from the text, so the role of every
+    turn is kept.
+    """
+
+    def __init__(self, messages: Sequence[Dict[str, str]]):
+        """Lay out the messages.
+
+        Args:
+            messages: Message dictionaries with 'role' and 'content'
+        """
+        self.messages = [{"role": m["role"], "content": m.get("content") or ""} for m in messages]
+
+        parts: List[str] = []
+        # Per message: (start of its turn, start of its content, end of its content)
+        self.regions: List[Tuple[int, int, int]] = []
+        position = 0
+        for index, message in enumerate(self.messages):
+            if index:
+                parts.append(_TURN_SEPARATOR)
+                position += len(_TURN_SEPARATOR)
+            header = f"{message['role'].capitalize()}: "
+            parts.extend((header, message["content"]))
+            content_start = position + len(header)
+            position = content_start + len(message["content"])
+            self.regions.append((content_start - len(header), content_start, position))
+        self.text = "".join(parts)
+        self._turn_starts = [turn_start for turn_start, _, _ in self.regions]
+
+    def message_at(self, offset: int) -> int:
+        """Index of the message whose turn contains an offset of the text."""
+        return max(0, bisect_right(self._turn_starts, offset) - 1)
+
+    def locate(self, start: int, end: int) -> Tuple[Optional[int], Optional[int]]:
+        """Message coordinates of a span of the text.
+
+        Args:
+            start: Start of the span in the text
+            end: End of the span in the text
+
+        Returns:
+            (message index, offset in the message's content), or
+            (None, None) if the span crosses turns or the text is empty
+        """
+        if not self.messages:
+            return None, None
+        index = self.message_at(start)
+        _, content_start, content_end = self.regions[index]
+        if end > content_end + len(_TURN_SEPARATOR):
+            return None, None
+        return index, max(0, start - content_start)
+
+    def turn_bounds(self) -> List[Tuple[int, int]]:
+        """(start, end) of each turn in the text, covering it without gaps."""
+        ends = self._turn_starts[1:] + [len(self.text)]
+        return list(zip(self._turn_starts, ends))
+
+    def without(self, spans: Sequence) -> List[Dict[str, str]]:
+        """Rebuild the messages with spans of the text removed from their contents.
+
+        Spans may cross turns; each message loses the part of its content
+        they cover. Messages left empty are dropped, except that at least
+        one message is always returned.
+
+        Args:
+            spans: Spans with `start` and `end` offsets into the text
+
+        Returns:
+            Message dictionaries with 'role' and 'content'
+        """
+        removed = sorted((span.start, span.end) for span in spans)
+        messages = []
+        for message, (_, content_start, content_end) in zip(self.messages, self.regions):
+            parts = []
+            position = content_start
+            for start, end in removed:
+                if end <= position or start >= content_end:
+                    continue
+                parts.append(self.text[position:max(position, start)])
+                position = min(max(position, end), content_end)
+            parts.append(self.text[position:content_end])
+            content = "".join(parts)
+            if content:
+                messages.append({"role": message["role"], "content": content})
+        if not messages and self.messages:
+            messages.append({"role": self.messages[0]["role"], "content": ""})
+        return messages
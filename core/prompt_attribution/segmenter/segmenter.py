@@ -1,34 +1,143 @@
 """Segmenter for breaking prompts into analyzable chunks."""
 
 import re
+from bisect import bisect_right
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
+import numpy as np
 
-@dataclass
+from ..settings import get_settings
+from .cache import cached_bounds
+from .messages import ChatPrompt
+from .structural import StructuralSegmenter
+from .tokenizer import BPETokenizer, TokenizedText, get_tokenizer
+
+
+@dataclass(frozen=True)
 class Span:
-    """A segment of text with start and end indices."""
+    """A segment of text with start and end indices.
+    
+    Spans are immutable, since cached segmentations are shared; use
+    `dataclasses.replace` to derive a renumbered or shifted span.
+    """
     
     start: int
     end: int
     text: str
     id: Optional[int] = None
+    # Recursive refinement: ID of the span this one was split from, and its level
+    parent_id: Optional[int] = None
+    depth: int = 0
+    # Chat prompts: the message the span lies in, and its offset in the message's content
+    message_index: Optional[int] = None
+    message_offset: Optional[int] = None
+
+
+class SpanView:
+    """A segment stored as offsets into its source text.
+    
+    Has the same attributes as `Span`, but `text` is sliced from the source
+    only when it is read, so segmenting a large prompt does not copy it.
+    Use `materialize` to get a `Span`.
+    """
+    
+    __slots__ = ("source", "start", "end", "id", "parent_id", "depth", "message_index", "message_offset")
+    
+    def __init__(
+        self,
+        source: str,
+        start: int,
+        end: int,
+        id: Optional[int] = None,
+        parent_id: Optional[int] = None,
+        depth: int = 0,
+        message_index: Optional[int] = None,
+        message_offset: Optional[int] = None,
+    ):
+        self.source = source
+        self.start = start
+        self.end = end
+        self.id = id
+        self.parent_id = parent_id
+        self.depth = depth
+        self.message_index = message_index
+        self.message_offset = message_offset
+    
+    @property
+    def text(self) -> str:
+        return self.source[self.start:self.end]
+    
+    def materialize(self) -> Span:
+        """Return the segment as a `Span` with its text copied."""
+        return Span(start=self.start, end=self.end, text=self.text,
+                    id=self.id, parent_id=self.parent_id, depth=self.depth,
+                    message_index=self.message_index, message_offset=self.message_offset)
+    
+    def __repr__(self) -> str:
+        return f"SpanView(start={self.start}, end={self.end}, id={self.id})"
+
+
+def break_offsets(text: str) -> Sequence[int]:
+    """Find every natural window break in one pass.
+    
+    A break is a period followed by a space or newline, or the first
+    newline of a blank line; a window may end right after it.
+    
+    Args:
+        text: Text to scan
+        
+    Returns:
+        Sorted offsets of the breaks
+    """
+    # Compare each character with the next one, vectorized over code points
+    chars = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    current, following = chars[:-1], chars[1:]
+    is_break = (
+        ((current == ord(".")) & ((following == ord(" ")) | (following == ord("\n"))))
+        | ((current == ord("\n")) & (following == ord("\n")))
+    )
+    return np.flatnonzero(is_break).tolist()
 
 
 class Segmenter:
     """Split prompts into segments for ablation testing.
     
     The segmenter uses a heuristic approach:
-    1. First tries to find markdown-style headings (e.g., ### Heading)
-    2. Falls back to sliding window of approximately 40 tokens if no headings found
+    1. With structural segmentation, splits the prompt into its top-level
+       sections (XML tags, headings, lists, code blocks, chat turns)
+    2. Otherwise first tries to find markdown-style headings (e.g., ### Heading)
+    3. Falls back to sliding window of 40 tokens if no headings found
+    
+    Windows are measured in tokens of a local BPE vocabulary when the window
+    unit is "tokens", and approximated as 4 characters per token otherwise.
+    Natural breaks are located once per text and each window end is found
+    by binary search, so windowing is linear in the length of the text.
+    
+    Segmentations are cached per process by text hash and segmenter
+    configuration, so identically configured segmenters share them.
     """
     
-    def __init__(self, window_size: int = 40, window_overlap: int = 5):
+    def __init__(
+        self,
+        window_size: int = 40,
+        window_overlap: int = 5,
+        window_unit: Optional[str] = None,
+        tokenizer: Optional[BPETokenizer] = None,
+        structural: Optional[StructuralSegmenter] = None,
+    ):
         """Initialize the segmenter.
         
         Args:
-            window_size: Approximate number of tokens per window when no headings found
+            window_size: Number of tokens per window when no headings found
             window_overlap: Number of tokens to overlap between windows
+            window_unit: "tokens" or "chars" (defaults to SEGMENT_WINDOW_UNIT)
+            tokenizer: Tokenizer for token windows (defaults to the one for TOKENIZER_VOCAB_PATH)
+            structural: Structural segmenter to try first (defaults to one if
+                STRUCTURAL_SEGMENTATION is enabled)
+            
+        Raises:
+            ValueError: If token windows are requested without a vocabulary file
         """
         self.window_size = window_size
         self.window_overlap = window_overlap
@@ -38,90 +147,240 @@ class Segmenter:
         
         # Rough approximation of tokens = 4 chars
         self.chars_per_token = 4
+        
+        settings = get_settings()
+        self.window_unit = window_unit or settings.segment_window_unit
+        self.tokenizer = None
+        if self.window_unit == "tokens":
+            self.tokenizer = tokenizer or get_tokenizer()
+        
+        self.structural = structural
+        if structural is None and settings.structural_segmentation:
+            self.structural = StructuralSegmenter()
+    
+    @property
+    def config_key(self) -> str:
+        """Key of the settings that determine this segmenter's segments."""
+        tokenizer = self.tokenizer.name if self.tokenizer is not None else ""
+        roles = ",".join(self.structural.roles) if self.structural is not None else "-"
+        return (f"{self.window_unit}:{self.window_size}:{self.window_overlap}:"
+                f"{self.chars_per_token}:{tokenizer}:{roles}")
     
-    def segment(self, text: str) -> List[Span]:
+    def segment(self, text: str, lazy: bool = False, cache: bool = True) -> List[Union[Span, SpanView]]:
         """Split the text into segments.
         
         Args:
             text: The prompt text to segment
+            lazy: Whether to return `SpanView`s that slice their text on access
+            cache: Whether to reuse the cached segmentation of an identical text
             
         Returns:
             List of text spans
         """
-        # First try to find markdown-style headings
-        spans = self._segment_by_headings(text)
+        if cache:
+            bounds = cached_bounds(text, self.config_key, self._bounds)
+        else:
+            bounds = self._bounds(text)
+        return self._make_spans(text, bounds, 0, lazy)
+    
+    def segment_messages(
+        self, messages: Sequence[Dict[str, str]], lazy: bool = False
+    ) -> List[Union[Span, SpanView]]:
+        """Split the messages of a chat prompt into segments.
         
-        # Fall back to sliding window if no headings found
-        if not spans:
-            spans = self._segment_by_window(text)
+        Each message's content is segmented on its own (and cached by its
+        own hash, so turns shared by several prompts are segmented once).
+        Spans are positioned in the text of `ChatPrompt(messages)` and
+        carry the index of their message and their offset in its content.
         
-        # Add span IDs
-        for i, span in enumerate(spans):
-            span.id = i
+        Args:
+            messages: Message dictionaries with 'role' and 'content'
+            lazy: Whether to return `SpanView`s of the chat prompt's text
             
+        Returns:
+            List of text spans, numbered across messages in order
+        """
+        layout = ChatPrompt(messages)
+        spans = []
+        for index, (_, content_start, content_end) in enumerate(layout.regions):
+            content = layout.text[content_start:content_end]
+            for start, end in cached_bounds(content, self.config_key, self._bounds):
+                if lazy:
+                    spans.append(SpanView(layout.text, content_start + start, content_start + end,
+                                          id=len(spans), message_index=index, message_offset=start))
+                else:
+                    spans.append(Span(start=content_start + start, end=content_start + end,
+                                      text=content[start:end], id=len(spans),
+                                      message_index=index, message_offset=start))
         return spans
     
-    def _segment_by_headings(self, text: str) -> List[Span]:
+    def _bounds(self, text: str) -> List[Tuple[int, int]]:
+        """(start, end) of each segment of the text."""
+        bounds = []
+        if self.structural is not None:
+            bounds = [(s.start, s.end) for s in self.structural.sections(text)]
+        
+        # Then try to find markdown-style headings
+        if not bounds:
+            bounds = self._heading_bounds(text)
+        
+        # Fall back to sliding window if no headings found
+        if not bounds:
+            bounds = self._window_bounds(text)
+        
+        return bounds
+    
+    def segment_region(
+        self, prompt: str, start: int, end: int, lazy: bool = False
+    ) -> List[Union[Span, SpanView]]:
+        """Split a region of a prompt into segments with prompt offsets.
+        
+        A region that is a section of the prompt's structure is split into
+        its nested sections. Token windows reuse the cached tokenization of
+        the whole prompt, so refining regions of a prompt never tokenizes it
+        again.
+        
+        Args:
+            prompt: The full prompt text
+            start: Start of the region
+            end: End of the region
+            lazy: Whether to return `SpanView`s of the prompt
+            
+        Returns:
+            List of text spans, numbered from 0, positioned in the prompt
+        """
+        if self.structural is not None:
+            sections = self.structural.subsections(prompt, start, end)
+            if sections:
+                bounds = [(s.start, s.end) for s in sections]
+                return self._make_spans(prompt, bounds, 0, lazy)
+        
+        text = prompt[start:end]
+        bounds = self._heading_bounds(text)
+        if not bounds:
+            tokens = None
+            if self.tokenizer is not None:
+                tokens = self.tokenizer.tokenize(prompt).slice(start, end)
+            bounds = self._window_bounds(text, tokens)
+        
+        return self._make_spans(prompt, bounds, start, lazy)
+    
+    def _make_spans(
+        self, source: str, bounds: Sequence[Tuple[int, int]], offset: int, lazy: bool
+    ) -> List[Union[Span, SpanView]]:
+        """Build numbered spans from bounds relative to `offset` in the source."""
+        if lazy:
+            return [SpanView(source, offset + start, offset + end, id=i)
+                    for i, (start, end) in enumerate(bounds)]
+        return [Span(start=offset + start, end=offset + end,
+                     text=source[offset + start:offset + end], id=i)
+                for i, (start, end) in enumerate(bounds)]
+    
+    def _heading_bounds(self, text: str) -> List[Tuple[int, int]]:
         """Segment the text by markdown-style headings.
         
         Args:
             text: The prompt text to segment
             
         Returns:
-            List of text spans, empty if no headings found
+            (start, end) of each segment, empty if no headings found
         """
-        matches = list(self.heading_pattern.finditer(text))
-        if not matches:
+        if "#" not in text:
             return []
         
-        spans = []
-        for i, match in enumerate(matches):
-            start = match.start()
-            # End is either the start of the next heading or the end of the text
-            end = matches[i + 1].start() if i < len(matches) - 1 else len(text)
-            span_text = text[start:end]
-            spans.append(Span(start=start, end=end, text=span_text))
+        starts = [match.start() for match in self.heading_pattern.finditer(text)]
+        if not starts:
+            return []
         
         # Check if there's content before the first heading
-        if matches and matches[0].start() > 0:
-            prefix_text = text[:matches[0].start()]
-            spans.insert(0, Span(start=0, end=matches[0].start(), text=prefix_text))
+        if starts[0] > 0:
+            starts.insert(0, 0)
         
-        return spans
+        # Each segment ends where the next one starts, the last one at the end of the text
+        return list(zip(starts, starts[1:] + [len(text)]))
     
-    def _segment_by_window(self, text: str) -> List[Span]:
+    def _window_bounds(self, text: str, tokens: Optional[TokenizedText] = None) -> List[Tuple[int, int]]:
         """Segment the text by sliding window.
         
         Args:
             text: The prompt text to segment
+            tokens: Tokenization of the text (computed if needed for token windows)
             
         Returns:
-            List of text spans
+            (start, end) of each segment
         """
-        spans = []
+        breaks = break_offsets(text)
+        if self.tokenizer is not None:
+            return self._token_window_bounds(text, tokens or self.tokenizer.tokenize(text), breaks)
+        
+        bounds = []
         chars_per_window = self.window_size * self.chars_per_token
         chars_overlap = self.window_overlap * self.chars_per_token
         
+        text_length = len(text)
+        half_window = chars_per_window // 2
+        
         start = 0
-        while start < len(text):
+        while start < text_length:
             # Calculate end position, capping at text length
-            end = min(start + chars_per_window, len(text))
+            end = min(start + chars_per_window, text_length)
+            
+            # Try to break at natural boundaries like periods or newlines:
+            # the last break whose two characters fit in the window
+            if end < text_length:
+                index = bisect_right(breaks, end - 2) - 1
+                if index >= 0 and breaks[index] > start + half_window:
+                    end = breaks[index] + 1  # Include the period
+            
+            bounds.append((start, end))
+            
+            # Move the start position, accounting for overlap (always forward,
+            # even when a natural break leaves a window shorter than the overlap)
+            start = max(start + 1, end - chars_overlap) if end < text_length else text_length
+        
+        return bounds
+    
+    def _token_window_bounds(
+        self, text: str, tokens: TokenizedText, breaks: Sequence[int]
+    ) -> List[Tuple[int, int]]:
+        """Segment the text by sliding windows of exact token counts.
+        
+        Args:
+            text: The prompt text to segment
+            tokens: Tokenization of the text
+            breaks: Natural break offsets of the text
+            
+        Returns:
+            (start, end) of each segment
+        """
+        bounds = []
+        step_back = min(self.window_overlap, self.window_size - 1)
+        
+        first = 0
+        while first < len(tokens):
+            last = min(first + self.window_size, len(tokens))
+            # The first window also covers text before the first whole token
+            start = tokens.char_offset(first) if first else 0
+            end = tokens.char_offset(last)
             
-            # Try to break at natural boundaries like periods or newlines
-            if end < len(text):
-                natural_breaks = [
-                    text.rfind(". ", start, end),
-                    text.rfind(".\n", start, end),
-                    text.rfind("\n\n", start, end),
-                ]
-                natural_break = max(natural_breaks)
-                if natural_break != -1 and natural_break > start + (chars_per_window // 2):
-                    end = natural_break + 1  # Include the period
+            # Try to end at a natural boundary in the second half of the window
+            if last < len(tokens):
+                natural_break = self._natural_break(breaks, start, end)
+                if natural_break != -1:
+                    boundary = tokens.token_at(natural_break + 1)
+                    if first + self.window_size // 2 < boundary < last:
+                        last, end = boundary, tokens.char_offset(boundary)
             
-            span_text = text[start:end]
-            spans.append(Span(start=start, end=end, text=span_text))
+            bounds.append((start, end))
             
-            # Move the start position, accounting for overlap
-            start = end - chars_overlap if end < len(text) else len(text)
+            # Move the start token, accounting for overlap
+            first = max(first + 1, last - step_back) if last < len(tokens) else len(tokens)
         
-        return spans 
\ No newline at end of file
+        return bounds
+    
+    def _natural_break(self, breaks: Sequence[int], start: int, end: int) -> int:
+        """Last natural break whose two break characters lie in [start, end), or -1."""
+        index = bisect_right(breaks, end - 2) - 1
+        if index >= 0 and breaks[index] >= start:
+            return breaks[index]
+        return -1
@@ -0,0 +1,292 @@
+"""Structure-aware segmentation into a nested section tree."""
+
+import hashlib
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+
+_FENCE_PATTERN = re.compile(r"^\s*(`{3,}|~{3,})")
+_OPEN_TAG_PATTERN = re.compile(r"^\s*<([A-Za-z][\w.\-]*)(?:\s[^<>]*)?>")
+_CLOSE_TAG_PATTERN = re.compile(r"</([A-Za-z][\w.\-]*)>\s*$")
+_HEADING_PATTERN = re.compile(r"^\s*(#{1,6})\s+\S")
+_ITEM_PATTERN = re.compile(r"^(\s*)(?:[-*+]|\d{1,3}[.)])\s+\S")
+
+_DEFAULT_ROLES = ("system", "user", "assistant", "human", "ai")
+
+# Parsed trees kept per process, keyed by prompt hash
+_TREE_CACHE_SIZE = 128
+
+
+@dataclass
+class Section:
+    """A node of a prompt's section tree.
+
+    Attributes:
+        kind: "root", "xml", "heading", "role", "code", "list", "item" or "paragraph"
+        start: Start of the section, including its header line
+        end: End of the section, including trailing blank lines
+        label: Tag name, heading text or role name
+        level: Heading level, or indentation of a list's items
+        body_start: Where the children begin (after the header)
+        body_end: Where the children end (before a closing tag)
+        children: Nested sections, in order, covering the body
+    """
+
+    kind: str
+    start: int
+    end: int = -1
+    label: str = ""
+    level: int = 0
+    body_start: int = -1
+    body_end: int = -1
+    children: List["Section"] = field(default_factory=list)
+
+    def find(self, start: int, end: int) -> Optional["Section"]:
+        """Find the deepest section with exactly the given bounds."""
+        for child in self.children:
+            if child.start <= start and end <= child.end:
+                found = child.find(start, end)
+                if found is not None:
+                    return found
+        return self if (self.start, self.end) == (start, end) else None
+
+
+class StructuralSegmenter:
+    """Segments prompts along their structure rather than fixed windows.
+
+    One linear scan over the lines of a prompt builds a tree of sections:
+    XML-style tags (`<instructions>...</instructions>`), markdown headings,
+    chat role turns (`User: ...`), fenced code blocks, bullet and numbered
+    lists with their items, and paragraphs. Code blocks are kept whole.
+    Each level of the tree covers its parent's body without gaps, so any
+    level can be ablated like ordinary segments.
+
+    Trees are cached by prompt hash, so the passes of hierarchical
+    segmentation share one parse.
+    """
+
+    def __init__(self, roles: Sequence[str] = _DEFAULT_ROLES):
+        """Initialize the structural segmenter.
+
+        Args:
+            roles: Names of chat roles that start a turn when followed by a colon
+        """
+        self.roles = tuple(roles)
+        self._role_pattern = re.compile(
+            r"^\s*(" + "|".join(re.escape(role) for role in self.roles) + r")\s*:",
+            re.IGNORECASE,
+        )
+        self._cache: "OrderedDict[str, Section]" = OrderedDict()
+
+    def parse(self, text: str) -> Section:
+        """Build the section tree of a text, reusing the cached tree of an identical text.
+
+        Args:
+            text: The prompt text
+
+        Returns:
+            Root section covering the whole text
+        """
+        key = hashlib.sha256(text.encode()).hexdigest()
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+
+        root = self._parse_uncached(text)
+        self._cache[key] = root
+        if len(self._cache) > _TREE_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return root
+
+    def sections(self, text: str) -> List[Section]:
+        """Get the top-level sections of a text.
+
+        A section wrapping the whole prompt (such as a single `<prompt>`
+        element) is looked through, so its sections are returned instead.
+
+        Args:
+            text: The prompt text
+
+        Returns:
+            Sections in order, or an empty list if the text has fewer than two
+        """
+        return self._split(self.parse(text))
+
+    def subsections(self, text: str, start: int, end: int) -> List[Section]:
+        """Get the sections nested directly inside a section.
+
+        Args:
+            text: The full prompt text
+            start: Start of the section
+            end: End of the section
+
+        Returns:
+            Sections in order, or an empty list if [start, end) is not a
+            section or has fewer than two nested sections
+        """
+        node = self.parse(text).find(start, end)
+        return self._split(node) if node is not None else []
+
+    def _split(self, node: Section) -> List[Section]:
+        """Children of a node, looking through single-child wrappers."""
+        while len(node.children) == 1:
+            node = node.children[0]
+        return node.children if len(node.children) >= 2 else []
+
+    def _parse_uncached(self, text: str) -> Section:
+        """Build the section tree in one pass over the lines of the text."""
+        root = Section("root", 0, label="", body_start=0)
+        # Open containers, innermost last: root, xml elements, headings, role turns
+        stack: List[Section] = [root]
+        # Open leaf-level blocks
+        paragraph: Optional[Section] = None
+        block_list: Optional[Section] = None
+        fence: Optional[Tuple[Section, str]] = None
+        blank_before = False
+
+        def close_blocks(position: int) -> None:
+            nonlocal paragraph, block_list
+            if paragraph is not None:
+                paragraph.end = position
+                paragraph = None
+            if block_list is not None:
+                block_list.end = position
+                block_list.children[-1].end = position
+                block_list = None
+
+        def open_section(section: Section) -> None:
+            stack[-1].children.append(section)
+
+        def pop_while(position: int, condition) -> None:
+            while len(stack) > 1 and condition(stack[-1]):
+                stack.pop().end = position
+
+        position = 0
+        for line in text.splitlines(keepends=True):
+            line_start, line_end = position, position + len(line)
+            position = line_end
+
+            # Inside a code fence only the closing fence matters
+            if fence is not None:
+                code, marker = fence
+                match = _FENCE_PATTERN.match(line)
+                if match and match.group(1).startswith(marker) and not line[match.end():].strip():
+                    code.end = line_end
+                    fence = None
+                continue
+
+            if not line.strip():
+                if paragraph is not None:
+                    paragraph.end = line_start
+                    paragraph = None
+                blank_before = True
+                continue
+
+            after_blank, blank_before = blank_before, False
+
+            match = _FENCE_PATTERN.match(line)
+            if match:
+                close_blocks(line_start)
+                code = Section("code", line_start, label=line.strip()[len(match.group(1)):].strip())
+                open_section(code)
+                fence = (code, match.group(1))
+                continue
+
+            match = _CLOSE_TAG_PATTERN.search(line)
+            opened = _OPEN_TAG_PATTERN.match(line)
+            if match and opened and opened.group(1) == match.group(1):
+                # An element opened and closed on one line is a leaf
+                close_blocks(line_start)
+                open_section(Section("xml", line_start, line_end, label=match.group(1)))
+                continue
+            if match and any(s.kind == "xml" and s.label == match.group(1) for s in stack):
+                # Text before the closing tag on the same line belongs to the body
+                tag_start = line_start + match.start()
+                if line[:match.start()].strip() and paragraph is None and block_list is None:
+                    paragraph = Section("paragraph", line_start)
+                    open_section(paragraph)
+                body_end = tag_start if line[:match.start()].strip() else line_start
+                close_blocks(body_end)
+                pop_while(body_end, lambda s: not (s.kind == "xml" and s.label == match.group(1)))
+                element = stack.pop()
+                element.body_end, element.end = body_end, line_end
+                continue
+
+            if opened and f"</{opened.group(1)}>" not in line:
+                close_blocks(line_start)
+                element = Section("xml", line_start, label=opened.group(1), body_start=line_end)
+                open_section(element)
+                stack.append(element)
+                continue
+
+            match = _HEADING_PATTERN.match(line)
+            if match:
+                level = len(match.group(1))
+                close_blocks(line_start)
+                pop_while(line_start, lambda s: s.kind == "heading" and s.level >= level)
+                heading = Section("heading", line_start, label=line.strip(), level=level, body_start=line_end)
+                open_section(heading)
+                stack.append(heading)
+                continue
+
+            match = self._role_pattern.match(line)
+            if match:
+                close_blocks(line_start)
+                pop_while(line_start, lambda s: s.kind in ("heading", "role"))
+                turn = Section("role", line_start, label=match.group(1).lower(), body_start=line_start + match.end())
+                open_section(turn)
+                stack.append(turn)
+                if line[match.end():].strip():
+                    paragraph = Section("paragraph", line_start + match.end())
+                    open_section(paragraph)
+                continue
+
+            match = _ITEM_PATTERN.match(line)
+            if match and (block_list is None or len(match.group(1)) <= block_list.level):
+                if block_list is None:
+                    close_blocks(line_start)
+                    block_list = Section("list", line_start, level=len(match.group(1)))
+                    open_section(block_list)
+                else:
+                    block_list.children[-1].end = line_start
+                block_list.children.append(Section("item", line_start))
+                continue
+
+            if block_list is not None:
+                # Indented lines continue the current item, and so do lines
+                # directly below it; a blank line then unindented text ends the list
+                if not after_blank or line[:1].isspace():
+                    continue
+                close_blocks(line_start)
+
+            if paragraph is None:
+                paragraph = Section("paragraph", line_start)
+                open_section(paragraph)
+
+        close_blocks(len(text))
+        if fence is not None:
+            fence[0].end = len(text)
+        pop_while(len(text), lambda s: True)
+        root.end = len(text)
+
+        self._close_gaps(root)
+        return root
+
+    def _close_gaps(self, section: Section) -> None:
+        """Extend children over blank lines so every level covers its parent's body."""
+        if section.body_start < 0:
+            section.body_start = section.start
+        if section.body_end < 0:
+            section.body_end = section.end
+
+        children = section.children
+        if children:
+            children[0].start = min(children[0].start, section.body_start)
+            for child, following in zip(children, children[1:]):
+                child.end = following.start
+            children[-1].end = section.body_end
+        for child in children:
+            self._close_gaps(child)
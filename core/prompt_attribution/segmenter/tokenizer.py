@@ -0,0 +1,215 @@
+"""Offline byte-level BPE tokenizer for token-exact segmentation windows."""
+
+import base64
+import bisect
+import hashlib
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+
+# cl100k-style pre-tokenization written for the standard `re` module:
+# [^\W\d_] stands in for \p{L} and \d for \p{N}
+_PRETOKENIZE_PATTERN = re.compile(
+    r"(?i:'s|'t|'re|'ve|'m|'ll|'d)"
+    r"|(?:[^\r\n\w]|_)?[^\W\d_]+"
+    r"|\d{1,3}"
+    r"| ?(?:[^\s\w]|_)+[\r\n]*"
+    r"|\s*[\r\n]+"
+    r"|\s+(?!\S)"
+    r"|\s+"
+)
+
+# Tokenizations kept per process, keyed by vocabulary and prompt hash
+_TOKENIZATION_CACHE_SIZE = 128
+
+
+@dataclass
+class TokenizedText:
+    """Token boundaries of a text.
+
+    Attributes:
+        offsets: Character offset at which each token starts (non-decreasing;
+            tokens starting inside a multi-byte character share its offset)
+        length: Length of the text in characters
+    """
+
+    offsets: List[int]
+    length: int
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def char_offset(self, token_index: int) -> int:
+        """Character offset of a token boundary; the token count maps to the end of the text."""
+        if token_index >= len(self.offsets):
+            return self.length
+        return self.offsets[token_index]
+
+    def token_at(self, char_offset: int) -> int:
+        """Index of the first token starting at or after a character offset."""
+        return bisect.bisect_left(self.offsets, char_offset)
+
+    def slice(self, start: int, end: int) -> "TokenizedText":
+        """Tokens starting within [start, end), with offsets relative to `start`."""
+        first, last = self.token_at(start), self.token_at(end)
+        return TokenizedText(
+            offsets=[offset - start for offset in self.offsets[first:last]],
+            length=end - start,
+        )
+
+
+class BPETokenizer:
+    """Byte-level BPE tokenizer loaded from a tiktoken-format vocabulary file.
+
+    Each line of the file holds a base64-encoded token and its merge rank,
+    as in the `.tiktoken` files published for cl100k_base and o200k_base,
+    so no network access or extra dependency is needed. Text is split into
+    pieces with a cl100k-style pattern and each piece is merged pairwise by
+    rank. Token counts match the reference tokenizer except where the
+    pattern's ASCII approximation of Unicode classes splits differently.
+
+    Tokenizations are cached by prompt hash, so every segmentation pass over
+    the same prompt reuses one tokenization.
+    """
+
+    def __init__(self, ranks: Dict[bytes, int], name: str = "bpe"):
+        """Initialize the tokenizer.
+
+        Args:
+            ranks: Merge rank of every token's bytes
+            name: Vocabulary name (its file path), part of the tokenization cache key
+        """
+        self.ranks = ranks
+        self.name = name
+        self._piece_cache: Dict[bytes, Tuple[int, ...]] = {}
+
+    @classmethod
+    def from_file(cls, path: str) -> "BPETokenizer":
+        """Load a tokenizer from a tiktoken-format vocabulary file.
+
+        Args:
+            path: Path to the vocabulary file
+
+        Returns:
+            The tokenizer
+
+        Raises:
+            ValueError: If a line of the file is malformed
+        """
+        ranks: Dict[bytes, int] = {}
+        with open(path, "rb") as f:
+            for number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    token, rank = line.split()
+                    ranks[base64.b64decode(token)] = int(rank)
+                except ValueError as e:
+                    raise ValueError(f"Malformed vocabulary line {number} in {path}") from e
+        return cls(ranks, name=str(path))
+
+    def _piece_token_lengths(self, piece: bytes) -> Tuple[int, ...]:
+        """Byte lengths of the tokens a pre-tokenized piece is merged into."""
+        cached = self._piece_cache.get(piece)
+        if cached is not None:
+            return cached
+
+        if piece in self.ranks:
+            lengths: Tuple[int, ...] = (len(piece),)
+        else:
+            # Token boundaries, merged pairwise starting from the lowest rank
+            bounds = list(range(len(piece) + 1))
+            while len(bounds) > 2:
+                best_rank, best = None, -1
+                for i in range(len(bounds) - 2):
+                    rank = self.ranks.get(piece[bounds[i]:bounds[i + 2]])
+                    if rank is not None and (best_rank is None or rank < best_rank):
+                        best_rank, best = rank, i
+                if best < 0:
+                    break
+                del bounds[best + 1]
+            lengths = tuple(bounds[i + 1] - bounds[i] for i in range(len(bounds) - 1))
+
+        if len(self._piece_cache) < 100_000:
+            self._piece_cache[piece] = lengths
+        return lengths
+
+    def _tokenize_uncached(self, text: str) -> TokenizedText:
+        """Tokenize a text in one pass, recording each token's character offset."""
+        offsets: List[int] = []
+        for match in _PRETOKENIZE_PATTERN.finditer(text):
+            piece = match.group()
+            char_start = match.start()
+            if piece.isascii():
+                position = char_start
+                for length in self._piece_token_lengths(piece.encode()):
+                    offsets.append(position)
+                    position += length
+                continue
+
+            # Map byte positions back to characters; a token starting inside
+            # a multi-byte character is placed at that character
+            char_of_byte: List[int] = []
+            for index, char in enumerate(piece):
+                char_of_byte.extend([index] * len(char.encode()))
+            position = 0
+            for length in self._piece_token_lengths(piece.encode()):
+                offsets.append(char_start + char_of_byte[position])
+                position += length
+        return TokenizedText(offsets=offsets, length=len(text))
+
+    def tokenize(self, text: str) -> TokenizedText:
+        """Tokenize a text, reusing the cached tokenization of an identical text.
+
+        Args:
+            text: Text to tokenize
+
+        Returns:
+            Token boundaries of the text
+        """
+        key = (self.name, hashlib.sha256(text.encode()).hexdigest())
+        cached = _tokenization_cache.get(key)
+        if cached is not None:
+            _tokenization_cache.move_to_end(key)
+            return cached
+
+        tokens = self._tokenize_uncached(text)
+        _tokenization_cache[key] = tokens
+        if len(_tokenization_cache) > _TOKENIZATION_CACHE_SIZE:
+            _tokenization_cache.popitem(last=False)
+        return tokens
+
+    def count_tokens(self, text: str) -> int:
+        """Number of tokens in a text."""
+        return len(self.tokenize(text))
+
+
+_tokenization_cache: "OrderedDict[Tuple[str, str], TokenizedText]" = OrderedDict()
+_tokenizers: Dict[str, BPETokenizer] = {}
+
+
+def get_tokenizer(vocab_path: Optional[str] = None) -> BPETokenizer:
+    """Get the process-wide tokenizer for a vocabulary file.
+
+    Args:
+        vocab_path: Path to a tiktoken-format vocabulary (defaults to TOKENIZER_VOCAB_PATH)
+
+    Returns:
+        The tokenizer, loaded once per path
+
+    Raises:
+        ValueError: If no vocabulary file is configured
+    """
+    if vocab_path is None:
+        from ..settings import get_settings
+        vocab_path = get_settings().tokenizer_vocab_path
+    if not vocab_path:
+        raise ValueError(
+            "Token windows need a BPE vocabulary file; set TOKENIZER_VOCAB_PATH "
+            "to a tiktoken-format file such as cl100k_base.tiktoken."
+        )
+    if vocab_path not in _tokenizers:
+        _tokenizers[vocab_path] = BPETokenizer.from_file(vocab_path)
+    return _tokenizers[vocab_path]
@@ -18,6 +18,33 @@ class Settings(BaseModel):
         default_factory=lambda: SecretStr(os.getenv("OPENAI_API_KEY", ""))
     )
     
+    # Backend Configuration ("openai" or the offline "fake" stand-in)
+    llm_backend: str = Field(
+        default=os.getenv("LLM_BACKEND", "openai")
+    )
+    fake_latency_ms: float = Field(
+        default=float(os.getenv("FAKE_LATENCY_MS", "0"))
+    )
+    fake_jitter_ms: float = Field(
+        default=float(os.getenv("FAKE_JITTER_MS", "0"))
+    )
+    fake_rate_limit_rate: float = Field(
+        default=float(os.getenv("FAKE_RATE_LIMIT_RATE", "0"))
+    )
+    fake_token_latency_ms: float = Field(
+        default=float(os.getenv("FAKE_TOKEN_LATENCY_MS", "0"))
+    )
+    # Requests/tokens per minute the fake backend accepts before answering 429
+    fake_requests_per_minute: int = Field(
+        default=int(os.getenv("FAKE_REQUESTS_PER_MINUTE", "0"))
+    )
+    fake_tokens_per_minute: int = Field(
+        default=int(os.getenv("FAKE_TOKENS_PER_MINUTE", "0"))
+    )
+    fake_sample_noise: float = Field(
+        default=float(os.getenv("FAKE_SAMPLE_NOISE", "0"))
+    )
+    
     # Model Configuration  
     completion_model: str = Field(
         default=os.getenv("COMPLETION_MODEL", "gpt-4o")
@@ -30,14 +57,121 @@ class Settings(BaseModel):
     max_cost_per_run: float = Field(
         default=float(os.getenv("MAX_COST_PER_RUN", "0.15"))
     )
+    max_batch_cost: float = Field(
+        default=float(os.getenv("MAX_BATCH_COST", "1.5"))
+    )
     
     # Performance Settings
     max_concurrent_requests: int = Field(
         default=int(os.getenv("MAX_CONCURRENT_REQUESTS", "20"))
     )
+    # Shared rate control: budgets of 0 are learned from rate-limit headers,
+    # and concurrency adapts between 1 and the adaptive maximum (0 = no
+    # higher than MAX_CONCURRENT_REQUESTS)
+    adaptive_concurrency: bool = Field(
+        default=os.getenv("ADAPTIVE_CONCURRENCY", "true").lower() == "true"
+    )
+    max_adaptive_concurrency: int = Field(
+        default=int(os.getenv("MAX_ADAPTIVE_CONCURRENCY", "0"))
+    )
+    rate_limit_rpm: int = Field(
+        default=int(os.getenv("RATE_LIMIT_RPM", "0"))
+    )
+    rate_limit_tpm: int = Field(
+        default=int(os.getenv("RATE_LIMIT_TPM", "0"))
+    )
     early_stop_threshold: float = Field(
         default=float(os.getenv("EARLY_STOP_THRESHOLD", "0.85"))
     )
+    # Structural segmentation: split prompts along XML tags, headings,
+    # lists, code fences and chat turns before falling back to windows
+    structural_segmentation: bool = Field(
+        default=os.getenv("STRUCTURAL_SEGMENTATION", "false").lower() == "true"
+    )
+    # Segmentation windows: "chars" assumes 4 characters per token, "tokens"
+    # counts tokens with the BPE vocabulary file at TOKENIZER_VOCAB_PATH
+    segment_window_unit: str = Field(
+        default=os.getenv("SEGMENT_WINDOW_UNIT", "chars")
+    )
+    tokenizer_vocab_path: str = Field(
+        default=os.getenv("TOKENIZER_VOCAB_PATH", "")
+    )
+    # Keep segmentations in CACHE_DIR/segments.sqlite3 as well as in memory,
+    # so batch jobs and worker processes share them
+    segment_cache_persist: bool = Field(
+        default=os.getenv("SEGMENT_CACHE_PERSIST", "false").lower() == "true"
+    )
+    # Hierarchical refinement: "two_pass" refines the single top coarse
+    # segment once, "recursive" descends into every high-impact segment
+    hierarchical_mode: str = Field(
+        default=os.getenv("HIERARCHICAL_MODE", "two_pass")
+    )
+    refine_delta_threshold: float = Field(
+        default=float(os.getenv("REFINE_DELTA_THRESHOLD", "0.1"))
+    )
+    refine_top_fraction: float = Field(
+        default=float(os.getenv("REFINE_TOP_FRACTION", "0.25"))
+    )
+    refine_min_span_chars: int = Field(
+        default=int(os.getenv("REFINE_MIN_SPAN_CHARS", "80"))
+    )
+    refine_max_calls: int = Field(
+        default=int(os.getenv("REFINE_MAX_CALLS", "50"))
+    )
+    # Adaptive sampling: repeated ablations per segment until the top-k
+    # ranking is separated by confidence bounds
+    adaptive_top_k: int = Field(
+        default=int(os.getenv("ADAPTIVE_TOP_K", "3"))
+    )
+    adaptive_confidence: float = Field(
+        default=float(os.getenv("ADAPTIVE_CONFIDENCE", "0.95"))
+    )
+    adaptive_max_samples: int = Field(
+        default=int(os.getenv("ADAPTIVE_MAX_SAMPLES", "8"))
+    )
+    # Ablation strategy: "single" removes one segment per call, "group"
+    # removes subsets and fits per-segment contributions by regression
+    ablation_strategy: str = Field(
+        default=os.getenv("ABLATION_STRATEGY", "single")
+    )
+    group_ablation_call_ratio: float = Field(
+        default=float(os.getenv("GROUP_ABLATION_CALL_RATIO", "0.5"))
+    )
+    # Seed for breaking ties in the order segments are tested
+    ablation_seed: int = Field(
+        default=int(os.getenv("ABLATION_SEED", "0"))
+    )
+    # Sentence scoring: "positional" compares sentence i with sentence i,
+    # "semantic" matches sentences by similarity first
+    sentence_alignment: str = Field(
+        default=os.getenv("SENTENCE_ALIGNMENT", "positional")
+    )
+    alignment_min_similarity: float = Field(
+        default=float(os.getenv("ALIGNMENT_MIN_SIMILARITY", "0.5"))
+    )
+    # Streaming ablations: stop reading a completion once the rest of it
+    # cannot change the mean sentence delta by more than the tolerance, or
+    # the sentences read so far already put it at the settle delta or above
+    stream_ablations: bool = Field(
+        default=os.getenv("STREAM_ABLATIONS", "false").lower() == "true"
+    )
+    stream_tolerance: float = Field(
+        default=float(os.getenv("STREAM_TOLERANCE", "0.05"))
+    )
+    stream_settle_delta: float = Field(
+        default=float(os.getenv("STREAM_SETTLE_DELTA", "0.3"))
+    )
+    embedding_batch_size: int = Field(
+        default=int(os.getenv("EMBEDDING_BATCH_SIZE", "128"))
+    )
+    embedding_batch_window_ms: float = Field(
+        default=float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "10"))
+    )
+    # Ablation results buffered before they are appended to a run's log;
+    # buffered results are lost if the process is killed
+    run_flush_every: int = Field(
+        default=int(os.getenv("RUN_FLUSH_EVERY", "1"))
+    )
     
     # Cache Settings
     enable_cache: bool = Field(
@@ -46,6 +180,15 @@ class Settings(BaseModel):
     cache_dir: Optional[str] = Field(
         default=os.getenv("CACHE_DIR", ".prompt_attribution_cache")
     )
+    cache_backend: str = Field(
+        default=os.getenv("CACHE_BACKEND", "sqlite")
+    )
+    memory_cache_max_entries: int = Field(
+        default=int(os.getenv("MEMORY_CACHE_MAX_ENTRIES", "10000"))
+    )
+    memory_cache_max_bytes: int = Field(
+        default=int(os.getenv("MEMORY_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+    )
 
 
 # Create a global settings instance
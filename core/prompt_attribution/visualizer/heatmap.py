@@ -6,7 +6,6 @@ from typing import Dict, List, Optional, Tuple
 import uuid
 import re
 from textwrap import shorten
-from itertools import chain
 
 from ..engine import Run
 from ..segmenter import Span
@@ -809,18 +808,11 @@ class HeatmapVisualizer:
             return ""
         # Determine sentence count (columns)
         num_sent = len(run.response_sentence_deltas)
-        num_seg = len(segments)
-        # init matrix with zeros
-        matrix = [[0.0 for _ in range(num_sent)] for _ in range(num_seg)]
-        for res in run.ablation_results:
-            sid = res["span_id"]
-            deltas = res.get("sentence_deltas", [])
-            for j, d in enumerate(deltas):
-                if j < num_sent and sid < num_seg:
-                    matrix[sid][j] = d
+        matrix = run.influence_matrix(num_sent)[:len(segments)]
         # normalise to 0-1 global
-        max_delta = max(chain.from_iterable(matrix)) or 1.0
-        norm = [[cell / max_delta for cell in row] for row in matrix]
+        max_delta = float(matrix.max()) if matrix.size else 0.0
+        max_delta = max_delta or 1.0
+        norm = (matrix / max_delta).tolist()
         # Build HTML
         container_id = f"matrix-{str(uuid.uuid4())[:8]}"
         cell_px = 56
@@ -0,0 +1,27 @@
+"""Shared fixtures: an offline LLM wrapper and a temporary run store."""
+
+import pytest
+
+from core.prompt_attribution.engine import LLMWrapper, RunManager
+from core.prompt_attribution.engine.backends import FakeBackend
+from core.prompt_attribution.settings import get_settings
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    """Global settings with the disk cache disabled, restored after the test."""
+    settings = get_settings()
+    monkeypatch.setattr(settings, "enable_cache", False)
+    return settings
+
+
+@pytest.fixture
+def llm(settings):
+    """LLM wrapper backed by the offline fake backend."""
+    return LLMWrapper(backend=FakeBackend(dimensions=64))
+
+
+@pytest.fixture
+def run_manager(tmp_path):
+    """Run manager storing runs in a temporary directory."""
+    return RunManager(str(tmp_path / "runs"))
@@ -0,0 +1,147 @@
+"""Tests for AblationEngine."""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from core.prompt_attribution.engine import AblationEngine, LLMWrapper
+from core.prompt_attribution.engine.backends import FakeBackend
+from core.prompt_attribution.scorer import Scorer
+from core.prompt_attribution.segmenter import Segmenter
+
+
+PROMPT = (
+    "You are a helpful assistant. Answer in two sentences.\n\n"
+    "The user asks about the weather in Paris. Mention the temperature."
+)
+
+
+def test_normalize_embeddings_of_nothing_is_an_empty_matrix(llm):
+    scorer = Scorer("", llm)
+    matrix = scorer.normalize_embeddings([])
+    assert matrix.shape[0] == 0
+    assert matrix.dtype == np.float32
+
+
+def test_run_with_empty_baseline_completion(llm, run_manager):
+    segments = Segmenter().segment(PROMPT)
+    run = run_manager.create_run(PROMPT, "", segments)
+    engine = AblationEngine(llm, run_manager, handle_signals=False)
+
+    run = asyncio.run(engine.run_ablation_tests(run, early_stop=False))
+
+    assert run.status == "completed"
+    assert len(run.ablation_results) == len(segments)
+    assert all(result["sentence_deltas"] == [] for result in run.ablation_results)
+
+
+LONG_PROMPT = " ".join(f"Rule {i}: keep answer number {i} short and polite." for i in range(8))
+
+
+def streaming_engine(llm, run_manager, **overrides):
+    engine = AblationEngine(llm, run_manager, handle_signals=False)
+    engine.stream_ablations = True
+    for name, value in overrides.items():
+        setattr(engine, name, value)
+    return engine
+
+
+def test_streamed_delta_matches_non_streamed_delta(llm, run_manager):
+    baseline = asyncio.run(llm.get_completion(LONG_PROMPT))
+    segments = Segmenter(window_size=10, window_overlap=0).segment(LONG_PROMPT)
+
+    plain = AblationEngine(llm, run_manager, handle_signals=False)
+    plain_run = asyncio.run(plain.run_ablation_tests(
+        run_manager.create_run(LONG_PROMPT, baseline, segments), early_stop=False
+    ))
+    # Never cut the stream short
+    streamed = streaming_engine(llm, run_manager, stream_tolerance=-1.0, stream_settle_delta=2.0)
+    streamed_run = asyncio.run(streamed.run_ablation_tests(
+        run_manager.create_run(LONG_PROMPT, baseline, segments), early_stop=False
+    ))
+
+    plain_deltas = {r["span_id"]: r["delta_cos"] for r in plain_run.ablation_results}
+    for result in streamed_run.ablation_results:
+        assert not result["partial"]
+        assert result["delta_cos"] == plain_deltas[result["span_id"]]
+
+
+def test_stream_stops_once_the_first_sentences_diverge(llm, run_manager):
+    # A baseline sharing nothing with the completions, so every sentence diverges
+    baseline = " ".join(f"Zebra {word} gallops quietly." for word in "abcdefghij")
+    segments = Segmenter(window_size=10, window_overlap=0).segment(LONG_PROMPT)
+    engine = streaming_engine(llm, run_manager, stream_tolerance=0.05, stream_settle_delta=0.3)
+
+    run = asyncio.run(engine.run_ablation_tests(
+        run_manager.create_run(LONG_PROMPT, baseline, segments), early_stop=False
+    ))
+
+    # Completions have at most 8 sentences, so the tolerance alone (which
+    # needs 10 of the 10 baseline sentences) never cuts a stream; the lower
+    # bound reaches 0.3 after 3 diverging sentences
+    num_sent = len(engine._split_sentences(baseline))
+    for result in run.ablation_results:
+        assert result["partial"]
+        # delta_cos is the bounded estimate of the mean sentence delta
+        assert 0.3 <= result["ci_low"] <= result["delta_cos"] <= result["ci_high"]
+        # Unread sentences are left out rather than counted as changed
+        assert len(result["sentence_deltas"]) < num_sent
+    assert llm.get_stats()["streams_aborted"] == len(segments)
+
+
+def test_streaming_uses_the_ablation_seed(settings, run_manager):
+    llm = LLMWrapper(backend=FakeBackend(dimensions=64, sample_noise=1.0))
+    baseline = asyncio.run(llm.get_completion(LONG_PROMPT))
+    span = Segmenter(window_size=10, window_overlap=0).segment(LONG_PROMPT)[0]
+    engine = streaming_engine(llm, run_manager, stream_tolerance=-1.0, stream_settle_delta=2.0)
+    scorer = Scorer(baseline, llm)
+
+    async def deltas(process, seed):
+        sentences, matrix = await engine._get_baseline_matrix(baseline, scorer)
+        result = await process(LONG_PROMPT, span, scorer, sentences, matrix, seed=seed)
+        return result.delta_cos
+
+    for seed in (1, 2):
+        assert asyncio.run(deltas(engine._process_segment_streaming, seed)) == asyncio.run(
+            deltas(engine._process_segment, seed)
+        )
+    assert asyncio.run(deltas(engine._process_segment_streaming, 1)) != asyncio.run(
+        deltas(engine._process_segment_streaming, 2)
+    )
+
+
+def test_streaming_rejects_semantic_alignment(llm, run_manager):
+    segments = Segmenter().segment(PROMPT)
+    engine = streaming_engine(llm, run_manager, sentence_alignment="semantic")
+
+    with pytest.raises(ValueError, match="semantic"):
+        asyncio.run(engine.run_ablation_tests(run_manager.create_run(PROMPT, "Hi.", segments)))
+
+
+def test_early_stop_is_deterministic_and_cancels_unsent_ablations(run_manager, settings, monkeypatch):
+    monkeypatch.setattr(settings, "early_stop_threshold", 0.2)
+    segments = Segmenter(window_size=10, window_overlap=0).segment(LONG_PROMPT)
+
+    def attribute():
+        backend = FakeBackend(dimensions=64, latency_ms=5, jitter_ms=20)
+        llm = LLMWrapper(backend=backend)
+        baseline = asyncio.run(llm.get_completion(LONG_PROMPT))
+        engine = AblationEngine(llm, run_manager, semaphore=asyncio.Semaphore(2), handle_signals=False)
+        run = asyncio.run(engine.run_ablation_tests(run_manager.create_run(LONG_PROMPT, baseline, segments)))
+        return run, backend.completion_calls - 1
+
+    first, first_calls = attribute()
+    second, _ = attribute()
+
+    def outcome(run):
+        return [(r["span_id"], r["delta_cos"]) for r in run.ablation_results]
+
+    assert outcome(first) == outcome(second)
+    skipped = first.stats["early_stop_skipped_segments"]
+    assert skipped == second.stats["early_stop_skipped_segments"]
+    assert 0 < skipped < len(segments)
+    assert len(first.ablation_results) == len(segments) - skipped
+    # Ablations cancelled while their requests were in flight saved nothing
+    assert 0 < first.stats["api_calls_saved"] <= 2 * (len(segments) - first_calls)
+    assert first.stats["api_calls_saved"] <= 2 * skipped
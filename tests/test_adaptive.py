@@ -0,0 +1,139 @@
+"""Tests for adaptive sampling of repeated ablations."""
+
+import asyncio
+import math
+
+import numpy as np
+import pytest
+
+from core.prompt_attribution.engine import AblationEngine, AdaptiveSampler, LLMWrapper
+from core.prompt_attribution.engine.ablation_engine import BudgetExceeded, CostBudget
+from core.prompt_attribution.engine.backends import FakeBackend
+from core.prompt_attribution.scorer import Scorer
+from core.prompt_attribution.segmenter import Segmenter
+
+
+PROMPT = " ".join(f"Rule {i}: keep answer number {i} short and polite." for i in range(8))
+
+
+class FailingScorer(Scorer):
+    """Scorer whose distance calculation fails after a number of calls."""
+
+    def __init__(self, baseline, llm, fail_after=None):
+        super().__init__(baseline, llm)
+        self.fail_after = fail_after
+        self.calls = 0
+
+    async def calculate_distance(self, ablated_completion):
+        self.calls += 1
+        if self.fail_after is not None and self.calls > self.fail_after:
+            raise RuntimeError("scoring failed")
+        return await super().calculate_distance(ablated_completion)
+
+
+def noisy_run(run_manager, sample_noise):
+    """An LLM whose completions vary with the seed, and a run over PROMPT."""
+    llm = LLMWrapper(backend=FakeBackend(dimensions=64, sample_noise=sample_noise))
+    segments = Segmenter(window_size=10, window_overlap=0).segment(PROMPT)
+    baseline = asyncio.run(llm.get_completion(PROMPT))
+    return llm, run_manager.create_run(PROMPT, baseline, segments)
+
+
+def test_stops_once_top_k_is_separated(run_manager, settings):
+    llm, run = noisy_run(run_manager, sample_noise=0.0)
+    engine = AblationEngine(llm, run_manager, handle_signals=False)
+    sampler = AdaptiveSampler(engine, top_k=2, max_samples=8, max_cost=1.0)
+
+    run = asyncio.run(sampler.run(run))
+
+    samples = [r["samples"] for r in run.ablation_results]
+    assert run.stats["adaptive_stable"] == 1
+    assert run.stats["adaptive_samples"] == sum(samples)
+    assert min(samples) == 2
+    # Only segments near the top-2 boundary were sampled again
+    assert 2 * len(samples) < sum(samples) < 8 * len(samples)
+    assert run.status == "completed"
+
+
+def test_results_report_sample_mean_variance_and_interval(run_manager, settings):
+    llm, run = noisy_run(run_manager, sample_noise=0.3)
+    engine = AblationEngine(llm, run_manager, handle_signals=False)
+    sampler = AdaptiveSampler(engine, top_k=2, max_samples=4, max_cost=1.0)
+
+    run = asyncio.run(sampler.run(run))
+
+    for result in run.ablation_results:
+        deltas = [s["delta_cos"] for s in run.adaptive_samples if s["span_id"] == result["span_id"]]
+        mean, variance = np.mean(deltas), np.var(deltas, ddof=1)
+        radius = sampler.z * math.sqrt(max(variance, sampler.min_variance) / len(deltas))
+        assert result["samples"] == len(deltas)
+        assert result["delta_cos"] == pytest.approx(mean, abs=1e-6)
+        assert result["delta_var"] == pytest.approx(variance, abs=1e-6)
+        assert result["ci_low"] == pytest.approx(mean - radius, abs=1e-6)
+        assert result["ci_high"] == pytest.approx(mean + radius, abs=1e-6)
+    assert any(result["delta_var"] > 0 for result in run.ablation_results)
+
+
+def test_max_cost_caps_the_samples(run_manager, settings):
+    llm, run = noisy_run(run_manager, sample_noise=0.3)
+    engine = AblationEngine(llm, run_manager, handle_signals=False)
+    calls = 2 * len(run.segments) + 5
+    sampler = AdaptiveSampler(engine, top_k=2, max_samples=8, max_cost=calls * engine.estimated_cost_per_request)
+
+    run = asyncio.run(sampler.run(run))
+
+    assert run.stats["adaptive_samples"] == calls
+    assert run.stats["adaptive_stable"] == 0
+
+
+def test_shared_budget_caps_and_is_charged_for_the_samples(run_manager, settings):
+    llm, run = noisy_run(run_manager, sample_noise=0.3)
+    cost = AblationEngine(llm, run_manager).estimated_cost_per_request
+    calls = 2 * len(run.segments) + 5
+    budget = CostBudget((calls + 0.5) * cost)
+    engine = AblationEngine(llm, run_manager, cost_budget=budget, handle_signals=False)
+
+    run = asyncio.run(AdaptiveSampler(engine, top_k=2, max_samples=8, max_cost=1.0).run(run))
+
+    assert run.stats["adaptive_samples"] == calls
+    assert budget.reserved == pytest.approx(calls * cost)
+
+    # Not even one sample per segment left
+    _, other = noisy_run(run_manager, sample_noise=0.3)
+    with pytest.raises(BudgetExceeded):
+        asyncio.run(AdaptiveSampler(engine, top_k=2).run(other))
+
+
+def test_failure_checkpoints_samples_and_resume_reuses_them(run_manager, settings):
+    llm, run = noisy_run(run_manager, sample_noise=0.3)
+    budget = CostBudget(1.0)
+    engine = AblationEngine(
+        llm, run_manager, semaphore=asyncio.Semaphore(1), cost_budget=budget, handle_signals=False
+    )
+    sampler = AdaptiveSampler(engine, top_k=2, max_samples=4, max_cost=1.0)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(sampler.run(run, FailingScorer(run.completion, llm, fail_after=15)))
+
+    saved = run_manager.get_run(run.id)
+    assert saved.status == "interrupted"
+    assert len(saved.adaptive_samples) == 15
+    # Samples that never got a request slot were refunded
+    assert budget.reserved < 2 * len(run.segments) * engine.estimated_cost_per_request
+
+    # A fresh semaphore for the new event loop
+    engine.semaphore = asyncio.Semaphore(1)
+    scorer = FailingScorer(saved.completion, llm)
+    resumed = asyncio.run(sampler.run(saved, scorer))
+
+    assert scorer.calls == resumed.stats["adaptive_samples"] - 15
+    assert resumed.status == "completed"
+
+    _, fresh = noisy_run(run_manager, sample_noise=0.3)
+    engine.semaphore = asyncio.Semaphore(1)
+    expected = asyncio.run(AdaptiveSampler(engine, top_k=2, max_samples=4, max_cost=1.0).run(fresh))
+
+    def timeless(results):
+        return [{k: v for k, v in r.items() if k != "elapsed_ms"} for r in results]
+
+    assert timeless(resumed.ablation_results) == timeless(expected.ablation_results)
@@ -0,0 +1,68 @@
+"""Tests for the assignment solver and sentence alignment."""
+
+import itertools
+import random
+
+import numpy as np
+import pytest
+
+from core.prompt_attribution.scorer.alignment import align_sentences, linear_sum_assignment
+
+
+def brute_force_cost(cost: np.ndarray) -> float:
+    """Minimum total cost over every assignment of min(n, m) pairs."""
+    n, m = cost.shape
+    if n <= m:
+        return min(sum(cost[i, j] for i, j in enumerate(cols))
+                   for cols in itertools.permutations(range(m), n))
+    return min(sum(cost[i, j] for j, i in enumerate(rows))
+               for rows in itertools.permutations(range(n), m))
+
+
+@pytest.mark.parametrize("seed", range(60))
+def test_assignment_matches_brute_force(seed):
+    rng = random.Random(seed)
+    n, m = rng.randint(1, 6), rng.randint(1, 6)
+    # Integer costs produce ties, which exercise the tie handling
+    cost = np.array([[rng.randint(-5, 5) for _ in range(m)] for _ in range(n)], dtype=np.float64)
+    if seed % 2:
+        cost += np.array([[rng.random() for _ in range(m)] for _ in range(n)])
+
+    rows, cols = linear_sum_assignment(cost)
+
+    assert len(rows) == len(cols) == min(n, m)
+    assert list(rows) == sorted(rows)
+    assert len(set(rows.tolist())) == len(rows)
+    assert len(set(cols.tolist())) == len(cols)
+    assert cost[rows, cols].sum() == pytest.approx(brute_force_cost(cost))
+
+
+def test_assignment_of_empty_matrix():
+    rows, cols = linear_sum_assignment(np.zeros((0, 3)))
+    assert len(rows) == len(cols) == 0
+
+
+def test_alignment_splits_weak_pairs_into_deleted_and_inserted():
+    similarity = np.array([
+        [0.1, 0.95, 0.0],
+        [0.9, 0.2, 0.1],
+        [0.2, 0.1, 0.3],
+    ])
+
+    alignment = align_sentences(similarity, min_similarity=0.5)
+
+    assert sorted(alignment.pairs) == [(0, 1), (1, 0)]
+    assert alignment.deleted == [2]
+    assert alignment.inserted == [2]
+
+
+def test_alignment_prefers_the_optimal_total_over_greedy_matches():
+    # Greedy matching would pair (0, 0) first and leave row 1 with 0.1
+    similarity = np.array([
+        [0.9, 0.8],
+        [0.85, 0.1],
+    ])
+
+    alignment = align_sentences(similarity, min_similarity=0.0)
+
+    assert sorted(alignment.pairs) == [(0, 1), (1, 0)]
@@ -0,0 +1,66 @@
+"""Tests for BatchAttributor and the shared cost budget."""
+
+import asyncio
+
+from core.prompt_attribution.engine import AblationEngine
+from core.prompt_attribution.engine.ablation_engine import CostBudget
+from core.prompt_attribution.engine.batch import BatchAttributor
+from core.prompt_attribution.scorer import Scorer
+from core.prompt_attribution.segmenter import Segmenter
+
+
+PROMPT = " ".join(f"Rule {i}: keep answer number {i} short and polite." for i in range(8))
+
+
+def test_early_stop_refunds_unstarted_ablations(llm, run_manager):
+    baseline = asyncio.run(llm.get_completion(PROMPT))
+    segments = Segmenter(window_size=10, window_overlap=0).segment(PROMPT)
+    run = run_manager.create_run(PROMPT, baseline, segments)
+
+    budget = CostBudget(1.0)
+    engine = AblationEngine(
+        llm, run_manager, semaphore=asyncio.Semaphore(1), cost_budget=budget, handle_signals=False
+    )
+    scorer = Scorer(baseline, llm)
+    # Stop at the first committed result
+    scorer.early_stop_threshold = 1e-6
+
+    run = asyncio.run(engine.run_ablation_tests(run, scorer=scorer))
+
+    assert len(segments) > 3
+    assert len(run.ablation_results) == 1
+    # Only the ablations that got a request slot stay reserved
+    assert 0 < budget.reserved <= 2 * engine.estimated_cost_per_request
+
+
+def test_refund_never_goes_below_zero():
+    budget = CostBudget(1.0)
+    budget.reserve(0.25)
+    budget.refund(0.5)
+    assert budget.reserved == 0.0
+    assert budget.remaining == 1.0
+
+
+def test_run_skipped_after_creation_is_checkpointed(llm, run_manager):
+    # Room for the baseline completion, not for the ablations
+    attributor = BatchAttributor(llm, run_manager, max_cost=0.004)
+
+    [result] = asyncio.run(attributor.run([PROMPT]))
+
+    assert result.status == "skipped"
+    assert result.run is not None
+    assert run_manager.get_run(result.run.id).status == "interrupted"
+    assert [summary.status for summary in run_manager.list_runs()] == ["interrupted"]
+
+
+def test_batch_runs_do_not_record_shared_llm_counters(llm, run_manager):
+    attributor = BatchAttributor(llm, run_manager, early_stop=False)
+
+    results = asyncio.run(attributor.run([PROMPT, PROMPT.upper()]))
+
+    assert [result.status for result in results] == ["completed", "completed"]
+    for result in results:
+        assert "completion_requests" not in result.run.stats
+    segment_count = sum(len(result.run.segments) for result in results)
+    # Each run sends its baseline and one completion per segment
+    assert attributor.get_stats()["completion_requests"] == segment_count + 2
@@ -0,0 +1,95 @@
+"""Tests for EmbeddingBatcher."""
+
+import asyncio
+
+import pytest
+
+from core.prompt_attribution.engine.batcher import EmbeddingBatcher
+
+
+class RecordingEmbedder:
+    """Embeds each text as [len(text)] and records the batches it was sent."""
+
+    def __init__(self, drop: int = 0, error: Exception = None):
+        self.batches = []
+        self.drop = drop
+        self.error = error
+
+    async def __call__(self, texts):
+        self.batches.append(list(texts))
+        await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+        return [[float(len(text))] for text in texts][:len(texts) - self.drop]
+
+
+def test_concurrent_requests_share_one_call():
+    embedder = RecordingEmbedder()
+    batcher = EmbeddingBatcher(embedder, max_batch_size=16, max_wait_ms=5)
+
+    async def submit_all():
+        return await asyncio.gather(*(batcher.submit(text) for text in ["a", "bb", "a", "ccc"]))
+
+    assert asyncio.run(submit_all()) == [[1.0], [2.0], [1.0], [3.0]]
+    # Duplicates within a batch are sent once
+    assert embedder.batches == [["a", "bb", "ccc"]]
+    assert (batcher.requests_sent, batcher.inputs_sent) == (1, 3)
+
+
+def test_full_batches_are_sent_without_waiting():
+    embedder = RecordingEmbedder()
+    batcher = EmbeddingBatcher(embedder, max_batch_size=3, max_wait_ms=10_000)
+    texts = [f"text {i}" for i in range(7)]
+
+    async def submit_all():
+        # Only the last, partial batch waits for the window
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit(text) for text in texts[:6])), timeout=1
+        )
+
+    asyncio.run(submit_all())
+    assert [len(batch) for batch in embedder.batches] == [3, 3]
+
+
+def test_errors_reach_every_waiter():
+    embedder = RecordingEmbedder(error=RuntimeError("embedding service down"))
+    batcher = EmbeddingBatcher(embedder, max_wait_ms=1)
+
+    async def submit_all():
+        return await asyncio.gather(
+            *(batcher.submit(text) for text in ["a", "b", "c"]), return_exceptions=True
+        )
+
+    errors = asyncio.run(submit_all())
+    assert [str(error) for error in errors] == ["embedding service down"] * 3
+
+
+def test_short_response_fails_every_waiter():
+    batcher = EmbeddingBatcher(RecordingEmbedder(drop=1), max_wait_ms=1)
+
+    async def submit_all():
+        return await asyncio.wait_for(asyncio.gather(
+            *(batcher.submit(text) for text in ["a", "b", "c"]), return_exceptions=True
+        ), timeout=1)
+
+    errors = asyncio.run(submit_all())
+    assert all(isinstance(error, ValueError) for error in errors)
+    assert "3 inputs returned 2 vectors" in str(errors[0])
+
+
+def test_requests_left_by_a_stopped_loop_do_not_block_the_next_one():
+    batcher = EmbeddingBatcher(RecordingEmbedder(), max_wait_ms=10_000)
+
+    async def abandon():
+        # The loop stops while the request waits for the flush timer
+        task = asyncio.ensure_future(batcher.submit("a"))
+        await asyncio.sleep(0)
+        task.cancel()
+
+    asyncio.run(abandon())
+    batcher.max_wait = 0.001
+
+    async def submit():
+        return await asyncio.wait_for(batcher.submit("b"), timeout=1)
+
+    assert asyncio.run(submit()) == [1.0]
@@ -0,0 +1,94 @@
+"""Tests for the LLM cache backends."""
+
+from core.prompt_attribution.engine.cache import DirectoryCache, MemoryCache, SQLiteCache, create_cache_backend
+from core.prompt_attribution.settings import Settings
+
+
+def make_settings(cache_dir, **overrides):
+    return Settings(cache_dir=str(cache_dir), cache_backend="sqlite", memory_cache_max_entries=0, **overrides)
+
+
+def test_sqlite_round_trip(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"))
+    cache.set("chat_a", "hello")
+    cache.set_vector("embed_a", [0.5, -1.0])
+    cache.close()
+
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"))
+    assert cache.get("chat_a") == "hello"
+    assert cache.get_vector("embed_a") == [0.5, -1.0]
+    assert cache.get("chat_missing") is None
+    cache.close()
+
+
+def test_directory_cache_is_imported_once(tmp_path):
+    legacy = DirectoryCache(str(tmp_path))
+    legacy.set("chat_a", "hello")
+    legacy.set_vector("embed_a", [1.0, 2.0])
+
+    backend = create_cache_backend(make_settings(tmp_path))
+    assert backend.get("chat_a") == "hello"
+    assert backend.get_vector("embed_a") == [1.0, 2.0]
+    backend.close()
+
+    # Entries added to the directory later are not imported again
+    legacy.set("chat_b", "late")
+    backend = create_cache_backend(make_settings(tmp_path))
+    assert backend.get("chat_a") == "hello"
+    assert backend.get("chat_b") is None
+    backend.close()
+
+
+
+def test_memory_tier_vectors_match_sqlite(tmp_path):
+    cache = MemoryCache(SQLiteCache(str(tmp_path / "cache.sqlite3")))
+    vector = [0.1, 1 / 3, -2.7]
+    cache.set_vector("embed_a", vector)
+
+    from_memory = cache.get_vector("embed_a")
+    cache.flush()
+    from_disk = SQLiteCache(str(tmp_path / "cache.sqlite3")).get_vector("embed_a")
+
+    assert from_memory == from_disk
+    assert from_memory != vector
+    assert cache.stats["bytes"] == 4 * len(vector)
+
+
+def test_memory_tier_counts_store_hits_apart_from_memory_hits(tmp_path):
+    store = SQLiteCache(str(tmp_path / "cache.sqlite3"))
+    store.set("chat_a", "hello")
+    store.set_vector("embed_a", [1.0, 2.0])
+    cache = MemoryCache(store)
+
+    assert cache.get("chat_a") == "hello"
+    assert cache.get_vector("embed_a") == [1.0, 2.0]
+    assert cache.get("chat_a") == "hello"
+    assert cache.get("chat_missing") is None
+
+    stats = cache.stats
+    assert (stats["hits"], stats["store_hits"], stats["misses"]) == (1, 2, 1)
+
+
+def test_memory_tier_evicts_least_recently_used_entries(tmp_path):
+    store = DirectoryCache(str(tmp_path))
+    cache = MemoryCache(store, max_entries=2, max_bytes=10)
+    cache.set("chat_a", "aaa")
+    cache.set("chat_b", "bbb")
+    cache.get("chat_a")
+    cache.set("chat_c", "ccc")
+
+    # chat_b was the least recently used
+    assert cache.stats["entries"] == 2
+    assert cache.stats["evictions"] == 1
+    cache.get("chat_b")
+    assert cache.stats["store_hits"] == 1
+
+    # The byte limit evicts too, and the store still has everything
+    cache.set("chat_d", "dddddddd")
+    assert cache.stats["bytes"] <= 10
+    assert cache.stats["entries"] == 1
+    assert [cache.get(key) for key in ("chat_a", "chat_b", "chat_c")] == ["aaa", "bbb", "ccc"]
+    # Values larger than the byte limit are never held in memory
+    cache.set("chat_e", "e" * 11)
+    assert "chat_e" not in cache._entries
+    assert store.get("chat_e") == "e" * 11
@@ -0,0 +1,122 @@
+"""Tests for group (subset) ablation."""
+
+import asyncio
+import random
+
+import numpy as np
+import pytest
+
+from core.prompt_attribution.engine import AblationEngine, GroupAblation
+from core.prompt_attribution.engine.ablation_engine import CostBudget
+from core.prompt_attribution.engine.group_ablation import (
+    fit_contributions,
+    kernel_shap_masks,
+    kernel_shap_weights,
+)
+from core.prompt_attribution.scorer import Scorer
+from core.prompt_attribution.segmenter import Segmenter
+
+
+PROMPT = " ".join(f"Rule {i}: keep answer number {i} short and polite." for i in range(8))
+SEED = 3
+
+
+class AdditiveScorer(Scorer):
+    """Scores an ablated completion as the summed effects of the segments it lacks."""
+
+    def __init__(self, baseline, llm, distances, fail_after=None):
+        super().__init__(baseline, llm)
+        self.distances = distances
+        self.fail_after = fail_after
+        self.calls = 0
+
+    async def calculate_distance(self, ablated_completion):
+        self.calls += 1
+        if self.fail_after is not None and self.calls > self.fail_after:
+            raise RuntimeError("scoring failed")
+        return self.distances[ablated_completion]
+
+
+def additive_case(llm, run_manager, engine):
+    """A run, its group ablation, and the FakeBackend completion -> distance of every planned subset."""
+    segments = Segmenter(window_size=10, window_overlap=0).segment(PROMPT)
+    effects = {span.id: 0.02 * (index + 1) for index, span in enumerate(segments)}
+    baseline = asyncio.run(llm.get_completion(PROMPT))
+    run = run_manager.create_run(PROMPT, baseline, segments)
+
+    # Next to no regularization, so additive effects are recovered exactly
+    group = GroupAblation(engine, num_calls=2 * len(segments), seed=SEED, ridge=1e-9)
+    masks = kernel_shap_masks(len(segments), group.planned_calls(len(segments)), random.Random(SEED))
+    distances = {}
+    for mask in masks:
+        removed = [span for span, bit in zip(segments, mask) if bit]
+        completion = asyncio.run(llm.get_completion(engine._remove_segments(PROMPT, removed)))
+        distances[completion] = sum(effects[span.id] for span in removed)
+    return run, group, distances, effects
+
+
+def test_recovers_additive_segment_effects(llm, run_manager):
+    engine = AblationEngine(llm, run_manager, handle_signals=False)
+    run, group, distances, effects = additive_case(llm, run_manager, engine)
+    assert len(distances) == group.planned_calls(len(run.segments))
+
+    run = asyncio.run(group.run(run, AdditiveScorer(run.completion, llm, distances)))
+
+    estimates = {r["span_id"]: r["delta_cos"] for r in run.ablation_results}
+    assert estimates == pytest.approx(effects, abs=1e-3)
+    assert run.stats["group_ablation_calls"] == len(distances)
+    assert run.status == "completed"
+
+
+def test_fit_is_exact_for_additive_outcomes():
+    rng = np.random.default_rng(0)
+    effects = rng.random((6, 3))
+    masks = kernel_shap_masks(6, 62, random.Random(0))
+
+    contributions = fit_contributions(masks, masks @ effects, kernel_shap_weights(masks), ridge=1e-9)
+
+    np.testing.assert_allclose(contributions, effects, atol=1e-6)
+
+
+def test_small_prompts_fall_back_to_single_deletion(llm, run_manager, settings):
+    segments = Segmenter(window_size=10, window_overlap=0).segment(PROMPT)[:3]
+    baseline = asyncio.run(llm.get_completion(PROMPT))
+    engine = AblationEngine(llm, run_manager, handle_signals=False)
+    engine.ablation_strategy = "group"
+    assert GroupAblation(engine).planned_calls(len(segments)) >= len(segments)
+
+    run = asyncio.run(engine.run_ablation_tests(
+        run_manager.create_run(PROMPT, baseline, segments), early_stop=False
+    ))
+
+    assert "group_ablation_calls" not in run.stats
+    assert sorted(r["span_id"] for r in run.ablation_results) == [s.id for s in segments]
+    assert all(r["samples"] == 1 for r in run.ablation_results)
+
+
+def test_failure_checkpoints_samples_and_resume_reuses_them(llm, run_manager):
+    budget = CostBudget(1.0)
+    engine = AblationEngine(
+        llm, run_manager, semaphore=asyncio.Semaphore(1), cost_budget=budget, handle_signals=False
+    )
+    run, group, distances, effects = additive_case(llm, run_manager, engine)
+    calls = len(distances)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(group.run(run, AdditiveScorer(run.completion, llm, distances, fail_after=5)))
+
+    saved = run_manager.get_run(run.id)
+    assert saved.status == "interrupted"
+    assert len(saved.group_samples) == 5
+    # Subsets that never got a request slot were refunded
+    assert budget.reserved < calls * engine.estimated_cost_per_request
+
+    # A fresh semaphore for the new event loop
+    engine.semaphore = asyncio.Semaphore(1)
+    scorer = AdditiveScorer(saved.completion, llm, distances)
+    resumed = asyncio.run(group.run(saved, scorer))
+
+    assert scorer.calls == calls - 5
+    assert resumed.status == "completed"
+    estimates = {r["span_id"]: r["delta_cos"] for r in resumed.ablation_results}
+    assert estimates == pytest.approx(effects, abs=1e-3)
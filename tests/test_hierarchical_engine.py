@@ -0,0 +1,150 @@
+"""Tests for recursive hierarchical refinement."""
+
+import asyncio
+import math
+from dataclasses import replace
+
+import pytest
+
+from core.prompt_attribution.engine.hierarchical_engine import HierarchicalAblationEngine
+from core.prompt_attribution.scorer import Scorer
+from core.prompt_attribution.segmenter import HierarchicalSegmenter
+
+
+PROMPT = "\n\n".join(
+    " ".join(f"Section {p} rule {i}: keep answer number {i} short and polite for topic {p}." for i in range(4))
+    for p in range(5)
+)
+
+
+class FailingScorer(Scorer):
+    """Scorer whose distance calculation fails after a number of calls."""
+
+    def __init__(self, baseline, llm, fail_after):
+        super().__init__(baseline, llm)
+        self.fail_after = fail_after
+        self.calls = 0
+
+    async def calculate_distance(self, ablated_completion):
+        self.calls += 1
+        if self.calls > self.fail_after:
+            raise RuntimeError("scoring failed")
+        return await super().calculate_distance(ablated_completion)
+
+
+class SparseIdSegmenter(HierarchicalSegmenter):
+    """Numbers the coarse segments 0, 2, 4, ... instead of 0, 1, 2, ..."""
+
+    def segment_first_pass(self, prompt):
+        return [replace(span, id=2 * span.id) for span in super().segment_first_pass(prompt)]
+
+
+def recursive_run(llm, run_manager):
+    engine = HierarchicalAblationEngine(llm, run_manager, handle_signals=False)
+    baseline = asyncio.run(llm.get_completion(PROMPT))
+    return engine, run_manager.create_run(PROMPT, baseline, [])
+
+
+def tree(run):
+    """(span ID, parent ID, depth, text) of every tested segment."""
+    texts = {segment["id"]: segment["text"] for segment in run.segments}
+    return sorted((r["span_id"], r["parent_id"], r["depth"], texts[r["span_id"]]) for r in run.ablation_results)
+
+
+def refined_ids(run):
+    return {r["parent_id"] for r in run.ablation_results if r["parent_id"] is not None}
+
+
+def test_segments_at_or_above_the_threshold_are_refined(llm, run_manager):
+    engine, run = recursive_run(llm, run_manager)
+
+    run = asyncio.run(engine.run_recursive_ablation(
+        run, threshold=0.05, top_fraction=0.0, min_span_chars=40, max_calls=100
+    ))
+
+    lengths = {s["id"]: s["end"] - s["start"] for s in run.segments}
+    qualifying = {r["span_id"] for r in run.ablation_results if r["delta_cos"] >= 0.05 and lengths[r["span_id"]] > 40}
+    assert qualifying
+    assert refined_ids(run) == qualifying
+    assert max(r["depth"] for r in run.ablation_results) >= 2
+
+
+def test_top_fraction_refines_the_highest_ranked_segments(llm, run_manager):
+    engine, run = recursive_run(llm, run_manager)
+
+    run = asyncio.run(engine.run_recursive_ablation(
+        run, threshold=1.0, top_fraction=0.4, min_span_chars=200, max_calls=100
+    ))
+
+    coarse = sorted(
+        (r for r in run.ablation_results if r["depth"] == 0), key=lambda r: (-r["delta_cos"], r["span_id"])
+    )
+    top = {r["span_id"] for r in coarse[:math.ceil(0.4 * len(coarse))]}
+    assert refined_ids(run) == top
+
+
+def test_segments_no_longer_than_min_span_chars_are_not_split(llm, run_manager):
+    engine, run = recursive_run(llm, run_manager)
+
+    run = asyncio.run(engine.run_recursive_ablation(
+        run, threshold=0.0, top_fraction=1.0, min_span_chars=200, max_calls=100
+    ))
+
+    lengths = {s["id"]: s["end"] - s["start"] for s in run.segments}
+    assert all(lengths[span_id] > 200 for span_id in refined_ids(run))
+    assert all(lengths[r["span_id"]] <= 200 for r in run.ablation_results if r["depth"] == 1)
+    assert max(r["depth"] for r in run.ablation_results) == 1
+
+
+def test_max_calls_bounds_the_ablations(llm, run_manager):
+    engine, run = recursive_run(llm, run_manager)
+
+    run = asyncio.run(engine.run_recursive_ablation(
+        run, threshold=0.0, top_fraction=1.0, min_span_chars=40, max_calls=8
+    ))
+
+    assert len(run.ablation_results) == 8
+    assert sum(1 for r in run.ablation_results if r["depth"] == 0) == 5
+
+
+def test_children_are_numbered_after_the_highest_coarse_id(llm, run_manager):
+    engine, run = recursive_run(llm, run_manager)
+    engine.hierarchical_segmenter = SparseIdSegmenter()
+
+    run = asyncio.run(engine.run_recursive_ablation(
+        run, threshold=0.0, top_fraction=1.0, min_span_chars=200, max_calls=100
+    ))
+
+    coarse_ids = [r["span_id"] for r in run.ablation_results if r["depth"] == 0]
+    child_ids = [r["span_id"] for r in run.ablation_results if r["depth"] == 1]
+    assert coarse_ids == [0, 2, 4, 6, 8]
+    assert child_ids and min(child_ids) == max(coarse_ids) + 1
+    assert len({s["id"] for s in run.segments}) == len(run.segments)
+
+
+def test_resume_rebuilds_the_same_tree(llm, run_manager):
+    limits = dict(threshold=0.05, top_fraction=0.0, min_span_chars=40, max_calls=100)
+    engine, run = recursive_run(llm, run_manager)
+    engine.mode = "recursive"
+    engine.refine_threshold = limits["threshold"]
+    engine.refine_top_fraction = limits["top_fraction"]
+    engine.min_span_chars = limits["min_span_chars"]
+    engine.max_refine_calls = limits["max_calls"]
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(engine.run_recursive_ablation(run, scorer=FailingScorer(run.completion, llm, fail_after=8)))
+    interrupted = run_manager.get_run(run.id)
+    assert interrupted.status == "interrupted"
+    assert interrupted.ablation_results
+
+    scorer = FailingScorer(run.completion, llm, fail_after=100)
+    resumed = asyncio.run(engine.resume(run.id, scorer=scorer))
+
+    _, fresh = recursive_run(llm, run_manager)
+    expected = asyncio.run(engine.run_recursive_ablation(fresh, **limits))
+    assert len(interrupted.ablation_results) < len(expected.ablation_results)
+    assert tree(resumed) == tree(expected)
+    assert scorer.calls == len(expected.ablation_results) - len(interrupted.ablation_results)
+    assert {r["span_id"]: r["delta_cos"] for r in resumed.ablation_results} == pytest.approx(
+        {r["span_id"]: r["delta_cos"] for r in expected.ablation_results}
+    )
@@ -0,0 +1,91 @@
+"""Tests for LLMWrapper request coalescing."""
+
+import asyncio
+
+from core.prompt_attribution.engine import LLMWrapper
+from core.prompt_attribution.engine.backends import FakeBackend
+
+
+PROMPT = "Say hello in one sentence."
+
+
+def slow_llm():
+    """A wrapper whose backend is slow enough for duplicate calls to overlap."""
+    backend = FakeBackend(latency_ms=50, dimensions=64)
+    return LLMWrapper(backend=backend), backend
+
+
+def test_identical_concurrent_completions_share_one_request(settings):
+    llm, backend = slow_llm()
+
+    async def complete_all():
+        return await asyncio.gather(*(llm.get_completion(PROMPT) for _ in range(5)))
+
+    completions = asyncio.run(complete_all())
+
+    assert len(set(completions)) == 1
+    assert backend.completion_calls == 1
+    assert llm.coalesced_calls == 4
+    assert llm.get_stats()["completion_requests"] == 1
+
+
+def test_different_seeds_are_not_coalesced(settings):
+    llm, backend = slow_llm()
+
+    async def complete_all():
+        return await asyncio.gather(*(llm.get_completion(PROMPT, seed=seed) for seed in range(3)))
+
+    asyncio.run(complete_all())
+
+    assert backend.completion_calls == 3
+    assert llm.coalesced_calls == 0
+
+
+def test_identical_concurrent_embeddings_share_one_input(settings):
+    llm, backend = slow_llm()
+
+    async def embed_all():
+        return await asyncio.gather(*(llm.get_embedding(PROMPT) for _ in range(4)))
+
+    vectors = asyncio.run(embed_all())
+
+    assert all(vector == vectors[0] for vector in vectors)
+    assert llm.coalesced_calls == 3
+    assert llm.get_stats()["embedding_inputs"] == 1
+
+
+def test_cancelling_one_waiter_does_not_cancel_the_shared_request(settings):
+    llm, backend = slow_llm()
+
+    async def complete_with_one_cancelled():
+        waiters = [asyncio.ensure_future(llm.get_completion(PROMPT)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        # The first waiter is the one that started the request
+        waiters[0].cancel()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        return waiters, results
+
+    waiters, results = asyncio.run(complete_with_one_cancelled())
+
+    assert waiters[0].cancelled()
+    assert isinstance(results[1], str) and results[1] == results[2]
+    assert backend.completion_calls == 1
+    assert llm.coalesced_calls == 2
+    assert not llm._inflight
+
+
+def test_request_outlives_its_cancelled_waiters(settings):
+    llm, backend = slow_llm()
+
+    async def cancel_then_retry():
+        waiter = asyncio.ensure_future(llm.get_completion(PROMPT))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        # A later identical call joins the request that is still in flight
+        return await llm.get_completion(PROMPT)
+
+    completion = asyncio.run(cancel_then_retry())
+
+    assert completion
+    assert backend.completion_calls == 1
+    assert llm.coalesced_calls == 1
@@ -0,0 +1,62 @@
+"""Tests for chat prompts laid out as one text."""
+
+import asyncio
+
+from core.prompt_attribution.engine import LLMWrapper
+from core.prompt_attribution.engine.backends import FakeBackend
+from core.prompt_attribution.segmenter import ChatPrompt, Span
+
+
+MESSAGES = [
+    {"role": "system", "content": "You are terse."},
+    {"role": "user", "content": "Name a colour. Then name a fruit."},
+    {"role": "assistant", "content": "Blue."},
+]
+
+
+def span_of(layout, text):
+    start = layout.text.index(text)
+    return Span(start=start, end=start + len(text), text=text)
+
+
+def test_without_removes_spans_from_contents_and_keeps_roles():
+    layout = ChatPrompt(MESSAGES)
+
+    messages = layout.without([span_of(layout, " Then name a fruit.")])
+
+    assert messages == [
+        {"role": "system", "content": "You are terse."},
+        {"role": "user", "content": "Name a colour."},
+        {"role": "assistant", "content": "Blue."},
+    ]
+
+
+def test_without_drops_emptied_messages():
+    layout = ChatPrompt(MESSAGES)
+
+    messages = layout.without([span_of(layout, "You are terse."), span_of(layout, "Blue.")])
+
+    assert messages == [{"role": "user", "content": "Name a colour. Then name a fruit."}]
+
+
+def test_without_keeps_one_message_when_everything_is_removed():
+    layout = ChatPrompt(MESSAGES)
+
+    messages = layout.without([Span(start=0, end=len(layout.text), text=layout.text)])
+
+    assert messages == [{"role": "system", "content": ""}]
+
+
+def test_missing_content_is_treated_as_empty(settings):
+    messages = MESSAGES + [{"role": "assistant", "content": None}]
+    layout = ChatPrompt(messages)
+    assert layout.messages[-1] == {"role": "assistant", "content": ""}
+    assert layout.text.endswith("Assistant: ")
+
+    # Rate-limit token estimates on both sides accept it too
+    backend = FakeBackend(dimensions=64, tokens_per_minute=100000)
+    llm = LLMWrapper(backend=backend)
+    completion = asyncio.run(llm.get_chat_completion(messages))
+    assert completion == asyncio.run(llm.get_chat_completion(MESSAGES))
+    assert llm._estimate_completion_tokens(messages, 10) == llm._estimate_completion_tokens(MESSAGES, 10)
+    assert asyncio.run(llm.get_chat_completion([{"role": "user", "content": None}])) == ""
@@ -0,0 +1,202 @@
+"""Tests for the shared rate controller."""
+
+import asyncio
+import time
+
+import pytest
+
+from core.prompt_attribution.engine import LLMWrapper
+from core.prompt_attribution.engine.backends import FakeBackend, RateLimitExceeded
+from core.prompt_attribution.engine.rate_controller import (
+    RateController,
+    parse_reset_duration,
+    reset_rate_controllers,
+)
+
+
+MESSAGES = [{"role": "user", "content": "Say hello."}]
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("1s", 1.0),
+    ("6m0s", 360.0),
+    ("120ms", 0.12),
+    ("1h2m3s", 3723.0),
+    ("2.5", 2.5),
+    (" 17ms ", 0.017),
+])
+def test_parse_reset_duration(value, seconds):
+    assert parse_reset_duration(value) == pytest.approx(seconds)
+
+
+def test_parse_reset_duration_rejects_garbage():
+    assert parse_reset_duration("soon") is None
+    assert parse_reset_duration("") is None
+
+
+async def succeed(controller: RateController, count: int, latency: float = 0.01) -> None:
+    """Finish `count` requests, each while the concurrency limit is in use."""
+    for _ in range(count):
+        while controller.in_flight < int(controller.concurrency):
+            await controller.acquire()
+        await controller.on_success(latency)
+
+
+def test_additive_increase_adds_one_slot_per_limit_of_successes():
+    controller = RateController(initial_concurrency=4, max_concurrency=6)
+
+    asyncio.run(succeed(controller, 1))
+    assert controller.concurrency == pytest.approx(4.25)
+
+    # Each success adds 1/concurrency, so a limit's worth adds about one slot
+    asyncio.run(succeed(controller, 3))
+    assert 4.9 < controller.concurrency < 5
+
+    asyncio.run(succeed(controller, 20))
+    assert controller.concurrency == 6
+
+
+def test_no_increase_while_the_limit_is_not_in_use():
+    controller = RateController(initial_concurrency=4)
+
+    async def one_at_a_time():
+        for _ in range(10):
+            await controller.acquire()
+            await controller.on_success(0.01)
+
+    asyncio.run(one_at_a_time())
+    assert controller.concurrency == 4
+
+
+def test_rate_limit_halves_concurrency_once_per_burst():
+    controller = RateController(initial_concurrency=16, min_concurrency=2)
+
+    async def burst():
+        for _ in range(3):
+            await controller.acquire()
+        for _ in range(3):
+            await controller.on_rate_limited(retry_after=0.0)
+
+    asyncio.run(burst())
+    assert controller.concurrency == 8
+    assert controller.decreases == 1
+    assert controller.rate_limited == 3
+
+
+def test_decrease_stops_at_min_concurrency():
+    controller = RateController(initial_concurrency=4, min_concurrency=3)
+    controller._decrease()
+    assert controller.concurrency == 3
+
+
+def test_rising_latency_decreases_concurrency():
+    controller = RateController(initial_concurrency=10, latency_tolerance=2.0)
+    for _ in range(20):
+        controller._record_latency(0.01)
+    # Past the cooldown of one typical latency
+    controller._last_decrease = 0.0
+    controller._record_latency(1.0)
+    assert controller.concurrency == 5
+
+
+def test_backoff_doubles_without_retry_after():
+    controller = RateController(base_backoff=1.0, max_backoff=3.0)
+
+    pauses = []
+    for _ in range(4):
+        asyncio.run(controller.on_rate_limited())
+        pauses.append(controller._paused_until - time.monotonic())
+    assert pauses == pytest.approx([1.0, 2.0, 3.0, 3.0], abs=0.1)
+
+
+def test_retry_after_is_used_as_given():
+    controller = RateController(base_backoff=1.0)
+    asyncio.run(controller.on_rate_limited(retry_after=5.0))
+    assert controller._paused_until - time.monotonic() == pytest.approx(5.0, abs=0.1)
+    # A server-provided pause does not grow the backoff
+    assert controller._backoff == 1.0
+
+
+def test_success_resets_the_backoff():
+    controller = RateController(base_backoff=1.0)
+    asyncio.run(controller.on_rate_limited())
+    asyncio.run(controller.on_rate_limited())
+    asyncio.run(controller.on_success(0.01))
+    assert controller._backoff == 1.0
+
+
+async def request(backend: FakeBackend, controller: RateController, tokens: int = 0) -> None:
+    """Send one completion through the controller like LLMWrapper does."""
+    await controller.acquire(tokens)
+    try:
+        response = await backend.complete("fake", MESSAGES, 0, 42, 10)
+    except RateLimitExceeded as e:
+        await controller.on_rate_limited(e.retry_after)
+        raise
+    await controller.on_success(0.01, tokens, headers=response.headers)
+
+
+def test_fake_rpm_limit_429_pauses_every_request():
+    backend = FakeBackend(requests_per_minute=2)
+    # Budget unknown to the controller, so the third request reaches the server
+    controller = RateController()
+
+    async def scenario():
+        await request(backend, controller)
+        # Learned the budget from the response headers
+        assert controller.requests.per_minute == 2
+        await request(backend, controller)
+
+        controller.requests.per_minute = 0
+        with pytest.raises(RateLimitExceeded):
+            await request(backend, controller)
+
+        # The 429's Retry-After (the rest of the minute) pauses the next request
+        assert controller._paused_until - time.monotonic() > 50
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(controller.acquire(), timeout=0.05)
+
+    asyncio.run(scenario())
+    assert backend.rate_limited_calls == 1
+    assert controller.rate_limited == 1
+
+
+def test_learned_rpm_budget_throttles_before_the_server_does():
+    backend = FakeBackend(requests_per_minute=2)
+    controller = RateController()
+
+    async def scenario():
+        await request(backend, controller)
+        await request(backend, controller)
+        # The local budget is exhausted, so the request waits instead of failing
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(request(backend, controller), timeout=0.05)
+
+    asyncio.run(scenario())
+    assert backend.rate_limited_calls == 0
+
+
+def test_fake_tpm_limit_is_learned_and_enforced():
+    backend = FakeBackend(tokens_per_minute=100)
+    controller = RateController()
+
+    async def scenario():
+        # Each request counts its prompt plus max_tokens (10) against the limit
+        await request(backend, controller, tokens=12)
+        assert controller.tokens.per_minute == 100
+        assert controller.tokens.level <= 100 - 12
+        assert controller.tokens.wait_time(95) > 0
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("max_adaptive, limit", [(0, 20), (8, 20), (48, 48)])
+def test_concurrency_limit_is_capped_by_max_concurrent_requests(settings, monkeypatch, max_adaptive, limit):
+    monkeypatch.setattr(settings, "adaptive_concurrency", True)
+    monkeypatch.setattr(settings, "max_concurrent_requests", 20)
+    monkeypatch.setattr(settings, "max_adaptive_concurrency", max_adaptive)
+    reset_rate_controllers()
+    try:
+        assert LLMWrapper(backend=FakeBackend(dimensions=64)).concurrency_limit == limit
+    finally:
+        reset_rate_controllers()
@@ -0,0 +1,97 @@
+"""Tests for run persistence."""
+
+import json
+import time
+
+import numpy as np
+
+from core.prompt_attribution.engine import RunManager
+from core.prompt_attribution.engine.run_manager import AblationResult
+from core.prompt_attribution.segmenter import Span
+
+
+PROMPT = "First sentence. Second sentence."
+
+
+def create_run(run_manager: RunManager):
+    segments = [Span(0, 15, "First sentence.", id=0), Span(16, 32, "Second sentence.", id=1)]
+    return run_manager.create_run(PROMPT, "A reply.", segments)
+
+
+def test_results_are_on_disk_as_soon_as_they_are_added(run_manager):
+    run = create_run(run_manager)
+    run_manager.add_ablation_result(run, AblationResult(span_id=0, delta_cos=0.25, elapsed_ms=3))
+
+    # Read back by another manager, as after the process was killed
+    reloaded = RunManager(str(run_manager.base_dir)).get_run(run.id)
+    assert [result["span_id"] for result in reloaded.ablation_results] == [0]
+
+
+def test_buffered_results_are_written_on_flush(tmp_path):
+    run_manager = RunManager(str(tmp_path / "runs"), flush_every=8, flush_interval=3600)
+    run = create_run(run_manager)
+    for span_id in range(2):
+        run_manager.add_ablation_result(run, AblationResult(span_id=span_id, delta_cos=0.1, elapsed_ms=1))
+
+    assert RunManager(str(run_manager.base_dir)).get_run(run.id).ablation_results == []
+    run_manager.flush(run.id)
+    assert len(RunManager(str(run_manager.base_dir)).get_run(run.id).ablation_results) == 2
+
+
+def test_reloaded_run_is_json_serializable(run_manager):
+    run = create_run(run_manager)
+    run_manager.add_ablation_result(
+        run, AblationResult(span_id=1, delta_cos=0.5, elapsed_ms=2, sentence_deltas=[0.25, 0.75])
+    )
+    run.status = "completed"
+    run_manager._save_run(run)
+
+    reloaded = run_manager.get_run(run.id)
+    result = reloaded.ablation_results[0]
+    assert result["sentence_deltas"].tolist() == [0.25, 0.75]
+    assert json.loads(json.dumps(reloaded.to_dict()))["ablation_results"][0]["span_id"] == 1
+    assert reloaded.influence_matrix().tolist() == [[0.0, 0.0], [0.25, 0.75]]
+
+    # Results added after loading are merged with the loaded matrix
+    run_manager.add_ablation_result(
+        reloaded, AblationResult(span_id=0, delta_cos=0.5, elapsed_ms=2, sentence_deltas=[0.5])
+    )
+    assert reloaded.influence_matrix().tolist() == [[0.5, 0.0], [0.25, 0.75]]
+
+
+def test_delta_cos_reads_the_same_from_log_and_snapshot(run_manager):
+    run = create_run(run_manager)
+    run_manager.add_ablation_result(
+        run, AblationResult(span_id=0, delta_cos=0.1, elapsed_ms=1, sentence_deltas=[0.3])
+    )
+    from_log = run_manager.get_run(run.id).ablation_results[0]
+    run_manager._save_run(run)
+    from_snapshot = run_manager.get_run(run.id).ablation_results[0]
+
+    assert from_log["delta_cos"] == from_snapshot["delta_cos"] == run.ablation_results[0]["delta_cos"]
+    assert from_log["sentence_deltas"] == from_snapshot["sentence_deltas"].tolist()
+
+
+def test_large_run_loads_as_float32_columns(run_manager):
+    num_segments, num_sentences = 500, 300
+    segments = [Span(i, i + 1, "x", id=i) for i in range(num_segments)]
+    run = run_manager.create_run("x" * num_segments, "A reply.", segments)
+    deltas = np.random.default_rng(0).random((num_segments, num_sentences), dtype=np.float32)
+    run.ablation_results = [
+        {"span_id": i, "delta_cos": float(deltas[i].mean()), "elapsed_ms": 1, "sentence_deltas": deltas[i].tolist()}
+        for i in range(num_segments)
+    ]
+    run.response_sentence_deltas = [0.0] * num_sentences
+    run_manager._save_run(run)
+
+    start = time.perf_counter()
+    reloaded = run_manager.get_run(run.id)
+    matrix = reloaded.influence_matrix()
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.5
+    assert matrix.dtype == np.float32
+    np.testing.assert_array_equal(matrix, deltas)
+    # Rows are views of one matrix, not lists of Python floats
+    assert all(isinstance(r["sentence_deltas"], np.ndarray) for r in reloaded.ablation_results)
+    assert np.shares_memory(matrix, reloaded.ablation_results[0]["sentence_deltas"])
@@ -0,0 +1,100 @@
+"""Tests for the shared segmentation cache and its persistent store."""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from core.prompt_attribution.segmenter import (
+    Segmenter,
+    cached_bounds,
+    clear_segmentation_cache,
+    segmentation_cache_stats,
+)
+from core.prompt_attribution.segmenter import cache as segmentation_cache
+
+
+TEXT = " ".join(f"Step {i}: check the value of field number {i} before saving." for i in range(12))
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_segmentation_cache()
+    yield
+    clear_segmentation_cache()
+
+
+@pytest.fixture
+def store(settings, tmp_path, monkeypatch):
+    """Persist segmentations under tmp_path, with the store reopened for the test."""
+    monkeypatch.setattr(settings, "segment_cache_persist", True)
+    monkeypatch.setattr(settings, "cache_dir", str(tmp_path))
+    monkeypatch.setattr(segmentation_cache, "_store", None)
+    monkeypatch.setattr(segmentation_cache, "_store_opened", False)
+    yield tmp_path
+    if segmentation_cache._store is not None:
+        segmentation_cache._store.close()
+
+
+def fail(text):
+    raise AssertionError("segmentation should have come from the cache")
+
+
+def test_identical_segmenters_share_a_segmentation(settings):
+    first = Segmenter(window_unit="chars").segment(TEXT)
+    second = Segmenter(window_unit="chars").segment(TEXT)
+
+    assert [(s.start, s.end) for s in second] == [(s.start, s.end) for s in first]
+    stats = segmentation_cache_stats()
+    assert (stats["misses"], stats["hits"], stats["entries"]) == (1, 1, 1)
+
+
+def test_a_different_config_misses(settings):
+    Segmenter(window_size=40, window_unit="chars").segment(TEXT)
+    Segmenter(window_size=20, window_unit="chars").segment(TEXT)
+
+    stats = segmentation_cache_stats()
+    assert (stats["misses"], stats["hits"], stats["entries"]) == (2, 0, 2)
+
+
+def test_store_round_trip(store):
+    bounds = cached_bounds(TEXT, "config", lambda text: [(0, 10), (10, len(text))])
+    # Drop the in-process entry, so the next lookup goes to the store
+    clear_segmentation_cache()
+
+    assert cached_bounds(TEXT, "config", fail) == bounds
+    assert segmentation_cache_stats()["store_hits"] == 1
+    assert (store / "segments.sqlite3").exists()
+
+
+def test_format_version_change_misses_the_store(store, monkeypatch):
+    cached_bounds(TEXT, "config", lambda text: [(0, len(text))])
+    clear_segmentation_cache()
+    monkeypatch.setattr(segmentation_cache, "_FORMAT_VERSION", segmentation_cache._FORMAT_VERSION + 1)
+
+    assert cached_bounds(TEXT, "config", lambda text: [(0, 5), (5, len(text))]) == ((0, 5), (5, len(TEXT)))
+    stats = segmentation_cache_stats()
+    assert (stats["misses"], stats["store_hits"]) == (1, 0)
+
+
+def test_store_is_shared_with_other_processes(store):
+    script = (
+        "import sys\n"
+        "from core.prompt_attribution.segmenter import Segmenter, flush_segmentation_cache\n"
+        "Segmenter(window_unit='chars').segment(sys.argv[1])\n"
+        "flush_segmentation_cache()\n"
+    )
+    env = {
+        **os.environ,
+        "SEGMENT_CACHE_PERSIST": "true",
+        "CACHE_DIR": str(store),
+        "STRUCTURAL_SEGMENTATION": "false",
+    }
+    subprocess.run([sys.executable, "-c", script, TEXT], cwd=REPO_ROOT, env=env, check=True)
+
+    Segmenter(window_unit="chars").segment(TEXT)
+    stats = segmentation_cache_stats()
+    assert (stats["misses"], stats["store_hits"]) == (0, 1)
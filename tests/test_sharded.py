@@ -0,0 +1,58 @@
+"""Tests for batch attribution sharded across worker processes."""
+
+import asyncio
+
+from core.prompt_attribution.datasets import PromptCase
+from core.prompt_attribution.engine.sharded import ShardedBatchAttributor, shard_cases
+
+
+PROMPTS = [
+    " ".join(f"Rule {i}: keep answer number {i} short and polite." for i in range(count))
+    for count in (2, 3, 4, 5)
+]
+
+
+def test_shards_balance_prompt_length():
+    cases = [PromptCase(id=f"prompt-{i}", style="", text=text) for i, text in enumerate(PROMPTS)]
+
+    shards = shard_cases(cases, 2)
+
+    assert sorted(case.id for shard in shards for case in shard) == [case.id for case in cases]
+    assert [[case.id for case in shard] for shard in shards] == [["prompt-0", "prompt-3"], ["prompt-1", "prompt-2"]]
+
+
+def test_workers_get_whole_shares_of_the_limits(tmp_path, settings, monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_rpm", 501)
+    monkeypatch.setattr(settings, "rate_limit_tpm", 0)
+    monkeypatch.setattr(settings, "max_adaptive_concurrency", 0)
+
+    attributor = ShardedBatchAttributor(workers=2, runs_dir=str(tmp_path / "runs"), max_concurrency=9)
+
+    assert attributor._worker_settings(2) == dict(
+        max_concurrent_requests=4,
+        max_adaptive_concurrency=0,
+        rate_limit_rpm=250,
+        # Budgets learned from response headers stay unset
+        rate_limit_tpm=0,
+    )
+
+
+def test_two_shards_merge_their_runs(tmp_path, monkeypatch):
+    # Spawned workers read their settings from the environment
+    monkeypatch.setenv("LLM_BACKEND", "fake")
+    monkeypatch.setenv("ENABLE_CACHE", "false")
+    attributor = ShardedBatchAttributor(workers=2, runs_dir=str(tmp_path / "runs"), max_cost=1.0)
+
+    results, worker_stats = asyncio.run(attributor.run(PROMPTS))
+
+    assert [stats.worker for stats in worker_stats] == [0, 1]
+    assert sum(stats.cases for stats in worker_stats) == len(PROMPTS)
+    assert len({stats.pid for stats in worker_stats}) == 2
+    assert sorted(result.case_id for result in results) == [f"prompt-{i}" for i in range(len(PROMPTS))]
+    assert all(result.status == "completed" for result in results)
+    # Runs written by the workers are read back from the shared store
+    assert sorted(result.run.prompt for result in results) == sorted(PROMPTS)
+    assert all(result.run.ablation_results for result in results)
+    assert sum(stats.segments for stats in worker_stats) == sum(
+        len(result.run.ablation_results) for result in results
+    )
@@ -0,0 +1,98 @@
+"""Tests for the offline BPE tokenizer and token-exact segmentation windows."""
+
+import base64
+
+import pytest
+
+from core.prompt_attribution.segmenter import BPETokenizer, Segmenter
+from core.prompt_attribution.segmenter.tokenizer import _PRETOKENIZE_PATTERN
+
+
+# Merges on top of the 256 single bytes, lowest rank first
+MERGES = [b"he", b"ll", b"hell", b"hello", b" w", b"or", b" wor"]
+
+WORDS = [
+    "alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel",
+    "india", "juliet", "kilo", "lima", "mike", "november", "oscar", "papa",
+]
+
+
+def write_vocab(path, tokens):
+    """Write a tiktoken-format vocabulary: single bytes, then `tokens` in rank order."""
+    vocab = [bytes([byte]) for byte in range(256)] + list(tokens)
+    path.write_text("".join(f"{base64.b64encode(token).decode()} {rank}\n" for rank, token in enumerate(vocab)))
+    return str(path)
+
+
+@pytest.fixture
+def tokenizer(tmp_path):
+    return BPETokenizer.from_file(write_vocab(tmp_path / "merges.tiktoken", MERGES))
+
+
+def word_tokenizer(tmp_path, text):
+    """Tokenizer whose vocabulary holds every pre-tokenized piece of `text` whole."""
+    pieces = dict.fromkeys(match.group().encode() for match in _PRETOKENIZE_PATTERN.finditer(text))
+    return BPETokenizer.from_file(write_vocab(tmp_path / "words.tiktoken", [p for p in pieces if len(p) > 1]))
+
+
+def test_merges_by_rank_and_records_offsets(tokenizer):
+    tokens = tokenizer.tokenize("hello world")
+    # "hello" | " wor" | "l" | "d"
+    assert tokens.offsets == [0, 5, 9, 10]
+    assert tokens.length == 11
+
+
+def test_tokens_inside_a_multibyte_character_share_its_offset(tokenizer):
+    # "é" has no merge, so its two bytes are two tokens
+    assert tokenizer.tokenize("hé").offsets == [0, 1, 1]
+
+
+def test_char_offset_and_token_at(tokenizer):
+    tokens = tokenizer.tokenize("hello world")
+    assert tokens.char_offset(1) == 5
+    assert tokens.char_offset(len(tokens)) == 11
+    assert tokens.token_at(5) == 1
+    assert tokens.token_at(6) == 2
+    assert tokens.token_at(11) == 4
+
+
+def test_slice_is_relative_to_its_start(tokenizer):
+    tokens = tokenizer.tokenize("hello world")
+    part = tokens.slice(5, 10)
+    assert part.offsets == [0, 4]
+    assert part.length == 5
+    assert part.char_offset(len(part)) == 5
+
+
+def test_malformed_vocabulary_line(tmp_path):
+    path = tmp_path / "bad.tiktoken"
+    path.write_text("aGk= 0\nnot-a-rank\n")
+    with pytest.raises(ValueError, match="line 2"):
+        BPETokenizer.from_file(str(path))
+
+
+def test_token_windows_overlap_by_exact_token_counts(tmp_path):
+    text = " ".join(WORDS)
+    tokenizer = word_tokenizer(tmp_path, text)
+    segmenter = Segmenter(window_size=6, window_overlap=2, window_unit="tokens", tokenizer=tokenizer)
+
+    spans = segmenter.segment(text, cache=False)
+
+    assert tokenizer.count_tokens(text) == len(WORDS)
+    assert [tokenizer.count_tokens(span.text) for span in spans] == [6, 6, 6, 4]
+    for previous, span in zip(spans, spans[1:]):
+        assert tokenizer.count_tokens(text[span.start:previous.end]) == 2
+    assert spans[0].start == 0
+    assert spans[-1].end == len(text)
+
+
+def test_token_windows_end_at_a_natural_break(tmp_path):
+    text = " ".join(WORDS[:5]) + ". " + " ".join(WORDS[5:])
+    tokenizer = word_tokenizer(tmp_path, text)
+    segmenter = Segmenter(window_size=8, window_overlap=0, window_unit="tokens", tokenizer=tokenizer)
+
+    spans = segmenter.segment(text, cache=False)
+
+    # The break after "echo." falls in the second half of the first window
+    assert spans[0].text == "alpha bravo charlie delta echo."
+    assert spans[1].start == spans[0].end